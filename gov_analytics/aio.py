@@ -0,0 +1,143 @@
+"""Concurrent fan-out of independent dashboard queries on an async database driver.
+
+A page that needs several aggregates awaits them together with
+``gather_queries``, so its latency is that of the slowest query rather than
+the sum, and each query is bounded by ``QUERY_TIMEOUT_SECONDS``. Queries go
+through ``query_df_async``, which shares ``query_cache`` entries with the sync
+``web.query_df``.
+
+The async engine is derived from the read URL (``postgresql`` -> ``asyncpg``,
+``sqlite`` -> ``aiosqlite``) unless ``DATABASE_ASYNC_URL`` is set. Async
+connections belong to the event loop that opened them, so there is one engine
+per loop: the ASGI server's loop (``gov_analytics.asgi``), or the background
+loop that ``run`` uses to execute async views under a WSGI server. Without the
+driver, with ``ASYNC_DB_ENABLED`` off or on in-memory SQLite, queries run on
+the sync read pool in worker threads and still overlap.
+"""
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional
+from .cache import cache_key, get_query_cache
+from .config import settings
+from .db import _engine_kwargs, read_sql
+import asyncio
+import importlib.util
+import logging
+import threading
+import weakref
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+_engines: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncEngine]" = weakref.WeakKeyDictionary()
+_engines_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def async_url() -> Optional[URL]:
+    """URL of the async engine, or None when queries should use the sync pool instead."""
+    if not settings.ASYNC_DB_ENABLED:
+        return None
+    if settings.DATABASE_ASYNC_URL:
+        return make_url(settings.DATABASE_ASYNC_URL)
+    url = make_url(settings.DATABASE_READ_URL or settings.DATABASE_URL)
+    backend = url.get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None or importlib.util.find_spec(driver) is None:
+        return None
+    if backend == "sqlite" and url.database in (None, "", ":memory:"):
+        # a second connection would see a different, empty database
+        return None
+    return url.set(drivername=f"{backend}+{driver}")
+
+
+def async_engine() -> Optional[AsyncEngine]:
+    """The async engine of the running event loop, created on first use."""
+    url = async_url()
+    if url is None:
+        return None
+    loop = asyncio.get_running_loop()
+    with _engines_lock:
+        engine = _engines.get(loop)
+        if engine is None:
+            engine = _engines[loop] = create_async_engine(url, **_engine_kwargs(url.render_as_string(False)))
+    return engine
+
+
+async def dispose():
+    """Close the running loop's async engine, if it has one."""
+    with _engines_lock:
+        engine = _engines.pop(asyncio.get_running_loop(), None)
+    if engine is not None:
+        await engine.dispose()
+
+
+async def read_sql_async(statement, params: Optional[Dict[str, Any]] = None) -> "pd.DataFrame":
+    """Async ``db.read_sql`` for Core statements."""
+    import pandas as pd
+    engine = async_engine()
+    if engine is None:
+        return await asyncio.to_thread(read_sql, statement, params)
+    async with engine.connect() as conn:
+        result = await conn.execute(statement, params or {})
+        return pd.DataFrame.from_records(result.all(), columns=list(result.keys()), coerce_float=True)
+
+
+async def query_df_async(query, params: Optional[Dict[str, Any]] = None, cache: bool = True) -> "pd.DataFrame":
+    """Async ``web.query_df`` for a ``queries.PreparedQuery``; same cache entries."""
+    def load():
+        return read_sql_async(query.statement, params)
+
+    if not cache:
+        return await load()
+    return await get_query_cache().get_or_compute_async(cache_key(query.sql, params), load, query.tables)
+
+
+async def gather_queries(calls: Dict[str, Awaitable], timeout: Optional[float] = None) -> Dict[str, Any]:
+    """Await ``calls`` concurrently, each bounded by ``timeout`` (default ``QUERY_TIMEOUT_SECONDS``).
+
+    Returns name -> result; a call that failed or timed out maps to its
+    exception (``asyncio.TimeoutError``) instead, after logging, so one slow
+    aggregate degrades its panel rather than the page.
+    """
+    timeout = settings.QUERY_TIMEOUT_SECONDS if timeout is None else timeout
+    names = list(calls)
+    results = await asyncio.gather(*(asyncio.wait_for(calls[n], timeout) for n in names), return_exceptions=True)
+    for name, result in zip(names, results):
+        if isinstance(result, asyncio.TimeoutError):
+            logger.warning("Query %s timed out after %.1fs", name, timeout)
+        elif isinstance(result, Exception):
+            logger.error("Query %s failed: %s", name, result)
+    return dict(zip(names, results))
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="gov-analytics-aio", daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+def run(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """Run ``coro`` on the shared background loop from sync code (WSGI threads) and wait for it.
+
+    The coroutine runs in a copy of the caller's context, so Flask's request
+    context is visible to async views.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result(timeout)
+
+
+def async_to_sync(func: Callable[..., Awaitable]) -> Callable[..., Any]:
+    """``Flask.async_to_sync`` replacement that runs async views on the background loop."""
+    return lambda *args, **kwargs: run(func(*args, **kwargs))
@@ -0,0 +1,101 @@
+"""ASGI entry point for the dashboard: ``uvicorn gov_analytics.asgi:app``.
+
+Requests routed to an ``async def`` view (the overview page and
+``/api/overview``, which fan out several queries) are awaited on the server's
+event loop, so one worker process holds any number of them in flight while
+their queries run on the async driver (see ``gov_analytics.aio``). Every other
+route is a plain Flask view and runs through a WSGI adapter on a thread pool
+of ``ASGI_WSGI_THREADS`` threads, exactly as under a WSGI server.
+
+Flask's request handling is reproduced for async views: ``before_request``
+and ``after_request`` hooks, error handlers and response finalisation all run,
+inside a request context that lives for the duration of the request's task.
+"""
+from uvicorn.middleware.wsgi import WSGIMiddleware, build_environ
+from .config import settings
+from . import aio
+from .web import create_app
+import functools
+import inspect
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FlaskASGI:
+    """Serve async Flask views natively and delegate the rest to ``WSGIMiddleware``."""
+
+    def __init__(self, flask_app, threads: int):
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=threads)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http" or not self._is_async(scope):
+            await self.wsgi(scope, receive, send)
+            return
+        message = await receive()
+        body = io.BytesIO(message.get("body", b""))
+        while message.get("more_body"):
+            message = await receive()
+            body.write(message.get("body", b""))
+        body.seek(0)
+        response = await self._dispatch(build_environ(scope, message, body))
+        try:
+            await send({"type": "http.response.start", "status": response.status_code,
+                        "headers": [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in response.headers.items()]})
+            await send({"type": "http.response.body", "body": b"".join(response.iter_encoded())})
+        finally:
+            response.close()
+
+    def _is_async(self, scope) -> bool:
+        adapter = self.flask_app.url_map.bind("", path_info=scope["path"])
+        try:
+            endpoint, _ = adapter.match(method=scope["method"])
+        except Exception:
+            # redirects, 404s and 405s are answered by Flask itself
+            return False
+        return inspect.iscoroutinefunction(self.flask_app.view_functions.get(endpoint))
+
+    async def _dispatch(self, environ):
+        app = self.flask_app
+        with app.request_context(environ) as ctx:
+            try:
+                try:
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        request = ctx.request
+                        if request.routing_exception is not None:
+                            app.raise_routing_exception(request)
+                        view = app.view_functions[request.url_rule.endpoint]
+                        rv = await view(**request.view_args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                return app.finalize_request(rv)
+            except Exception as e:
+                return app.handle_exception(e)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await aio.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+@functools.lru_cache(maxsize=None)
+def default_app() -> FlaskASGI:
+    return FlaskASGI(create_app(), settings.ASGI_WSGI_THREADS)
+
+
+def __getattr__(name: str):
+    # ``uvicorn gov_analytics.asgi:app`` looks ``app`` up here, after the settings are in place
+    if name == "app":
+        return default_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
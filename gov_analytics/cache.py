@@ -0,0 +1,267 @@
+"""Result cache for dashboard queries.
+
+Entries are keyed by normalized SQL plus bound parameters and tagged with the
+tables the query reads, so an ETL load into one scheme table only drops the
+entries that depend on it. The default backend is an in-process LRU with TTL;
+setting ``QUERY_CACHE_URL=sqlite:///path/to/cache.db`` switches to a file-backed
+store shared by every worker process on the host.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, Optional, Set, Tuple
+from .config import settings
+import functools
+import hashlib
+import json
+import logging
+import pickle
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_TABLE_RE = re.compile(r"\b(?:from|join)\s+([A-Za-z_][\w.]*)", re.IGNORECASE)
+
+
+def normalize_sql(sql: str) -> str:
+    return " ".join(sql.split()).rstrip(";").strip()
+
+
+def tables_in(sql: str) -> Set[str]:
+    return {t.lower() for t in _TABLE_RE.findall(sql)}
+
+
+def cache_key(sql: str, params: Optional[Dict[str, Any]] = None) -> str:
+    raw = normalize_sql(sql) + "\x00" + json.dumps(params or {}, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _sizeof(value: Any) -> int:
+    try:
+        return int(value.memory_usage(deep=True).sum())
+    except AttributeError:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class MemoryBackend:
+    """Thread-safe LRU bounded by entry count and approximate bytes, with per-entry TTL."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, Tuple[float, Set[str], int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] < time.time():
+                self._drop(key)
+                return False, None
+            self._data.move_to_end(key)
+            return True, entry[3]
+
+    def set(self, key: str, value: Any, tables: Set[str], ttl: float):
+        size = _sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.time() + ttl, tables, size, value)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate(self, table: Optional[str]) -> int:
+        with self._lock:
+            keys = [k for k, e in self._data.items() if table is None or table in e[1]]
+            for k in keys:
+                self._drop(k)
+            return len(keys)
+
+    def _drop(self, key: str):
+        entry = self._data.pop(key)
+        self._bytes -= entry[2]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SqliteBackend:
+    """File-backed cache shared across processes; evicts least recently used rows past the bounds."""
+
+    def __init__(self, path: str, max_entries: int, max_bytes: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_cache (key TEXT PRIMARY KEY, tables TEXT, "
+                "expires REAL, accessed REAL, size INTEGER, payload BLOB)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT expires, payload FROM query_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False, None
+            if row[0] < now:
+                conn.execute("DELETE FROM query_cache WHERE key = ?", (key,))
+                return False, None
+            conn.execute("UPDATE query_cache SET accessed = ? WHERE key = ?", (now, key))
+        return True, pickle.loads(row[1])
+
+    def set(self, key: str, value: Any, tables: Set[str], ttl: float):
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        tag = "," + ",".join(sorted(tables)) + ","
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO query_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (key, tag, now + ttl, now, len(payload), payload),
+            )
+            count, total = conn.execute("SELECT count(*), COALESCE(SUM(size), 0) FROM query_cache").fetchone()
+            while count > self.max_entries or total > self.max_bytes:
+                victim = conn.execute("SELECT key, size FROM query_cache ORDER BY accessed LIMIT 1").fetchone()
+                if victim is None:
+                    break
+                conn.execute("DELETE FROM query_cache WHERE key = ?", (victim[0],))
+                count, total = count - 1, total - victim[1]
+                self.evictions += 1
+
+    def invalidate(self, table: Optional[str]) -> int:
+        with self._connect() as conn:
+            if table is None:
+                return conn.execute("DELETE FROM query_cache").rowcount
+            return conn.execute("DELETE FROM query_cache WHERE tables LIKE ?", (f"%,{table},%",)).rowcount
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT count(*) FROM query_cache").fetchone()[0]
+
+
+class QueryCache:
+    def __init__(self, backend, ttl: float, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._generation = 0
+
+    @classmethod
+    def from_settings(cls) -> "QueryCache":
+        url = settings.QUERY_CACHE_URL
+        if url and url.startswith("sqlite:///"):
+            backend = SqliteBackend(url[len("sqlite:///"):], settings.QUERY_CACHE_MAX_ENTRIES, settings.QUERY_CACHE_MAX_BYTES)
+        else:
+            if url:
+                logger.warning("Unsupported QUERY_CACHE_URL %r, using in-process cache", url)
+            backend = MemoryBackend(settings.QUERY_CACHE_MAX_ENTRIES, settings.QUERY_CACHE_MAX_BYTES)
+        return cls(backend, settings.QUERY_CACHE_TTL, settings.QUERY_CACHE_ENABLED)
+
+    def get_or_load(self, sql: str, params: Optional[Dict[str, Any]], loader: Callable[[], Any]) -> Any:
+        """Return the cached result for ``sql``/``params`` or call ``loader`` and cache it.
+
+        Cached values are shared between callers and must not be mutated.
+        """
+        return self.get_or_compute(cache_key(sql, params), loader, tables_in(sql))
+
+    def get_or_compute(self, key: str, loader: Callable[[], Any], tables: Iterable[str] = ()) -> Any:
+        """Generic form of ``get_or_load`` for callers that build their own key."""
+        if not self.enabled:
+            return loader()
+        found, value = self.backend.get(key)
+        if found:
+            self.hits += 1
+            return value
+        self.misses += 1
+        generation = self._generation
+        value = loader()
+        # skip storing if an invalidation raced with the load; the result may predate it
+        if generation == self._generation:
+            self.backend.set(key, value, set(tables), self.ttl)
+        return value
+
+    async def get_or_compute_async(self, key: str, loader: Callable[[], Awaitable[Any]],
+                                   tables: Iterable[str] = ()) -> Any:
+        """``get_or_compute`` for a coroutine ``loader`` (see ``gov_analytics.aio``)."""
+        if not self.enabled:
+            return await loader()
+        found, value = self.backend.get(key)
+        if found:
+            self.hits += 1
+            return value
+        self.misses += 1
+        generation = self._generation
+        value = await loader()
+        if generation == self._generation:
+            self.backend.set(key, value, set(tables), self.ttl)
+        return value
+
+    def invalidate(self, tables: Optional[Iterable[str]] = None) -> int:
+        """Drop entries reading any of ``tables`` (all entries when None)."""
+        if tables is None:
+            dropped = self.backend.invalidate(None)
+        else:
+            dropped = sum(self.backend.invalidate(t.lower()) for t in tables)
+        self.invalidations += 1
+        self._generation += 1
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.backend.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def get_query_cache() -> QueryCache:
+    """The process-wide query cache, built from the settings on first use."""
+    return QueryCache.from_settings()
+
+
+@functools.lru_cache(maxsize=None)
+def get_chart_cache() -> QueryCache:
+    """Rendered chart fragments; keys embed the data version, so stale entries simply age out."""
+    return QueryCache(
+        MemoryBackend(settings.CHART_CACHE_MAX_ENTRIES, settings.QUERY_CACHE_MAX_BYTES),
+        settings.CHART_CACHE_TTL,
+        settings.QUERY_CACHE_ENABLED,
+    )
+
+
+def __getattr__(name: str):
+    # ``from .cache import query_cache`` keeps working; it builds the cache at that point
+    if name == "query_cache":
+        return get_query_cache()
+    if name == "chart_cache":
+        return get_chart_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
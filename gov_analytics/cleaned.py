@@ -0,0 +1,285 @@
+"""Parquet snapshots of the cleaned scheme tables, and a query backend over them.
+
+After each ETL run the scheme table is written to ``CLEANED_DIR`` (default
+``data/cleaned``, the DVC ``ingest`` output) as one Parquet file per year::
+
+    <scheme>/year=<year>/part-v<version>.parquet   rows sorted by state_name, state_code
+    manifest.json                                  per scheme: data version, columns, files
+
+``<version>`` is the scheme's ``data_versions`` counter, so a snapshot is only
+rewritten when a load changed the table. New files are written next to the
+old ones and the manifest is swapped atomically before stale files are
+removed; readers that go through the manifest never see a half-written
+snapshot.
+
+With ``PARQUET_QUERY_ENABLED`` the dashboard's group-by/filter workloads run
+off these files (``CleanedStore.aggregate``, same contract as the in-memory
+analytics store): the year filter prunes whole files via the manifest, the
+state filter is pushed down to Parquet row-group statistics and only the
+columns a query needs are read. pyarrow is required for both halves; without
+it snapshots are skipped and queries fall back to SQL.
+"""
+from datetime import datetime, timezone
+from functools import lru_cache, reduce
+from pathlib import Path
+from sqlalchemy import select
+from typing import Dict, List, Optional, Sequence
+from .config import settings
+from .db import connect
+from .etl.page_cache import _read_json, _write_atomic
+from .export import _arrow_schema
+from .models import SCHEME_MODELS, SCORE_COLUMNS, DataVersion
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import pandas as pd
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLEANED_DIR = Path(__file__).resolve().parent.parent / "data" / "cleaned"
+MANIFEST = "manifest.json"
+MANIFEST_FORMAT = 1
+
+_manifest_lock = threading.Lock()
+
+
+def cleaned_dir() -> Path:
+    return Path(settings.CLEANED_DIR) if settings.CLEANED_DIR else DEFAULT_CLEANED_DIR
+
+
+def pyarrow_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def read_manifest(root: Optional[Path] = None) -> Dict[str, object]:
+    manifest = _read_json((root or cleaned_dir()) / MANIFEST) or {}
+    manifest.setdefault("format", MANIFEST_FORMAT)
+    manifest.setdefault("schemes", {})
+    return manifest
+
+
+def _data_version(scheme: str) -> int:
+    with connect() as conn:
+        version = conn.execute(select(DataVersion.version).where(DataVersion.scheme == scheme)).scalar()
+    return int(version or 0)
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_years(scheme: str, root: Path, version: int) -> List[Dict[str, object]]:
+    """Stream the table ordered by year into one Parquet file per year; return the partition entries."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = SCHEME_MODELS[scheme].__table__
+    columns = [c.name for c in table.columns if c.name not in ("id", "created_at", "row_hash")]
+    schema = _arrow_schema(table, columns)
+    year_index = columns.index("year")
+    query = select(*(table.c[c] for c in columns)).order_by(table.c.year, table.c.state_name, table.c.state_code)
+
+    partitions: List[Dict[str, object]] = []
+    writer = current = tmp = None
+
+    def close():
+        writer.close()
+        path = tmp.with_suffix("")
+        os.replace(tmp, path)
+        partitions[-1].update(bytes=path.stat().st_size, sha256=_sha256(path))
+
+    size = settings.EXPORT_BATCH_SIZE
+    try:
+        with connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=size).execute(query)
+            for rows in result.partitions(size):
+                start = 0
+                while start < len(rows):
+                    year = rows[start][year_index]
+                    end = start
+                    while end < len(rows) and rows[end][year_index] == year:
+                        end += 1
+                    if year != current:
+                        if writer is not None:
+                            close()
+                        current = year
+                        path = root / scheme / f"year={year}" / f"part-v{version}.parquet"
+                        path.parent.mkdir(parents=True, exist_ok=True)
+                        tmp = path.with_name(path.name + ".tmp")
+                        writer = pq.ParquetWriter(tmp, schema)
+                        partitions.append({"year": year, "path": path.relative_to(root).as_posix(), "rows": 0})
+                    values = list(zip(*rows[start:end]))
+                    batch = pa.Table.from_arrays([pa.array(v, type=f.type) for v, f in zip(values, schema)],
+                                                 schema=schema)
+                    writer.write_table(batch, row_group_size=settings.PARQUET_ROW_GROUP_SIZE)
+                    partitions[-1]["rows"] += end - start
+                    start = end
+        if writer is not None:
+            close()
+            writer = None
+    finally:
+        if writer is not None:
+            writer.close()
+            tmp.unlink(missing_ok=True)
+    return partitions
+
+
+def _remove_stale(scheme: str, root: Path, keep: Sequence[str]):
+    keep = {root / p for p in keep}
+    scheme_dir = root / scheme
+    for path in scheme_dir.glob("year=*/*.parquet*"):
+        if path not in keep:
+            path.unlink(missing_ok=True)
+    for year_dir in scheme_dir.glob("year=*"):
+        if year_dir.is_dir() and not any(year_dir.iterdir()):
+            year_dir.rmdir()
+
+
+def write_snapshot(scheme: str, root: Optional[Path] = None, force: bool = False) -> Optional[Dict[str, object]]:
+    """Write ``scheme``'s Parquet snapshot if its data version moved; return its manifest entry.
+
+    Returns None (after logging) when pyarrow is not installed.
+    """
+    if not pyarrow_available():
+        logger.warning("pyarrow is not installed; skipping Parquet snapshot of %s", scheme)
+        return None
+    root = root or cleaned_dir()
+    version = _data_version(scheme)
+    entry = read_manifest(root)["schemes"].get(scheme)
+    if (not force and entry and entry["version"] == version
+            and all((root / p["path"]).exists() for p in entry["partitions"])):
+        return entry
+
+    partitions = _write_years(scheme, root, version)
+    table = SCHEME_MODELS[scheme].__table__
+    entry = {
+        "version": version,
+        "written_at": datetime.now(timezone.utc).isoformat(),
+        "rows": sum(p["rows"] for p in partitions),
+        "columns": [c.name for c in table.columns if c.name not in ("id", "created_at", "row_hash")],
+        "partitions": partitions,
+    }
+    with _manifest_lock:
+        manifest = read_manifest(root)
+        manifest["schemes"][scheme] = entry
+        _write_atomic(root / MANIFEST, json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    _remove_stale(scheme, root, [p["path"] for p in partitions])
+    logger.info("Parquet snapshot of %s v%d: %d rows in %d files", scheme, version, entry["rows"], len(partitions))
+    return entry
+
+
+class CleanedStore:
+    """Dashboard aggregates computed from the Parquet snapshots with pyarrow.dataset."""
+
+    def __init__(self, enabled: bool, root: Optional[Path] = None):
+        self.enabled = enabled
+        self.root = root
+        self._manifest: Dict[str, object] = {}
+        self._manifest_mtime: Optional[int] = None
+        # scheme -> (version, dataset, {year: fragment}); fragments keep their parsed footers
+        self._datasets: Dict[str, tuple] = {}
+        self.queries = 0
+
+    def _entry(self, scheme: str) -> Optional[Dict[str, object]]:
+        root = self.root or cleaned_dir()
+        try:
+            mtime = (root / MANIFEST).stat().st_mtime_ns
+        except OSError:
+            return None
+        if mtime != self._manifest_mtime:
+            self._manifest, self._manifest_mtime = read_manifest(root), mtime
+        return self._manifest["schemes"].get(scheme)
+
+    def _dataset(self, scheme: str, entry: Dict[str, object]):
+        import pyarrow.dataset as ds
+
+        cached = self._datasets.get(scheme)
+        if cached is not None and cached[0] == entry["version"]:
+            return cached[1], cached[2]
+        root = self.root or cleaned_dir()
+        dataset = ds.dataset([str(root / p["path"]) for p in entry["partitions"]], format="parquet")
+        fragments = list(dataset.get_fragments())
+        for fragment in fragments:
+            fragment.ensure_complete_metadata()
+        by_year = {p["year"]: f for p, f in zip(entry["partitions"], fragments)}
+        self._datasets = {**self._datasets, scheme: (entry["version"], dataset, by_year)}
+        return dataset, by_year
+
+    def aggregate(self, scheme: str, by: Sequence[str], measures: Sequence[str], year: Optional[int] = None,
+                  state_name: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """Sum ``measures`` (NULL as 0) grouped by ``by``; None when disabled or ``scheme`` has no snapshot.
+
+        Same contract as ``store.SchemeColumns.aggregate``: ``row_count`` and
+        ``score`` are available as measures, and grouping by ``state_code``
+        also returns that state's ``state_name``.
+        """
+        if not self.enabled or scheme not in SCHEME_MODELS or not pyarrow_available():
+            return None
+        entry = self._entry(scheme)
+        if entry is None:
+            return None
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        dataset, by_year = self._dataset(scheme, entry)
+        if year is not None:
+            # partition pruning: only the year's file is opened
+            fragments = [by_year[year]] if year in by_year else []
+            dataset = ds.FileSystemDataset(fragments, dataset.schema, dataset.format, dataset.filesystem)
+        sums = [m for m in measures if m not in ("row_count", "score")]
+        if "score" in measures:
+            sums += [c for c in SCORE_COLUMNS[scheme] if c not in sums]
+        name_for_code = "state_code" in by and "state_name" not in by
+        columns = list(dict.fromkeys([*by, *sums, *(["state_name"] if name_for_code else [])]))
+        out_columns = [*by, *(["state_name"] if name_for_code else []), *measures]
+
+        self.queries += 1
+        data = dataset.to_table(columns=columns or ["year"],
+                                filter=(ds.field("state_name") == state_name) if state_name else None)
+        if data.num_rows == 0:
+            return pd.DataFrame(columns=out_columns)
+
+        aggregations = [(c, "sum") for c in sums] + [([], "count_all")]
+        if name_for_code:
+            # the name from the latest year, like the rollups keep the last one loaded
+            aggregations.append(("state_name", "last"))
+        grouped = data.group_by(list(by), use_threads=not name_for_code).aggregate(aggregations)
+        result = {k: grouped[k] for k in by}
+        if name_for_code:
+            result["state_name"] = grouped["state_name_last"]
+        for m in measures:
+            if m == "row_count":
+                result[m] = grouped["count_all"]
+            elif m == "score":
+                result[m] = reduce(pc.add, [pc.fill_null(grouped[f"{c}_sum"], 0) for c in SCORE_COLUMNS[scheme]])
+            else:
+                result[m] = pc.fill_null(grouped[f"{m}_sum"], 0)
+        df = pd.DataFrame({k: v.to_numpy(zero_copy_only=False) for k, v in result.items()})
+        return df.sort_values(list(by), kind="stable").reset_index(drop=True) if by else df
+
+    def stats(self) -> Dict[str, object]:
+        self._entry("")
+        return {
+            "enabled": self.enabled,
+            "queries": self.queries,
+            "schemes": {s: {"version": e["version"], "rows": e["rows"], "files": len(e["partitions"])}
+                        for s, e in self._manifest.get("schemes", {}).items()},
+        }
+
+
+@lru_cache(maxsize=None)
+def get_cleaned_store() -> CleanedStore:
+    return CleanedStore(settings.PARQUET_QUERY_ENABLED)
+
+
+def __getattr__(name: str):
+    if name == "cleaned_store":
+        return get_cleaned_store()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,16 +1,87 @@
 from pydantic import Field
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Any, List, Optional
+import functools
 
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    DATABASE_READ_URL: Optional[str] = Field(None, description="Read replica for dashboard queries; defaults to DATABASE_URL with its own pool")
+    DB_POOL_SIZE: int = Field(5, description="Persistent connections per engine pool")
+    DB_MAX_OVERFLOW: int = Field(10, description="Extra connections allowed beyond DB_POOL_SIZE under load")
+    DB_POOL_TIMEOUT: float = Field(30, description="Seconds to wait for a pooled connection before failing")
+    DB_POOL_RECYCLE: int = Field(1800, description="Replace pooled connections older than this many seconds (-1 disables)")
+    DB_POOL_PRE_PING: bool = Field(True, description="Test each connection on checkout (one extra round-trip)")
+    DATABASE_ASYNC_URL: Optional[str] = Field(None, description="Async driver URL for fanned-out dashboard queries; defaults to the read URL with asyncpg/aiosqlite")
+    ASYNC_DB_ENABLED: bool = Field(True, description="Run fanned-out dashboard queries on the async driver; off: on the sync read pool in threads")
+    QUERY_TIMEOUT_SECONDS: float = Field(10.0, description="Per-query timeout for dashboard queries fanned out concurrently")
+    ASGI_WSGI_THREADS: int = Field(10, description="Threads serving the sync views under gov_analytics.asgi")
+    DB_PARTITION_BY_YEAR: bool = Field(False, description="PostgreSQL: create year-keyed tables PARTITION BY RANGE (year), one partition per year")
     DATA_GOV_API_KEY: Optional[str] = None
     ETL_TRIGGER_SECRET: Optional[str] = None
     DVC_REMOTE: Optional[str] = None
     DEFAULT_TIMEOUT: int = Field(30, description="HTTP timeout seconds")
+    DATA_GOV_BASE_URL: str = "https://data.gov.in/api/datastore/resource.json"
+    EXTRACT_PAGE_SIZE: int = Field(1000, description="Records requested per API page")
+    EXTRACT_MAX_CONCURRENCY: int = Field(8, description="Max in-flight page requests")
+    EXTRACT_MAX_RETRIES: int = Field(3, description="Retries per page before giving up")
+    EXTRACT_BACKOFF_SECONDS: float = Field(0.5, description="Initial retry backoff, doubled per attempt")
+    RAW_CACHE_ENABLED: bool = Field(True, description="Cache raw API pages and skip loads of unchanged resources")
+    RAW_CACHE_DIR: Optional[str] = Field(None, description="Raw page cache root; defaults to data/raw")
+    ETL_CHUNK_SIZE: int = Field(5000, description="Records per batch in streaming ETL mode")
+    ETL_PIPELINE_PARALLELISM: int = Field(4, description="Schemes run concurrently by full_etl_pipeline")
+    ETL_TRACE_MEMORY: bool = Field(False, description="Report per-stage traced heap peaks (tracemalloc) instead of process peak RSS")
+    UPSERT_BATCH_SIZE: int = Field(5000, description="Rows per executemany batch in upsert_records")
+    UPSERT_COPY_THRESHOLD: int = Field(50000, description="PostgreSQL loads at least this large use COPY + staging table")
+    ETL_DELETE_MISSING: bool = Field(False, description="Delete stored rows absent from a complete state-level load of a resource")
+    ETL_CHANGE_LOG_ENABLED: bool = Field(False, description="Record every inserted, updated and deleted row key in etl_row_changes")
+    QUERY_CACHE_ENABLED: bool = True
+    QUERY_CACHE_URL: Optional[str] = Field(None, description="sqlite:///path for a cache shared across workers")
+    QUERY_CACHE_TTL: int = Field(300, description="Seconds a cached query result stays valid")
+    QUERY_CACHE_MAX_ENTRIES: int = 512
+    QUERY_CACHE_MAX_BYTES: int = Field(64 * 1024 * 1024, description="Approximate size bound of cached results")
+    CHART_CACHE_TTL: int = Field(3600, description="Seconds a rendered chart stays cached")
+    CHART_CACHE_MAX_ENTRIES: int = 256
+    CHART_EMBED_MODE: str = Field("inline", description="inline: embed chart HTML; json: load from /chart/<name>.json")
+    ANALYTICS_STORE_ENABLED: bool = Field(False, description="Serve dashboard aggregates from an in-memory columnar copy of the scheme tables")
+    ANALYTICS_STORE_CHECK_SECONDS: float = Field(5.0, description="How often the store re-checks data_versions for new loads")
+    CLEANED_DIR: Optional[str] = Field(None, description="Parquet snapshots of the scheme tables; defaults to data/cleaned")
+    PARQUET_SNAPSHOTS_ENABLED: bool = Field(True, description="Write a Parquet snapshot of each scheme after its ETL run (needs pyarrow)")
+    PARQUET_ROW_GROUP_SIZE: int = Field(65536, description="Max rows per Parquet row group in snapshots")
+    PARQUET_QUERY_ENABLED: bool = Field(False, description="Serve dashboard aggregates from the Parquet snapshots")
+    GEOJSON_PATH: Optional[str] = Field(None, description="State boundaries; defaults to dashboard/static/data/india_states.geojson")
+    GEOJSON_TOLERANCES: List[float] = Field([0.0, 0.005, 0.02], description="Allowed simplification tolerances (degrees)")
+    GEOJSON_DEFAULT_TOLERANCE: float = 0.005
+    POPULATION_PATH: Optional[str] = Field(None, description="CSV of state_code,population for per-capita metrics; defaults to data/population.csv")
+    ETL_MAX_WORKERS: int = Field(2, description="Concurrent ETL jobs run by the /trigger_etl scheduler")
+    ETL_MAX_PENDING: int = Field(8, description="Jobs allowed to wait for a worker before /trigger_etl returns 429")
+    EXPORT_BATCH_SIZE: int = Field(10000, description="Rows fetched and encoded per chunk in /export")
 
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8", "extra": "ignore"}
 
 
-settings = Settings()
+@functools.lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Settings read from the environment and ``.env``, once, on first use."""
+    return Settings()
+
+
+class _LazySettings:
+    """``settings`` stand-in that builds ``Settings`` on first attribute access.
+
+    Importing a module that only reads settings inside functions costs
+    nothing and does not need a ``DATABASE_URL``, and scripts can set
+    environment variables after importing and before first use.
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(get_settings(), name, value)
+
+    def __repr__(self) -> str:
+        return repr(get_settings())
+
+
+settings: Settings = _LazySettings()  # type: ignore[assignment]
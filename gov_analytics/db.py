@@ -1,13 +1,213 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from contextlib import contextmanager
+from sqlalchemy import bindparam, create_engine, event, insert, select, text, tuple_, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql import Executable
+from sqlalchemy.orm import Session
 from sqlalchemy.ext.declarative import declarative_base
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 from .config import settings
+import threading
+import time
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def _engine_kwargs(url: str) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # in-memory SQLite uses a per-thread singleton pool with no size settings
+        return kwargs
+    kwargs.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    return kwargs
+
+
+class PoolStats:
+    """Checkout counters for one engine's pool, plus acquisition wait time seen by ``connect``."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.checkouts = 0
+        self.connects = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._lock = threading.Lock()
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "connect", self._on_connect)
+
+    def _on_checkout(self, *args):
+        with self._lock:
+            self.checkouts += 1
+
+    def _on_connect(self, *args):
+        with self._lock:
+            self.connects += 1
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        pool = self.engine.pool
+        stats = {
+            "pool": type(pool).__name__,
+            "checkouts": self.checkouts,
+            "connects": self.connects,
+            "wait_seconds": round(self.wait_seconds, 6),
+            "max_wait_seconds": round(self.max_wait_seconds, 6),
+        }
+        for name in ("size", "checkedout", "overflow", "checkedin"):
+            if hasattr(pool, name):
+                stats[name] = getattr(pool, name)()
+        return stats
 
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Engines are created on first use rather than at import, so importing the
+# package (CLI --help, the app factory, a preloading server master) opens no
+# pool and needs no database settings, and forked workers build their own.
+_engines: Dict[str, Any] = {}
+_engines_lock = threading.Lock()
+_listeners: List[Tuple[str, Callable]] = []
+pool_stats: Dict[str, PoolStats] = {}
+
+
+def _create_engines():
+    write = create_engine(settings.DATABASE_URL, **_engine_kwargs(settings.DATABASE_URL))
+    # Dashboard reads get their own pool (and optionally a replica) so they never
+    # queue behind ETL writers; in-memory SQLite must share the writer's database.
+    read_url = settings.DATABASE_READ_URL or settings.DATABASE_URL
+    if not settings.DATABASE_READ_URL and "pool_size" not in _engine_kwargs(read_url):
+        read = write
+    else:
+        read = create_engine(read_url, **_engine_kwargs(read_url))
+    pool_stats["write"] = PoolStats(write)
+    if read is not write:
+        pool_stats["read"] = PoolStats(read)
+    for bind in {write, read}:
+        for identifier, fn in _listeners:
+            event.listen(bind, identifier, fn)
+    _engines.update(write=write, read=read)
+
+
+def _get(role: str):
+    if not _engines:
+        with _engines_lock:
+            if not _engines:
+                _create_engines()
+    return _engines[role]
+
+
+def get_engine():
+    """The read/write engine, created on first call."""
+    return _get("write")
+
+
+def get_read_engine():
+    """The dashboard read engine (the write engine unless it needs a pool of its own)."""
+    return _get("read")
+
+
+def listen_engines(identifier: str, fn: Callable):
+    """``event.listen`` on the write and read engines, now or whenever they are created."""
+    with _engines_lock:
+        _listeners.append((identifier, fn))
+        for bind in set(_engines.values()):
+            event.listen(bind, identifier, fn)
+
+
+def __getattr__(name: str):
+    # ``from .db import engine`` keeps working; it creates the engines at that point
+    if name == "engine":
+        return get_engine()
+    if name == "read_engine":
+        return get_read_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class SessionLocal(Session):
+    """ORM session on the write engine; ``SessionLocal()`` as before."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("bind", get_engine())
+        kwargs.setdefault("autoflush", False)
+        super().__init__(**kwargs)
+
+
+@contextmanager
+def connect(bind=None) -> Iterator[Any]:
+    """Core connection from ``bind`` (default: the read engine), timing the pool wait."""
+    read_engine = get_read_engine()
+    bind = bind if bind is not None else read_engine
+    stats = pool_stats["read" if bind is read_engine and "read" in pool_stats else "write"]
+    started = time.perf_counter()
+    conn = bind.connect()
+    stats.record_wait(time.perf_counter() - started)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def read_sql(sql: Union[str, Executable], params: Optional[Dict[str, Any]] = None) -> "pd.DataFrame":
+    """Run a read-only query (SQL text or a Core statement) on the read engine without an ORM session."""
+    import pandas as pd
+    with connect() as conn:
+        return pd.read_sql(text(sql) if isinstance(sql, str) else sql, conn, params=params)
+
+
+def merge_rows(conn, table, rows: List[Dict[str, Any]], keys, columns, increment=()):
+    """Portable upsert for dialects without ``INSERT ... ON CONFLICT``.
+
+    Selects which of the rows' ``keys`` already exist, sets ``columns`` and
+    adds the row's values to the ``increment`` columns of those rows, and
+    inserts the rest. ``conn`` is a connection or session; the caller owns the
+    transaction.
+    """
+    if not rows:
+        return
+    key_cols = tuple_(*(table.c[k] for k in keys))
+    found = {tuple(k) for k in conn.execute(select(*(table.c[k] for k in keys))
+                                          .where(key_cols.in_([tuple(r[k] for k in keys) for r in rows]))).all()}
+    existing = [r for r in rows if tuple(r[k] for k in keys) in found]
+    new = [r for r in rows if tuple(r[k] for k in keys) not in found]
+    if new:
+        conn.execute(insert(table), new)
+    if existing and (columns or increment):
+        # parameters are renamed so they cannot clash with the column names
+        values = {c: bindparam(f"v_{c}") for c in columns}
+        values.update({c: table.c[c] + bindparam(f"v_{c}") for c in increment})
+        stmt = update(table).where(*(table.c[k] == bindparam(f"k_{k}") for k in keys)).values(values)
+        conn.execute(stmt, [{**{f"v_{c}": r[c] for c in values}, **{f"k_{k}": r[k] for k in keys}}
+                            for r in existing])
+
+
+def init_schema(bind=None):
+    """Create missing tables and bring existing ones up to date (keys, columns, indexes, partitions, rollups)."""
+    # imported here: they import this module and register their tables (and the fact tables) on ``Base``
+    from . import models, partitions, rollups
+    bind = bind if bind is not None else get_engine()
+    partitions.create_partitioned_tables(bind)
+    Base.metadata.create_all(bind=bind)
+    deduped = models.ensure_natural_keys(bind)
+    models.ensure_row_hash_columns(bind)
+    models.ensure_indexes(bind)
+    partitions.ensure_existing_years(bind)
+    rollups.ensure_rollups(bind)
+    if deduped:
+        # rollups built from the duplicated rows counted them twice
+        with bind.begin() as conn:
+            for scheme in deduped:
+                rollups.rebuild_rollups(conn, scheme)
+
 
 def get_session():
     db = SessionLocal()
@@ -1,34 +1,205 @@
-import requests
+import asyncio
+import aiohttp
+from pathlib import Path
 from ..config import settings
-from typing import Dict, Any, List, Optional
+from ..metrics import add_bytes
+from .page_cache import PageCache
+from typing import Dict, Any, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import hashlib
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _extract_records(payload: Any) -> List[Dict[str, Any]]:
+    # common pattern: payload['records'] or payload['data']
+    if isinstance(payload, dict):
+        if "records" in payload:
+            return payload["records"]
+        if "data" in payload:
+            return payload["data"]
+        logger.warning("Unexpected payload shape from data.gov.in: keys=%s", list(payload.keys()))
+        return []
+    # else return full payload if it's a list
+    if isinstance(payload, list):
+        return payload
+    return []
+
+
+def _extract_total(payload: Any) -> Optional[int]:
+    if not isinstance(payload, dict):
+        return None
+    try:
+        return int(payload.get("total"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def _fetch_page(session: aiohttp.ClientSession, sem: asyncio.Semaphore, base: str,
+                      params: Dict[str, Any], offset: int, limit: int,
+                      cache: Optional[PageCache] = None) -> Tuple[List[Dict[str, Any]], Optional[int], Optional[str]]:
+    """Fetch one page as ``(records, total, object_id)``, retrying with exponential backoff.
+
+    With a ``cache`` the request is conditional on the stored validators, a 304
+    is answered from disk, and every page is stored so its object id is known.
+    """
+    page_params = {**params, "offset": offset, "limit": limit}
+    resource_id = params.get("resource_id", "")
+    key = cache.page_key(resource_id, params, offset, limit) if cache else None
+    entry = cache.lookup(resource_id, key) if cache else None
+    headers = cache.conditional_headers(entry) if cache else {}
+    attempts = max(1, settings.EXTRACT_MAX_RETRIES + 1)
+    for attempt in range(attempts):
+        try:
+            async with sem:
+                async with session.get(base, params=page_params, headers=headers) as resp:
+                    if resp.status == 304 and entry:
+                        return cache.load(entry["object"]), entry["total"], entry["object"]
+                    resp.raise_for_status()
+                    body = await resp.read()
+                    add_bytes(len(body))
+                    payload = json.loads(body)
+                    etag, last_modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+            break
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            if attempt == attempts - 1:
+                raise
+            delay = settings.EXTRACT_BACKOFF_SECONDS * (2 ** attempt)
+            logger.warning("Page offset=%s failed (%s), retrying in %.1fs", offset, e, delay)
+            await asyncio.sleep(delay)
+    records, total = _extract_records(payload), _extract_total(payload)
+    if cache is None:
+        return records, total, None
+    stored = cache.store(resource_id, key, records, total, etag, last_modified)
+    return records, total, stored["object"]
+
+
+async def _fetch_window(session: aiohttp.ClientSession, sem: asyncio.Semaphore, base: str,
+                        params: Dict[str, Any], offsets: List[int], limit: int,
+                        cache: Optional[PageCache] = None) -> list:
+    return await asyncio.gather(*(_fetch_page(session, sem, base, params, o, limit, cache) for o in offsets))
+
+
+def _iter_pages(resource_id: str, params: Optional[Dict[str, Any]], page_size: Optional[int],
+                max_concurrency: Optional[int], base_url: Optional[str],
+                cache: Optional[PageCache]) -> Iterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+    base = base_url or settings.DATA_GOV_BASE_URL
+    limit = page_size or settings.EXTRACT_PAGE_SIZE
+    concurrency = max(1, max_concurrency or settings.EXTRACT_MAX_CONCURRENCY)
+    params = dict(params or {})
+    params.update({"resource_id": resource_id, "api-key": settings.DATA_GOV_API_KEY or "", "format": "json"})
+
+    loop = asyncio.new_event_loop()
+
+    async def _open_session() -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        timeout = aiohttp.ClientTimeout(total=settings.DEFAULT_TIMEOUT)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    session = loop.run_until_complete(_open_session())
+    sem = asyncio.Semaphore(concurrency)
+    try:
+        records, total, object_id = loop.run_until_complete(_fetch_page(session, sem, base, params, 0, limit, cache))
+        yield records, object_id
+        if not records or (total is None and len(records) < limit):
+            return
+        if total is not None and len(records) < limit:
+            # the server capped the page size; page by what it actually returns
+            limit = len(records)
+
+        offset = len(records)
+        while total is None or offset < total:
+            offsets = [offset + i * limit for i in range(concurrency)]
+            if total is not None:
+                offsets = [o for o in offsets if o < total]
+            pages = loop.run_until_complete(_fetch_window(session, sem, base, params, offsets, limit, cache))
+            for page, _, object_id in pages:
+                if page:
+                    yield page, object_id
+                if total is None and len(page) < limit:
+                    return
+            offset = offsets[-1] + limit
+    finally:
+        loop.run_until_complete(session.close())
+        loop.close()
+
+
+def iter_datagov_pages(resource_id: str, params: Optional[Dict[str, Any]] = None,
+                       page_size: Optional[int] = None, max_concurrency: Optional[int] = None,
+                       base_url: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+    """Yield pages of records for a data.gov.in resource, in offset order.
+
+    The first page is fetched alone to learn the ``total`` count; the remaining
+    pages are fetched concurrently in windows of ``max_concurrency`` requests over
+    a single pooled connection session. If the API does not report a total,
+    windows are fetched until a short page is returned. At most one window of
+    pages is held in memory at a time.
+    """
+    for records, _ in _iter_pages(resource_id, params, page_size, max_concurrency, base_url, None):
+        yield records
+
+
+class ResourceSnapshot(NamedTuple):
+    """A fully downloaded resource, held as page objects in the raw-page cache."""
+    resource_id: str
+    content_hash: str
+    objects: Tuple[str, ...]
+    rows: int
+    cache_root: str
+
+    def pages(self) -> Iterator[List[Dict[str, Any]]]:
+        cache = PageCache(Path(self.cache_root))
+        for object_id in self.objects:
+            yield cache.load(object_id)
+
+    def records(self) -> List[Dict[str, Any]]:
+        return [r for page in self.pages() for r in page]
+
+
+def snapshot_resource(resource_id: str, cache: PageCache, params: Optional[Dict[str, Any]] = None,
+                      page_size: Optional[int] = None, max_concurrency: Optional[int] = None,
+                      base_url: Optional[str] = None) -> ResourceSnapshot:
+    """Download every page of ``resource_id`` into ``cache`` and hash the result.
+
+    Pages go to disk as they arrive, so memory stays bounded by one window.
+    The hash covers the ordered page contents and is therefore stable across
+    runs while the upstream data is unchanged.
+    """
+    digest = hashlib.sha256()
+    objects: List[str] = []
+    rows = 0
+    for records, object_id in _iter_pages(resource_id, params, page_size, max_concurrency, base_url, cache):
+        digest.update(object_id.encode("ascii"))
+        objects.append(object_id)
+        rows += len(records)
+    return ResourceSnapshot(resource_id, digest.hexdigest(), tuple(objects), rows, str(cache.root))
+
+
+def rechunk(pages: Iterable[List[Dict[str, Any]]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Re-batch an iterable of pages into lists of exactly ``size`` records (last may be short)."""
+    buf: List[Dict[str, Any]] = []
+    for page in pages:
+        buf.extend(page)
+        while len(buf) >= size:
+            yield buf[:size]
+            buf = buf[size:]
+    if buf:
+        yield buf
+
+
 def fetch_data_from_datagov(resource_id: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     """Fetch JSON records from data.gov.in API for a given resource id.
 
     This function expects the data.gov.in API that returns records under a 'records' key.
     The real API may have different structure; adapt resource_id and key accordingly.
+    All pages are fetched (see ``iter_datagov_pages``) and concatenated.
     """
-    base = "https://data.gov.in/api/datastore/resource.json"
-    params = params or {}
-    params.update({"resource_id": resource_id, "api-key": settings.DATA_GOV_API_KEY or ""})
     try:
-        resp = requests.get(base, params=params, timeout=settings.DEFAULT_TIMEOUT)
-        resp.raise_for_status()
-        payload = resp.json()
-        # common pattern: payload['records'] or payload['data']
-        if "records" in payload:
-            return payload["records"]
-        if "data" in payload:
-            return payload["data"]
-        # else return full payload if it's a list
-        if isinstance(payload, list):
-            return payload
-        logger.warning("Unexpected payload shape from data.gov.in: keys=%s", list(payload.keys()))
-        return []
+        records: List[Dict[str, Any]] = []
+        for page in iter_datagov_pages(resource_id, params):
+            records.extend(page)
+        return records
     except Exception as e:
         logger.exception("Failed to fetch data for resource %s: %s", resource_id, e)
         return []
@@ -1,22 +1,460 @@
+from contextlib import contextmanager
+from sqlalchemy import delete, insert, select, text, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
+from ..config import settings
+from ..db import merge_rows
+from ..cache import get_query_cache
+from ..store import get_analytics_store
+from .. import facts, partitions, rollups
+from ..facts import FACTS, STOCK_METRICS, dim_district, dim_state, metric_names
+from ..metrics import current_run_id
+from ..models import SCHEME_MODELS, DataVersion, EtlRowChange
+import pandas as pd
+import csv
+import hashlib
+import io
+import json
+import math
+import numbers
 import logging
-from typing import List, Dict, Type
+import threading
+from typing import Any, Iterable, List, Dict, Optional, Set, Tuple, Type
 
 logger = logging.getLogger(__name__)
 
+NATURAL_KEY = ("state_code", "year")
+ROW_HASH = "row_hash"
+_SKIP_COLUMNS = {"id", "created_at"}
+_DIALECT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
 
-def upsert_records(db: Session, model: Type, records: List[Dict]):
-    """Simple bulk upsert: naive implementation that inserts records.
 
-    For production, implement ON CONFLICT upsert or use SQLAlchemy core with
-    PostgreSQL-specific conflict resolution.
+# one lock per table loaded into; see _load_lock
+_load_locks: Dict[str, threading.RLock] = {}
+_load_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _load_lock(db: Session, name: str):
+    """Serialize loads into table ``name`` until the caller's transaction ends inside the block.
+
+    Each load computes its rollup delta from the stored rows it reads first, so
+    two concurrent loads of the same keys would both subtract the same old
+    values. A process-wide lock orders loads from threads (job scheduler,
+    concurrent flow runs); on PostgreSQL a transaction-level advisory lock on
+    the table name also orders loads from other processes.
+    """
+    with _load_locks_guard:
+        lock = _load_locks.setdefault(name, threading.RLock())
+    with lock:
+        if db.get_bind().dialect.name == "postgresql":
+            # Python's hash() differs between processes; the lock key must not
+            key = int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), "big", signed=True)
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": key})
+        yield
+
+
+def _db_errors(db: Session) -> tuple:
+    # raw-cursor COPY raises driver errors rather than SQLAlchemy ones
+    dbapi = getattr(db.get_bind().dialect, "loaded_dbapi", None) or db.get_bind().dialect.dbapi
+    return SQLAlchemyError, getattr(dbapi, "Error", SQLAlchemyError)
+
+
+def _clean(value: Any, is_int: bool) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        if is_int and value.is_integer():
+            return int(value)
+    return value
+
+
+def _canonical(value: Any, kind: Optional[type]) -> Any:
+    # the same stored value must always encode the same way: 5, 5.0 and
+    # numpy.int64(5) in an integer column are all 5, and 5 in a float column is 5.0
+    if value is None:
+        return None
+    if isinstance(value, numbers.Integral) and not isinstance(value, bool):
+        return float(value) if kind is float else int(value)
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        return int(value) if kind is int and value.is_integer() else value
+    return str(value)
+
+
+def row_hash(values: Iterable[Any], kinds: Iterable[Optional[type]]) -> str:
+    """Content digest of one row's column ``values``, stored in ``row_hash`` to detect changed rows."""
+    encoded = json.dumps([_canonical(v, k) for v, k in zip(values, kinds)], separators=(",", ":"))
+    return hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
+
+
+def _prepare_rows(table, records: List[Dict]) -> List[Dict]:
+    """Keep only writable table columns, normalise NaN/None and dedupe on the natural key (last wins).
+
+    On tables with a ``row_hash`` column each row gets the hash of its values.
+    """
+    cols = [c for c in table.columns if c.name not in _SKIP_COLUMNS and c.name != ROW_HASH]
+    int_cols = {c.name for c in cols if getattr(c.type, "python_type", None) is int}
+    names = [c.name for c in cols]
+    kinds = [getattr(c.type, "python_type", None) for c in cols]
+    hashed = ROW_HASH in table.c
+    rows: Dict[tuple, Dict] = {}
+    for r in records:
+        row = {n: _clean(r.get(n), n in int_cols) for n in names}
+        if hashed:
+            row[ROW_HASH] = row_hash(row.values(), kinds)
+        rows[tuple(row[k] for k in NATURAL_KEY)] = row
+    return list(rows.values())
+
+
+def natural_keys(records: Iterable[Dict]) -> Set[tuple]:
+    """``(state_code, year)`` keys of ``records``, normalised as ``upsert_records`` stores them."""
+    return {(r.get("state_code"), _clean(r.get("year"), True)) for r in records}
+
+
+def _fetch_existing(db: Session, table, rows: List[Dict]) -> pd.DataFrame:
+    """Stored versions of the rows in ``rows`` that already exist, keyed on the natural key."""
+    keys = [tuple(r[k] for k in NATURAL_KEY) for r in rows]
+    key_cols = tuple_(*(table.c[k] for k in NATURAL_KEY))
+    cols = [c for c in table.columns if c.name not in _SKIP_COLUMNS]
+    result = db.execute(select(*cols).where(key_cols.in_(keys)))
+    return pd.DataFrame(result.all(), columns=[c.name for c in cols])
+
+
+def _diff(rows: List[Dict], old: pd.DataFrame) -> Tuple[List[Dict], List[Dict]]:
+    """The new and changed rows among ``rows``, given the stored versions ``old`` of their keys.
+
+    Returns the rows to write and one change record per row. A row is
+    unchanged when its stored ``row_hash`` equals the incoming one; rows stored
+    without a hash count as changed, which fills the hash in.
     """
-    objs = [model(**r) for r in records]
+    stored: Dict[tuple, Optional[str]] = {}
+    if not old.empty:
+        hashes = old[ROW_HASH] if ROW_HASH in old else [None] * len(old)
+        stored = dict(zip(zip(old["state_code"], old["year"]), hashes))
+    write, changes = [], []
+    for row in rows:
+        key = (row["state_code"], row["year"])
+        new_hash = row.get(ROW_HASH)
+        if key not in stored:
+            change = "insert"
+        elif new_hash is None or stored[key] != new_hash:
+            change = "update"
+        else:
+            continue
+        write.append(row)
+        changes.append({"state_code": key[0], "year": key[1], "change": change,
+                        "old_hash": stored.get(key), "new_hash": new_hash})
+    return write, changes
+
+
+def _log_changes(db: Session, scheme: str, changes: List[Dict]):
+    """Append ``changes`` to ``etl_row_changes`` in the load's transaction when ``ETL_CHANGE_LOG_ENABLED``."""
+    if not settings.ETL_CHANGE_LOG_ENABLED or not changes:
+        return
+    run_id = current_run_id()
+    db.execute(insert(EtlRowChange.__table__), [{"scheme": scheme, "run_id": run_id, **c} for c in changes])
+
+
+def _apply_rollups(db: Session, table, old: pd.DataFrame, rows: List[Dict]):
+    if table.name in rollups.ROLLUPS:
+        rollups.apply_delta(db.connection(), table.name, old, pd.DataFrame(rows))
+
+
+def _bump_version(db: Session, scheme: str, insert_fn):
+    table = DataVersion.__table__
+    if insert_fn is None:
+        bumped = db.execute(update(table).where(table.c.scheme == scheme).values(version=table.c.version + 1))
+        if not bumped.rowcount:
+            db.execute(insert(table).values(scheme=scheme, version=1))
+        return
+    stmt = insert_fn(table).values(scheme=scheme, version=1)
+    stmt = stmt.on_conflict_do_update(index_elements=["scheme"], set_={"version": table.c.version + 1})
+    db.execute(stmt)
+
+
+def _upsert_batches(db: Session, table, rows: List[Dict], insert_fn) -> List[Dict]:
+    """INSERT ... ON CONFLICT DO UPDATE of the new and changed rows in executemany batches. Returns the changes.
+
+    Without a dialect insert (``insert_fn`` None) rows are written with ``merge_rows``.
+    """
+    update_cols = [c for c in rows[0] if c not in NATURAL_KEY]
+    if insert_fn is not None:
+        stmt = insert_fn(table)
+        stmt = stmt.on_conflict_do_update(index_elements=list(NATURAL_KEY),
+                                          set_={c: stmt.excluded[c] for c in update_cols})
+    changes: List[Dict] = []
+    size = settings.UPSERT_BATCH_SIZE
+    for i in range(0, len(rows), size):
+        batch = rows[i:i + size]
+        old = _fetch_existing(db, table, batch)
+        write, batch_changes = _diff(batch, old)
+        if write:
+            if insert_fn is None:
+                merge_rows(db, table, write, NATURAL_KEY, update_cols)
+            else:
+                db.execute(stmt, write)
+            _apply_rollups(db, table, old, write)
+        changes.extend(batch_changes)
+    return changes
+
+
+def _copy_upsert(db: Session, table, rows: List[Dict]) -> List[Dict]:
+    """PostgreSQL only: COPY rows into a temp staging table, then merge the new and changed ones with one INSERT ... SELECT."""
+    names = list(rows[0])
+    col_list = ", ".join(names)
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in names if c not in NATURAL_KEY)
+    key_list = ", ".join(NATURAL_KEY)
+    stage = f"_stage_{table.name}"
+    # staged rows whose stored version has the same hash are left alone
+    changed_only = (f" WHERE NOT EXISTS (SELECT 1 FROM {table.name} t WHERE t.state_code = s.state_code "
+                    f"AND t.year = s.year AND t.{ROW_HASH} = s.{ROW_HASH})" if ROW_HASH in names else "")
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for r in rows:
+        writer.writerow(["" if r[n] is None else r[n] for n in names])
+    buf.seek(0)
+
+    cur = db.connection().connection.cursor()
     try:
-        for o in objs:
-            db.merge(o)
-        db.commit()
-    except SQLAlchemyError as e:
-        db.rollback()
-        logger.exception("Failed to upsert records: %s", e)
+        cur.execute(f"CREATE TEMP TABLE {stage} (LIKE {table.name} INCLUDING DEFAULTS) ON COMMIT DROP")
+        cur.copy_expert(f"COPY {stage} ({col_list}) FROM STDIN WITH (FORMAT csv)", buf)
+        cur.execute(
+            f"SELECT {', '.join('t.' + n for n in names)} FROM {table.name} t "
+            f"JOIN {stage} s ON t.state_code = s.state_code AND t.year = s.year"
+        )
+        old = pd.DataFrame(cur.fetchall(), columns=names)
+        write, changes = _diff(rows, old)
+        if write:
+            cur.execute(
+                f"INSERT INTO {table.name} ({col_list}) SELECT {col_list} FROM {stage} s{changed_only} "
+                f"ON CONFLICT ({key_list}) DO UPDATE SET {updates}"
+            )
+    finally:
+        cur.close()
+    if write:
+        _apply_rollups(db, table, old, write)
+    return changes
+
+
+def upsert_records(db: Session, model: Type, records: List[Dict]) -> Dict[str, int]:
+    """Bulk upsert records keyed on ``(state_code, year)``, writing only rows that changed.
+
+    Each row's ``row_hash`` is compared with the stored one: new keys are
+    inserted, rows whose hash differs are updated and the rest are not
+    written at all. Uses dialect ``INSERT ... ON CONFLICT DO UPDATE`` in
+    executemany batches of ``UPSERT_BATCH_SIZE`` on PostgreSQL and SQLite;
+    other dialects select the batch's existing keys, then update and insert
+    (``db.merge_rows``). On PostgreSQL, loads of at least ``UPSERT_COPY_THRESHOLD`` rows are COPYed
+    into a staging table and merged in a single statement. Columns not on the
+    table (e.g. derived transform metrics) are ignored. Scheme rollups are
+    updated with the delta, changes are logged to ``etl_row_changes`` if
+    ``ETL_CHANGE_LOG_ENABLED`` and the table's ``DataVersion`` is bumped in the
+    same transaction; a load that changes nothing leaves the version, caches
+    and analytics store alone. Returns ``{"inserted", "updated", "unchanged"}``;
+    if the load fails it is rolled back and the database error re-raised.
+    """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    table = model.__table__
+    rows = _prepare_rows(table, records)
+    if not rows:
+        return counts
+
+    insert_fn = _DIALECT_INSERTS.get(db.get_bind().dialect.name)
+    if table.name in SCHEME_MODELS:
+        partitions.ensure_year_partitions(db.get_bind(), table.name, {r["year"] for r in rows})
+    with _load_lock(db, table.name):
+        try:
+            changes = _write_rows(db, table, rows, insert_fn)
+            db.commit()
+        except _db_errors(db) as e:
+            db.rollback()
+            logger.error("Failed to upsert records into %s, rolled back: %s", table.name, e)
+            raise
+    if changes:
+        _loaded(table.name)
+    counts["inserted"] = sum(c["change"] == "insert" for c in changes)
+    counts["updated"] = len(changes) - counts["inserted"]
+    counts["unchanged"] = len(rows) - len(changes)
+    return counts
+
+
+def _write_rows(db: Session, table, rows: List[Dict], insert_fn) -> List[Dict]:
+    """Write the new and changed ``rows`` with their rollup delta, change log and version bump; no commit."""
+    if db.get_bind().dialect.name == "postgresql" and len(rows) >= settings.UPSERT_COPY_THRESHOLD:
+        changes = _copy_upsert(db, table, rows)
+    else:
+        changes = _upsert_batches(db, table, rows, insert_fn)
+    if changes:
+        _log_changes(db, table.name, changes)
+        _bump_version(db, table.name, insert_fn)
+    return changes
+
+
+def _loaded(name: str):
+    """After a committed load that changed ``name``: drop the cached results and store snapshot it made stale."""
+    get_query_cache().invalidate(rollups.dependent_tables(name))
+    get_analytics_store().notify_load(name)
+
+
+def delete_missing(db: Session, model: Type, keys: Set[tuple]) -> int:
+    """Delete the rows of ``model``'s table whose ``(state_code, year)`` is not in ``keys``.
+
+    For a load that covered a whole resource (``ETL_DELETE_MISSING``):
+    ``keys`` are all of its keys (see ``natural_keys``), and rows the
+    publisher dropped are deleted, subtracted from the rollups and logged as
+    ``delete`` changes in one transaction. Returns the number of rows deleted;
+    a failed delete is rolled back and its database error re-raised.
+    """
+    table = model.__table__
+    key_cols = tuple_(*(table.c[k] for k in NATURAL_KEY))
+    insert_fn = _DIALECT_INSERTS.get(db.get_bind().dialect.name)
+    with _load_lock(db, table.name):
+        try:
+            missing = [tuple(k) for k in db.execute(select(*(table.c[k] for k in NATURAL_KEY))).all()
+                       if tuple(k) not in keys]
+            size = settings.UPSERT_BATCH_SIZE
+            for i in range(0, len(missing), size):
+                batch = missing[i:i + size]
+                old = _fetch_existing(db, table, [dict(zip(NATURAL_KEY, k)) for k in batch])
+                db.execute(delete(table).where(key_cols.in_(batch)))
+                _apply_rollups(db, table, old, [])
+                hashes = old[ROW_HASH] if ROW_HASH in old else [None] * len(old)
+                _log_changes(db, table.name, [{"state_code": code, "year": int(year), "change": "delete",
+                                               "old_hash": h, "new_hash": None}
+                                              for code, year, h in zip(old["state_code"], old["year"], hashes)])
+            if missing:
+                _bump_version(db, table.name, insert_fn)
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.error("Failed to delete missing rows of %s, rolled back: %s", table.name, e)
+            raise
+    if not missing:
+        return 0
+    _loaded(table.name)
+    logger.info("Deleted %d rows of %s absent from the load", len(missing), table.name)
+    return len(missing)
+
+
+DIM_COLUMNS = ("state_code", "state_name", "district_code", "district_name")
+
+
+def _merge(db: Session, table, rows: List[Dict], keys, insert_fn, columns=None):
+    """Plain ``INSERT ... ON CONFLICT (keys) DO UPDATE`` of ``rows`` in ``UPSERT_BATCH_SIZE`` batches.
+
+    Without a dialect insert (``insert_fn`` None) each batch goes through ``merge_rows``.
+    """
+    columns = [c for c in rows[0] if c not in keys] if columns is None else columns
+    size = settings.UPSERT_BATCH_SIZE
+    if insert_fn is None:
+        for i in range(0, len(rows), size):
+            merge_rows(db, table, rows[i:i + size], keys, columns)
+        return
+    stmt = insert_fn(table)
+    stmt = stmt.on_conflict_do_update(index_elements=list(keys), set_={c: stmt.excluded[c] for c in columns})
+    for i in range(0, len(rows), size):
+        db.execute(stmt, rows[i:i + size])
+
+
+def _upsert_dimensions(db: Session, df: pd.DataFrame, insert_fn) -> pd.DataFrame:
+    """Upsert the batch's states and districts; return ``df`` with ``state_id`` and ``district_id``."""
+    states = df.drop_duplicates("state_code", keep="last")
+    _merge(db, dim_state, states[["state_code", "state_name"]].to_dict(orient="records"), ["state_code"], insert_fn)
+    state_ids = dict(db.execute(select(dim_state.c.state_code, dim_state.c.state_id)
+                                .where(dim_state.c.state_code.in_(states["state_code"].tolist()))).all())
+    df = df.assign(state_id=df["state_code"].map(state_ids))
+
+    districts = df.drop_duplicates("district_code", keep="last")
+    _merge(db, dim_district, districts[["district_code", "district_name", "state_id"]].to_dict(orient="records"),
+           ["district_code"], insert_fn)
+    district_ids = dict(db.execute(select(dim_district.c.district_code, dim_district.c.district_id)
+                                   .where(dim_district.c.district_code.in_(districts["district_code"].tolist()))).all())
+    return df.assign(district_id=df["district_code"].map(district_ids))
+
+
+def _state_year_rows(db: Session, scheme: str, keys: List[tuple]) -> List[Dict]:
+    """Re-aggregate the stored facts of the ``(state_id, year)`` pairs in ``keys`` to scheme-table rows."""
+    fact = FACTS[scheme]
+    metrics = metric_names(scheme)
+    query = (select(dim_state.c.state_code, dim_state.c.state_name, fact.c.district_id, fact.c.year,
+                    *(fact.c[m] for m in metrics))
+             .select_from(fact).join(dim_state, dim_state.c.state_id == fact.c.state_id)
+             .where(tuple_(fact.c.state_id, fact.c.year).in_(keys)))
+    stored = pd.DataFrame(db.execute(query).all(), columns=["state_code", "state_name", "district_id", "year",
+                                                             *metrics])
+    if stored.empty:
+        return []
+    stored[metrics] = stored[metrics].apply(pd.to_numeric, errors="coerce")
+    stock = [m for m in STOCK_METRICS.get(scheme, ()) if m in metrics]
+    flow = [m for m in metrics if m not in stock]
+    by_state = stored.groupby(["state_code", "year"])
+    # min_count=1: a state-year with no reported value stays NULL rather than 0
+    out = by_state[flow].sum(min_count=1)
+    out["state_name"] = by_state["state_name"].last()
+    if stock:
+        latest = stored.groupby(["state_code", "district_id", "year"])[stock].max()
+        out = out.join(latest.groupby(["state_code", "year"]).sum(min_count=1))
+    return out.reset_index().to_dict(orient="records")
+
+
+def upsert_district_month(db: Session, scheme: str, records: List[Dict]) -> Dict[str, int]:
+    """Load district x month records into ``scheme``'s fact table and refresh its state x year rows.
+
+    States and districts are upserted into the dimension tables, facts are
+    upserted on ``(district_id, year, month)`` (last record wins), and the
+    state x year rows touched by the batch are re-aggregated from all stored
+    facts and written like ``upsert_records`` does, with rollups, change log
+    and data version, in the same transaction as the facts. Returns fact counts
+    ``{"inserted", "updated"}`` plus ``state_rows`` written to the scheme table;
+    a failed load is rolled back and its database error re-raised.
+    """
+    counts = {"inserted": 0, "updated": 0, "state_rows": 0}
+    fact = FACTS[scheme]
+    df = pd.DataFrame(records)
+    if df.empty:
+        return counts
+    insert_fn = _DIALECT_INSERTS.get(db.get_bind().dialect.name)
+    # DDL runs before the load transaction takes its locks
+    partitions.ensure_year_partitions(db.get_bind(), scheme, df["year"].unique().tolist())
+
+    table = SCHEME_MODELS[scheme].__table__
+    with _load_lock(db, table.name):
+        try:
+            df = _upsert_dimensions(db, df, insert_fn)
+            key = ["district_id", "year", "month"]
+            names = [c.name for c in fact.columns]
+            int_cols = {c.name for c in fact.columns if getattr(c.type, "python_type", None) is int}
+            df = df.drop_duplicates(key, keep="last")
+            rows = [{n: _clean(r.get(n), n in int_cols) for n in names}
+                    for r in df.reindex(columns=names).to_dict(orient="records")]
+            existing = 0
+            size = settings.UPSERT_BATCH_SIZE
+            for i in range(0, len(rows), size):
+                batch_keys = [tuple(r[k] for k in key) for r in rows[i:i + size]]
+                existing += len(db.execute(select(*(fact.c[k] for k in key))
+                                           .where(tuple_(*(fact.c[k] for k in key)).in_(batch_keys))).all())
+            _merge(db, fact, rows, key, insert_fn)
+            state_rows = _prepare_rows(table, _state_year_rows(db, scheme, list({(r["state_id"], r["year"])
+                                                                                 for r in rows})))
+            changes = _write_rows(db, table, state_rows, insert_fn) if state_rows else []
+            db.commit()
+        except _db_errors(db) as e:
+            db.rollback()
+            logger.error("Failed to upsert %s district/month facts, rolled back: %s", scheme, e)
+            raise
+
+    if changes:
+        _loaded(table.name)
+    get_query_cache().invalidate(facts.dependent_tables(scheme))
+    counts["inserted"] = len(rows) - existing
+    counts["updated"] = existing
+    counts["state_rows"] = len(state_rows)
+    return counts
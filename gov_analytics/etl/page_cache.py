@@ -0,0 +1,120 @@
+"""Content-addressed cache of raw data.gov.in API pages.
+
+Layout under ``RAW_CACHE_DIR`` (default ``data/raw``)::
+
+    objects/<sha[:2]>/<sha>.json        page records, canonical JSON, named by their sha256
+    <resource_id>/pages/<key>.json      per request: object id, total, ETag, Last-Modified
+    <resource_id>/state.json            content hash of the last successful load, per scheme
+
+Page keys hash the resource id, the request params (minus the API key), offset
+and limit. Stored validators are replayed as ``If-None-Match`` /
+``If-Modified-Since`` so unchanged pages come back as 304 and are read from
+disk. The directory is a persisted output of the DVC ``ingest`` stage.
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from ..config import settings
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent.parent / "data" / "raw"
+
+_UNKEYED_PARAMS = {"api-key"}
+
+
+def _safe_name(resource_id: str) -> str:
+    return re.sub(r"[^\w.-]", "_", resource_id) or "_"
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _read_json(path: Path) -> Optional[Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+class PageCache:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def page_key(self, resource_id: str, params: Dict[str, Any], offset: int, limit: int) -> str:
+        keyed = {k: v for k, v in params.items() if k not in _UNKEYED_PARAMS}
+        raw = json.dumps([resource_id, keyed, offset, limit], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _page_path(self, resource_id: str, key: str) -> Path:
+        return self.root / _safe_name(resource_id) / "pages" / f"{key}.json"
+
+    def _object_path(self, object_id: str) -> Path:
+        return self.root / "objects" / object_id[:2] / f"{object_id}.json"
+
+    def lookup(self, resource_id: str, key: str) -> Optional[Dict[str, Any]]:
+        """Index entry for a page, if its object is still present."""
+        entry = _read_json(self._page_path(resource_id, key))
+        if not entry or not self._object_path(entry.get("object", "")).exists():
+            return None
+        return entry
+
+    def conditional_headers(self, entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, resource_id: str, key: str, records: List[Dict[str, Any]], total: Optional[int],
+              etag: Optional[str] = None, last_modified: Optional[str] = None) -> Dict[str, Any]:
+        body = json.dumps(records, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+        object_id = hashlib.sha256(body).hexdigest()
+        path = self._object_path(object_id)
+        if not path.exists():
+            _write_atomic(path, body)
+        entry = {
+            "object": object_id,
+            "rows": len(records),
+            "total": total,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": datetime.now(timezone.utc).isoformat(),
+        }
+        _write_atomic(self._page_path(resource_id, key), json.dumps(entry).encode("utf-8"))
+        return entry
+
+    def load(self, object_id: str) -> List[Dict[str, Any]]:
+        with open(self._object_path(object_id), "r", encoding="utf-8") as fh:
+            return json.load(fh)
+
+    def last_success(self, scheme: str, resource_id: str) -> Optional[str]:
+        state = _read_json(self.root / _safe_name(resource_id) / "state.json") or {}
+        return state.get(scheme, {}).get("content_hash")
+
+    def mark_success(self, scheme: str, resource_id: str, content_hash: str):
+        path = self.root / _safe_name(resource_id) / "state.json"
+        state = _read_json(path) or {}
+        state[scheme] = {"content_hash": content_hash, "loaded_at": datetime.now(timezone.utc).isoformat()}
+        _write_atomic(path, json.dumps(state, indent=2, sort_keys=True).encode("utf-8"))
+
+
+def page_cache() -> Optional[PageCache]:
+    """The configured cache, or None when ``RAW_CACHE_ENABLED`` is off."""
+    if not settings.RAW_CACHE_ENABLED:
+        return None
+    return PageCache(Path(settings.RAW_CACHE_DIR) if settings.RAW_CACHE_DIR else DEFAULT_CACHE_DIR)
@@ -1,11 +1,76 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict
-from ..kpis import growth_rate, per_capita
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Union
+from ..config import settings
+from ..kpis import growth_rate_series, per_capita_series
 import logging
+import os
+import threading
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_POPULATION_PATH = Path(__file__).resolve().parent.parent.parent / "data" / "population.csv"
+
+# Per-scheme transform spec:
+#   numeric     columns coerced to numbers (unparseable -> NaN)
+#   ratios      {output: (numerator, denominator)}, NaN where the denominator is 0
+#   per_capita  {output: column}, divided by the state's population (needs a population table)
+#   growth      {output: column}, year-over-year growth per state within the batch
+TRANSFORM_SPECS: Dict[str, Dict[str, Any]] = {
+    "pmay": {
+        "numeric": ["beneficiaries", "houses_completed", "funds_released"],
+        "ratios": {"houses_per_beneficiary": ("houses_completed", "beneficiaries")},
+    },
+    "mnrega": {
+        "numeric": ["person_days_generated", "job_cards", "funds_spent"],
+        "ratios": {"person_days_per_job_card": ("person_days_generated", "job_cards")},
+    },
+    "startup_india": {
+        "numeric": ["startups_supported", "funds_allocated"],
+        "per_capita": {"per_capita_startups": "startups_supported"},
+    },
+    "saubhagya": {
+        "numeric": ["households_electrified", "percent_coverage"],
+    },
+}
+
+PopulationLike = Union[Mapping[str, int], pd.Series]
+
+_population_lock = threading.Lock()
+_population_cache: Dict[str, Any] = {"key": None, "table": None}
+
+
+def population_table(path: Optional[Path] = None) -> pd.Series:
+    """State population indexed by ``state_code``, read from ``POPULATION_PATH``.
+
+    The CSV needs ``state_code`` and ``population`` columns. It is re-read only
+    when its mtime changes; a missing file gives an empty table.
+    """
+    path = Path(path or settings.POPULATION_PATH or DEFAULT_POPULATION_PATH)
+    try:
+        key = (str(path), os.stat(path).st_mtime)
+    except OSError:
+        return pd.Series(dtype="float64", name="population")
+    with _population_lock:
+        if _population_cache["key"] != key:
+            df = pd.read_csv(path, dtype={"state_code": str})
+            table = pd.to_numeric(df["population"], errors="coerce").astype("float64")
+            table.index = df["state_code"]
+            table.name = "population"
+            _population_cache.update(key=key, table=table[~table.index.duplicated(keep="last")])
+            logger.info("Loaded population for %d states from %s", len(table), path)
+        return _population_cache["table"]
+
+
+def _to_frame(data) -> pd.DataFrame:
+    if isinstance(data, pd.DataFrame):
+        # shallow copy: columns are replaced, never modified in place
+        return data.copy(deep=False)
+    if hasattr(data, "to_pandas"):  # pyarrow Table / RecordBatch
+        return data.to_pandas()
+    return pd.DataFrame(data)
+
 
 def normalize_numeric(df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
     for c in cols:
@@ -14,56 +79,58 @@ def normalize_numeric(df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
     return df
 
 
-def transform_pmay(records: List[Dict]) -> pd.DataFrame:
-    df = pd.DataFrame(records)
+def apply_transform(scheme: str, data, population: Optional[PopulationLike] = None) -> pd.DataFrame:
+    """Run the ``TRANSFORM_SPECS`` entry for ``scheme`` over a batch of records.
+
+    ``data`` may be a list of dicts, a DataFrame or a pyarrow Table. Derived
+    columns whose inputs are absent are skipped. Per-capita columns use
+    ``population`` when given, else the shared ``population_table()``.
+    """
+    spec = TRANSFORM_SPECS[scheme]
+    df = _to_frame(data)
     if df.empty:
         return df
-    
-    # Try to normalize numeric columns that exist
-    possible_cols = ["beneficiaries", "houses_completed", "funds_released"]
-    df = normalize_numeric(df, possible_cols)
-    
-    # Only create derived column if both exist
-    if "houses_completed" in df.columns and "beneficiaries" in df.columns:
-        df["houses_per_beneficiary"] = df["houses_completed"] / df["beneficiaries"].replace({0: np.nan})
-    
+
+    df = normalize_numeric(df, spec.get("numeric", []))
+
+    for out, (num, den) in spec.get("ratios", {}).items():
+        if num in df.columns and den in df.columns:
+            df[out] = df[num] / df[den].replace({0: np.nan})
+
+    per_capita_cols = spec.get("per_capita", {})
+    if per_capita_cols and "state_code" in df.columns:
+        if population is None:
+            population = population_table()
+        elif not isinstance(population, pd.Series):
+            population = pd.Series(population, dtype="float64")
+        if len(population):
+            pop = df["state_code"].map(population)
+            for out, col in per_capita_cols.items():
+                if col in df.columns:
+                    df[out] = per_capita_series(df[col], pop)
+
+    growth_cols = spec.get("growth", {})
+    if growth_cols and {"state_code", "year"} <= set(df.columns):
+        ordered = df.sort_values(["state_code", "year"], kind="stable")
+        grouped = ordered.groupby("state_code", sort=False)
+        for out, col in growth_cols.items():
+            if col in df.columns:
+                df[out] = growth_rate_series(ordered[col], grouped[col].shift(1))
+
     return df
 
 
+def transform_pmay(records: List[Dict]) -> pd.DataFrame:
+    return apply_transform("pmay", records)
+
+
 def transform_mnrega(records: List[Dict]) -> pd.DataFrame:
-    df = pd.DataFrame(records)
-    if df.empty:
-        return df
-    
-    possible_cols = ["person_days_generated", "job_cards", "funds_spent"]
-    df = normalize_numeric(df, possible_cols)
-    
-    if "person_days_generated" in df.columns and "job_cards" in df.columns:
-        df["person_days_per_job_card"] = df["person_days_generated"] / df["job_cards"].replace({0: np.nan})
-    
-    return df
+    return apply_transform("mnrega", records)
 
 
 def transform_startup(records: List[Dict], population_map: Dict[str, int] = None) -> pd.DataFrame:
-    df = pd.DataFrame(records)
-    if df.empty:
-        return df
-    
-    possible_cols = ["startups_supported", "funds_allocated"]
-    df = normalize_numeric(df, possible_cols)
-    
-    if population_map and "startups_supported" in df.columns and "state_code" in df.columns:
-        df["per_capita_startups"] = df.apply(lambda r: per_capita(r.get("startups_supported"), population_map.get(r.get("state_code"))), axis=1)
-    
-    return df
+    return apply_transform("startup_india", records, population_map)
 
 
 def transform_saubhagya(records: List[Dict]) -> pd.DataFrame:
-    df = pd.DataFrame(records)
-    if df.empty:
-        return df
-    
-    possible_cols = ["households_electrified", "percent_coverage"]
-    df = normalize_numeric(df, possible_cols)
-    
-    return df
+    return apply_transform("saubhagya", records)
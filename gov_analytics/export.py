@@ -0,0 +1,126 @@
+"""Constant-memory table export.
+
+Rows are read in ``EXPORT_BATCH_SIZE`` partitions from a server-side cursor
+and encoded batch by batch, so a download never holds more than one batch in
+memory regardless of table size. Parquet and Arrow IPC output need pyarrow.
+"""
+from sqlalchemy import DateTime, Float, Integer, select
+from typing import Iterator, List, Optional, Sequence
+from .config import settings
+from .db import connect
+import csv
+import io
+import zlib
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        out = b"".join(self.chunks)
+        self.chunks = []
+        return out
+
+
+def _iter_rows(table, columns: Sequence[str], year: Optional[int], state: Optional[str]) -> Iterator[list]:
+    query = select(*(table.c[c] for c in columns))
+    if year is not None:
+        query = query.where(table.c.year == year)
+    if state:
+        query = query.where(table.c.state_name == state)
+    size = settings.EXPORT_BATCH_SIZE
+    with connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=size).execute(query)
+        for partition in result.partitions(size):
+            yield partition
+
+
+def _csv_chunks(columns: Sequence[str], batches) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    yield buf.getvalue().encode("utf-8")
+    for rows in batches:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+
+
+def _arrow_schema(table, columns: Sequence[str]):
+    import pyarrow as pa
+    types = []
+    for c in columns:
+        col_type = table.c[c].type
+        if isinstance(col_type, Integer):
+            types.append(pa.field(c, pa.int64()))
+        elif isinstance(col_type, Float):
+            types.append(pa.field(c, pa.float64()))
+        elif isinstance(col_type, DateTime):
+            types.append(pa.field(c, pa.timestamp("us", tz="UTC")))
+        else:
+            types.append(pa.field(c, pa.string()))
+    return pa.schema(types)
+
+
+def _arrow_chunks(table, columns: Sequence[str], batches, fmt: str) -> Iterator[bytes]:
+    import pyarrow as pa
+    schema = _arrow_schema(table, columns)
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    try:
+        for rows in batches:
+            arrays = [pa.array([r[i] for r in rows], type=f.type) for i, f in enumerate(schema)]
+            batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+            if fmt == "parquet":
+                writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                writer.write_batch(batch)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def stream_export(table, fmt: str = "csv", columns: Optional[Sequence[str]] = None, year: Optional[int] = None,
+                  state: Optional[str] = None, gzip: bool = False) -> Iterator[bytes]:
+    """Yield the encoded bytes of ``table`` (optionally filtered and projected) in ``fmt``."""
+    columns = list(columns or [c.name for c in table.columns if c.name != "row_hash"])
+    batches = _iter_rows(table, columns, year, state)
+    chunks = _csv_chunks(columns, batches) if fmt == "csv" else _arrow_chunks(table, columns, batches, fmt)
+    return _gzip(chunks) if gzip else chunks
@@ -0,0 +1,80 @@
+"""District x month fact tables for feeds reported below state x year grain.
+
+MNREGA and PMAY publish district-level monthly figures. Those are loaded into
+``<scheme>_district_month`` (one row per district, year and month), keyed on
+surrogate ids from two small dimension tables:
+
+    dim_state      state_id, state_code, state_name
+    dim_district   district_id, state_id, district_code, district_name
+
+``etl.load.upsert_district_month`` writes the facts and then re-derives the
+affected state x year rows of the scheme table from them, so rollups, the
+analytics store, Parquet snapshots and every dashboard page keep working off
+the state-level table. Flow metrics are summed over months; ``STOCK_METRICS``
+(running totals such as issued job cards) take each district's highest, i.e.
+latest, monthly value instead.
+"""
+from sqlalchemy import Column, ForeignKey, Index, Integer, PrimaryKeyConstraint, SmallInteger, String, Table
+from typing import Dict
+from .db import Base
+from .models import SCHEME_MODELS
+
+DISTRICT_SCHEMES = ("pmay", "mnrega")
+
+# cumulative metrics: a district's value for a year is its highest month, not the sum of months
+STOCK_METRICS: Dict[str, tuple] = {
+    "mnrega": ("job_cards",),
+}
+
+dim_state = Table(
+    "dim_state", Base.metadata,
+    Column("state_id", Integer, primary_key=True),
+    Column("state_code", String(10), nullable=False, unique=True),
+    Column("state_name", String(100)),
+)
+
+dim_district = Table(
+    "dim_district", Base.metadata,
+    Column("district_id", Integer, primary_key=True),
+    Column("state_id", Integer, ForeignKey("dim_state.state_id"), nullable=False, index=True),
+    Column("district_code", String(20), nullable=False, unique=True),
+    Column("district_name", String(100)),
+)
+
+
+def metric_names(scheme: str):
+    table = SCHEME_MODELS[scheme].__table__
+    return [c.name for c in table.columns if c.name not in ("id", "state_code", "state_name", "year", "created_at", "row_hash")]
+
+
+def _fact_table(scheme: str) -> Table:
+    scheme_table = SCHEME_MODELS[scheme].__table__
+    name = f"{scheme}_district_month"
+    return Table(
+        name, Base.metadata,
+        Column("district_id", Integer, ForeignKey("dim_district.district_id"), nullable=False),
+        Column("year", Integer, nullable=False),
+        Column("month", SmallInteger, nullable=False),
+        Column("state_id", Integer, ForeignKey("dim_state.state_id"), nullable=False),
+        *(Column(m, scheme_table.c[m].type, nullable=True) for m in metric_names(scheme)),
+        # contains the year, so the key is valid on a table partitioned by year
+        PrimaryKeyConstraint("district_id", "year", "month", name=f"pk_{name}"),
+        # re-aggregating a state's year after a load, and WHERE year = ... [AND state] district pages
+        Index(f"ix_{name}_year_state", "year", "state_id"),
+    )
+
+
+FACTS: Dict[str, Table] = {scheme: _fact_table(scheme) for scheme in DISTRICT_SCHEMES}
+
+
+def fact_table(scheme: str) -> Table:
+    try:
+        return FACTS[scheme]
+    except KeyError:
+        raise ValueError(f"{scheme} has no district/month fact table") from None
+
+
+
+def dependent_tables(scheme: str):
+    """The fact and dimension tables a district/month load into ``scheme`` changes."""
+    return [FACTS[scheme].name, dim_state.name, dim_district.name]
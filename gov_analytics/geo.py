@@ -0,0 +1,105 @@
+"""State boundaries for the choropleth, loaded once and served as a cacheable asset.
+
+The GeoJSON file is parsed on first use and re-read only when its mtime
+changes. Simplified variants are computed lazily per tolerance with geopandas
+and indexed by ``properties.state_code``, so a response carries only the
+states present in the data being plotted.
+"""
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+from .config import settings
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GEOJSON_PATH = Path(__file__).resolve().parent.parent / "dashboard" / "static" / "data" / "india_states.geojson"
+
+
+class StateGeometry:
+    def __init__(self, path: Path, check_interval: float = 5.0):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._checked = 0.0
+        self._features = []
+        self._variants: Dict[float, Dict[str, str]] = {}
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._mtime is not None and now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            self._mtime, self._features, self._variants = None, [], {}
+            return
+        if mtime == self._mtime:
+            return
+        with open(self.path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+        self._features = [f for f in data.get("features", []) if f.get("properties", {}).get("state_code")]
+        self._variants = {}
+        self._mtime = mtime
+        logger.info("Loaded %d state geometries from %s", len(self._features), self.path)
+
+    def _simplify(self, tolerance: float):
+        if tolerance <= 0:
+            return self._features
+        try:
+            import geopandas
+        except ImportError:
+            logger.warning("geopandas not installed; serving unsimplified state geometry")
+            return self._features
+        gdf = geopandas.GeoDataFrame.from_features(self._features)
+        gdf["geometry"] = gdf.geometry.simplify(tolerance, preserve_topology=True)
+        return json.loads(gdf.to_json(drop_id=True))["features"]
+
+    def _variant(self, tolerance: float) -> Dict[str, str]:
+        if tolerance not in self._variants:
+            features = self._simplify(tolerance)
+            self._variants[tolerance] = {
+                f["properties"]["state_code"]: json.dumps(f, separators=(",", ":")) for f in features
+            }
+        return self._variants[tolerance]
+
+    def snap_tolerance(self, tolerance: Optional[float]) -> float:
+        """Map a requested tolerance onto the nearest configured one, bounding the variant count."""
+        allowed = settings.GEOJSON_TOLERANCES or [0.0]
+        if tolerance is None:
+            tolerance = settings.GEOJSON_DEFAULT_TOLERANCE
+        return min(allowed, key=lambda t: abs(t - tolerance))
+
+    def available(self) -> bool:
+        with self._lock:
+            self._refresh()
+            return bool(self._features)
+
+    def collection(self, codes: Optional[Iterable[str]] = None, tolerance: Optional[float] = None) -> Tuple[bytes, str]:
+        """Serialized FeatureCollection for ``codes`` (all states when None) and its ETag."""
+        tol = self.snap_tolerance(tolerance)
+        with self._lock:
+            self._refresh()
+            variant = self._variant(tol)
+            wanted = sorted(variant) if codes is None else sorted(set(codes) & set(variant))
+            body = '{"type":"FeatureCollection","features":[' + ",".join(variant[c] for c in wanted) + "]}"
+            tag = f"{self._mtime}:{tol}:{','.join(wanted)}"
+        return body.encode("utf-8"), hashlib.sha1(tag.encode("utf-8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def get_state_geometry() -> StateGeometry:
+    return StateGeometry(Path(settings.GEOJSON_PATH) if settings.GEOJSON_PATH else DEFAULT_GEOJSON_PATH)
+
+
+def __getattr__(name: str):
+    if name == "state_geometry":
+        return get_state_geometry()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,231 @@
+"""Bounded ETL job scheduler used by ``/trigger_etl``.
+
+Jobs run on a fixed-size thread pool (``ETL_MAX_WORKERS``) and every job is
+recorded in the ``etl_jobs`` table with its status (queued, running, done,
+failed), timings and row counts. A request for a (scheme, resource_id) pair
+that is already queued or running, in this or any other process sharing the
+database, is coalesced into the existing job instead of starting a second run
+against the same table.
+
+Jobs run on the thread pool of the process that accepted them, so they die
+with it. The first use of the table in a process marks jobs left queued or
+running by a process on this host that no longer exists as failed.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from sqlalchemy import exists, insert, inspect, literal, select, text, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from typing import Dict, List, Optional, Tuple
+from .config import settings
+from .db import SessionLocal, get_engine
+from .models import EtlJob
+import functools
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ACTIVE = (QUEUED, RUNNING)
+
+
+class QueueFull(Exception):
+    pass
+
+
+_table_ready = False
+_table_lock = threading.Lock()
+
+# at most one active job per (scheme, resource_id), also across processes; a
+# partial index, so it is only created where the database supports one
+_ACTIVE_INDEX = ("CREATE UNIQUE INDEX IF NOT EXISTS uq_etl_jobs_active ON etl_jobs (scheme, resource_id) "
+                 f"WHERE status IN ('{QUEUED}', '{RUNNING}')")
+
+
+def _ensure_table():
+    global _table_ready
+    with _table_lock:
+        if _table_ready:
+            return
+        engine = get_engine()
+        table = EtlJob.__table__
+        table.create(bind=engine, checkfirst=True)
+        with engine.begin() as conn:
+            if "worker" not in {c["name"] for c in inspect(engine).get_columns(table.name)}:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN worker VARCHAR(100)"))
+            # orphans first: their duplicates would fail the unique index
+            _fail_orphans(conn)
+        if engine.dialect.name in ("postgresql", "sqlite"):
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(_ACTIVE_INDEX))
+            except SQLAlchemyError:
+                logger.warning("Could not create uq_etl_jobs_active; duplicate active jobs remain", exc_info=True)
+        _table_ready = True
+
+
+def _worker() -> str:
+    # evaluated per call: a forked worker process has its own pid
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _orphaned(worker: Optional[str]) -> bool:
+    """Whether the process ``worker`` ("host:pid") is known to be gone; other hosts' processes cannot be checked."""
+    if not worker:
+        return True
+    host, _, pid = worker.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit() or int(pid) == os.getpid():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+def _fail_orphans(conn) -> int:
+    """Mark queued and running jobs whose process has exited as failed; they will never finish."""
+    table = EtlJob.__table__
+    active = conn.execute(select(table.c.id, table.c.worker).where(table.c.status.in_(ACTIVE))).all()
+    orphans = [job_id for job_id, worker in active if _orphaned(worker)]
+    if orphans:
+        conn.execute(update(table).where(table.c.id.in_(orphans)).values(
+            status=FAILED, finished_at=datetime.now(timezone.utc), error="orphaned: the process running it exited"))
+        logger.warning("Marked %d orphaned ETL jobs as failed: %s", len(orphans), orphans)
+    return len(orphans)
+
+
+def _claim(scheme: str, resource_id: str) -> Tuple[int, bool]:
+    """Record a queued job unless the pair already has an active one. Returns ``(job_id, created)``."""
+    table = EtlJob.__table__
+    active = select(table.c.id).where(table.c.scheme == scheme, table.c.resource_id == resource_id,
+                                      table.c.status.in_(ACTIVE))
+    row = select(literal(scheme), literal(resource_id), literal(QUEUED), literal(_worker())).where(~exists(active))
+    db = SessionLocal()
+    try:
+        try:
+            created = db.execute(insert(table).from_select(["scheme", "resource_id", "status", "worker"], row)).rowcount
+            db.commit()
+        except IntegrityError:
+            # a concurrent claim won the unique index
+            db.rollback()
+            created = 0
+        job_id = db.execute(active.order_by(table.c.id.desc())).scalar()
+    finally:
+        db.close()
+    if job_id is None:
+        # the active job we lost to finished in the meantime
+        return _claim(scheme, resource_id)
+    return job_id, bool(created)
+
+
+class JobScheduler:
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._active: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # created on first submit so importing the web app starts no threads
+        if self._executor is None:
+            _ensure_table()
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="etl-job")
+        return self._executor
+
+    def submit(self, scheme: str, resource_id: str) -> Tuple[int, bool]:
+        """Queue an ETL run. Returns ``(job_id, coalesced)``; raises QueueFull past the bound."""
+        key = (scheme, resource_id)
+        with self._lock:
+            if key in self._active:
+                return self._active[key], True
+            if len(self._active) >= self.max_workers + self.max_pending:
+                raise QueueFull(f"{len(self._active)} ETL jobs already queued or running")
+            pool = self._pool()
+            job_id, created = _claim(scheme, resource_id)
+            if not created:
+                return job_id, True
+            self._active[key] = job_id
+        pool.submit(self._run, job_id, key)
+        return job_id, False
+
+    def _record(self, job_id: Optional[int] = None, **fields) -> int:
+        db = SessionLocal()
+        try:
+            job = db.get(EtlJob, job_id) if job_id else EtlJob()
+            for k, v in fields.items():
+                setattr(job, k, v)
+            if job_id is None:
+                db.add(job)
+            db.commit()
+            return job.id
+        finally:
+            db.close()
+
+    def _run(self, job_id: int, key: Tuple[str, str]):
+        scheme, resource_id = key
+        started = time.perf_counter()
+        try:
+            self._record(job_id, status=RUNNING, started_at=datetime.now(timezone.utc))
+            from .prefect_flows import etl_for_scheme
+            logger.info("Job %s: starting ETL for %s with resource %s", job_id, scheme, resource_id)
+            result = etl_for_scheme(scheme, resource_id)
+            self._record(
+                job_id, status=DONE, finished_at=datetime.now(timezone.utc),
+                duration_seconds=time.perf_counter() - started,
+                rows_ingested=result.get("ingested"), rows_inserted=result.get("inserted"),
+                rows_updated=result.get("updated"),
+            )
+            logger.info("Job %s completed: %s", job_id, result)
+        except Exception as e:
+            logger.error("Job %s failed: %s", job_id, e, exc_info=True)
+            try:
+                self._record(job_id, status=FAILED, finished_at=datetime.now(timezone.utc),
+                             duration_seconds=time.perf_counter() - started, error=str(e))
+            except Exception:
+                logger.exception("Job %s: could not record failure", job_id)
+        finally:
+            with self._lock:
+                self._active.pop(key, None)
+
+
+def get_job(job_id: int) -> Optional[dict]:
+    _ensure_table()
+    db = SessionLocal()
+    try:
+        job = db.get(EtlJob, job_id)
+        return job.to_dict() if job else None
+    finally:
+        db.close()
+
+
+def list_jobs(limit: int = 50, status: Optional[str] = None) -> List[dict]:
+    _ensure_table()
+    db = SessionLocal()
+    try:
+        query = db.query(EtlJob)
+        if status:
+            query = query.filter(EtlJob.status == status)
+        return [j.to_dict() for j in query.order_by(EtlJob.id.desc()).limit(limit)]
+    finally:
+        db.close()
+
+
+@functools.lru_cache(maxsize=None)
+def get_scheduler() -> JobScheduler:
+    return JobScheduler(settings.ETL_MAX_WORKERS, settings.ETL_MAX_PENDING)
+
+
+def __getattr__(name: str):
+    if name == "scheduler":
+        return get_scheduler()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
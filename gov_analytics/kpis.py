@@ -1,4 +1,5 @@
 from typing import Optional
+import pandas as pd
 
 
 def growth_rate(current: Optional[float], previous: Optional[float]) -> Optional[float]:
@@ -17,3 +18,85 @@ def per_capita(value: Optional[float], population: Optional[int]) -> Optional[fl
         return value / population
     except Exception:
         return None
+
+
+def cagr(first: Optional[float], last: Optional[float], periods: Optional[float]) -> Optional[float]:
+    try:
+        if first in (None, 0) or last is None or not periods:
+            return None
+        ratio = last / first
+        if ratio < 0:
+            return None
+        return ratio ** (1 / periods) - 1
+    except Exception:
+        return None
+
+
+# Vectorized counterparts of the scalar KPIs. Missing inputs and zero
+# denominators give NaN wherever the scalar version returns None.
+
+def _as_float(values, index=None) -> pd.Series:
+    series = values if isinstance(values, pd.Series) else pd.Series(values, index=index)
+    return pd.to_numeric(series, errors="coerce").astype("float64")
+
+
+def growth_rate_series(current, previous) -> pd.Series:
+    current = _as_float(current)
+    previous = _as_float(previous, current.index)
+    return (current - previous) / previous.where(previous != 0)
+
+
+def per_capita_series(values, population) -> pd.Series:
+    values = _as_float(values)
+    population = _as_float(population, values.index)
+    return values / population.where(population != 0)
+
+
+def cagr_series(first, last, periods) -> pd.Series:
+    first = _as_float(first)
+    last = _as_float(last, first.index)
+    periods = _as_float(periods, first.index)
+    ratio = last / first.where(first != 0)
+    ratio = ratio.where(ratio >= 0)
+    return ratio ** (1 / periods.where(periods != 0)) - 1
+
+
+# Panel KPIs over one row per (state_code, year), e.g. a ``<scheme>_by_state_year``
+# rollup. Results are aligned to the input index.
+
+def yoy_growth(panel: pd.DataFrame, column: str, key: str = "state_code", time: str = "year") -> pd.Series:
+    """Growth over the same ``key``'s value in the previous ``time`` period (NaN if that row is absent)."""
+    lookup = panel.set_index([key, time])[column]
+    previous = lookup.reindex(pd.MultiIndex.from_arrays([panel[key], panel[time] - 1])).to_numpy()
+    return growth_rate_series(panel[column], pd.Series(previous, index=panel.index))
+
+
+def panel_cagr(panel: pd.DataFrame, column: str, key: str = "state_code", time: str = "year") -> pd.Series:
+    """CAGR from each ``key``'s first to its last period, broadcast to all of its rows."""
+    ordered = panel.sort_values([key, time], kind="stable")
+    keys = ordered[key]
+    # positional first/last rows per key; groupby first()/last() would skip nulls
+    head, tail = ordered[~keys.duplicated(keep="first")], ordered[~keys.duplicated(keep="last")]
+    first = keys.map(pd.Series(head[column].to_numpy(), index=head[key]))
+    last = keys.map(pd.Series(tail[column].to_numpy(), index=tail[key]))
+    periods = keys.map(pd.Series((tail[time].to_numpy() - head[time].to_numpy()), index=head[key]))
+    return cagr_series(first, last, periods).reindex(panel.index)
+
+
+def rolling_mean(panel: pd.DataFrame, column: str, window: int = 3, key: str = "state_code",
+                 time: str = "year") -> pd.Series:
+    """Trailing mean over the last ``window`` rows of each ``key``; missing values are skipped."""
+    ordered = panel.sort_values([key, time], kind="stable")
+    values = _as_float(ordered[column])
+    means = values.groupby(ordered[key].to_numpy(), sort=False).rolling(window, min_periods=1).mean()
+    return means.reset_index(level=0, drop=True).reindex(panel.index)
+
+
+def rank_within(panel: pd.DataFrame, column: str, time: str = "year", ascending: bool = False) -> pd.Series:
+    """1-based rank within each ``time`` period (ties share the best rank, NaN unranked)."""
+    return _as_float(panel[column]).groupby(panel[time]).rank(method="min", ascending=ascending)
+
+
+def percentile_within(panel: pd.DataFrame, column: str, time: str = "year") -> pd.Series:
+    """Percentile (0-1] of each value within its ``time`` period; higher values get higher percentiles."""
+    return _as_float(panel[column]).groupby(panel[time]).rank(method="max", pct=True)
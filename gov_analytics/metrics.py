@@ -0,0 +1,244 @@
+"""ETL stage instrumentation and the Prometheus registry behind ``/metrics``.
+
+``etl_for_scheme`` opens an ``EtlRun`` and every task wraps its work in
+``stage(scheme, name)``. A stage records its duration, rows in/out/rejected,
+bytes fetched from the API (added by the extractor through ``add_bytes``),
+database round-trips (cursor executions on our engines while the stage is
+current; raw-cursor COPY counts as none) and peak memory. Peak memory is the
+traced Python/NumPy heap of the stage when ``ETL_TRACE_MEMORY`` is set, and
+otherwise the process's peak RSS at the end of the stage.
+
+Streaming runs enter the same stage once per chunk; the run keeps the totals
+per stage and ``EtlRun.persist`` writes them to ``etl_stage_metrics``. Every
+stage is also observed into process-local Prometheus metrics, alongside the
+Flask request-latency histogram, and ``/metrics`` additionally reports the last
+persisted run of each scheme so runs made by other processes (the CLI) show up.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+from typing import Dict, Iterator, Optional
+from .config import settings
+from .db import SessionLocal, connect, listen_engines
+from .models import EtlStageMetric
+import logging
+import resource
+import sys
+import time
+import tracemalloc
+import uuid
+
+logger = logging.getLogger(__name__)
+
+registry = CollectorRegistry()
+
+STAGE_SECONDS = Histogram(
+    "gov_analytics_etl_stage_duration_seconds", "Duration of one ETL stage call (one chunk when streaming)",
+    ["scheme", "stage"], registry=registry, buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, float("inf")))
+STAGE_ROWS = Counter("gov_analytics_etl_rows", "Rows seen by ETL stages", ["scheme", "stage", "kind"],
+                     registry=registry)
+FETCHED_BYTES = Counter("gov_analytics_etl_fetched_bytes", "Response bytes fetched from the data API",
+                        ["scheme"], registry=registry)
+DB_ROUND_TRIPS = Counter("gov_analytics_etl_db_round_trips", "Database cursor executions by ETL stages",
+                         ["scheme", "stage"], registry=registry)
+STAGE_PEAK_MEMORY = Gauge("gov_analytics_etl_stage_peak_memory_bytes", "Peak memory of the latest ETL stage call",
+                          ["scheme", "stage"], registry=registry)
+REQUEST_SECONDS = Histogram("gov_analytics_http_request_duration_seconds", "Flask request latency by route",
+                            ["method", "route", "status"], registry=registry)
+
+COUNTERS = ("rows_in", "rows_out", "rows_rejected", "bytes_fetched", "db_round_trips")
+
+
+class StageSample:
+    """Counters for one entry into a stage; tasks set the row counts."""
+
+    def __init__(self, scheme: str, stage: str, rows_in: int = 0):
+        self.scheme = scheme
+        self.stage = stage
+        self.rows_in = rows_in
+        self.rows_out = 0
+        self.rows_rejected = 0
+        self.bytes_fetched = 0
+        self.db_round_trips = 0
+        self.duration_seconds = 0.0
+        self.peak_memory_bytes: Optional[int] = None
+
+
+class StageTotals:
+    def __init__(self, started_at: datetime):
+        self.started_at = started_at
+        self.calls = 0
+        self.duration_seconds = 0.0
+        self.peak_memory_bytes: Optional[int] = None
+        for name in COUNTERS:
+            setattr(self, name, 0)
+
+    def add(self, sample: StageSample):
+        self.calls += 1
+        self.duration_seconds += sample.duration_seconds
+        for name in COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(sample, name))
+        if sample.peak_memory_bytes is not None:
+            self.peak_memory_bytes = max(self.peak_memory_bytes or 0, sample.peak_memory_bytes)
+
+    def to_dict(self) -> Dict[str, object]:
+        out = {name: getattr(self, name) for name in ("calls",) + COUNTERS}
+        out["duration_seconds"] = round(self.duration_seconds, 6)
+        out["peak_memory_bytes"] = self.peak_memory_bytes
+        return out
+
+
+class EtlRun:
+    """Per-stage totals of one ``etl_for_scheme`` run."""
+
+    def __init__(self, scheme: str, run_id: Optional[str] = None):
+        self.scheme = scheme
+        self.run_id = run_id or uuid.uuid4().hex
+        self.stages: Dict[str, StageTotals] = {}
+
+    def add(self, sample: StageSample, started_at: datetime):
+        self.stages.setdefault(sample.stage, StageTotals(started_at)).add(sample)
+
+    def to_dict(self) -> Dict[str, Dict[str, object]]:
+        return {stage: totals.to_dict() for stage, totals in self.stages.items()}
+
+    def persist(self):
+        """Write one ``etl_stage_metrics`` row per stage; failures are logged, not raised."""
+        if not self.stages:
+            return
+        db = SessionLocal()
+        try:
+            db.add_all(EtlStageMetric(run_id=self.run_id, scheme=self.scheme, stage=stage, started_at=t.started_at,
+                                      calls=t.calls, duration_seconds=t.duration_seconds,
+                                      peak_memory_bytes=t.peak_memory_bytes,
+                                      **{name: getattr(t, name) for name in COUNTERS})
+                       for stage, t in self.stages.items())
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            logger.exception("Could not persist ETL metrics for run %s", self.run_id)
+        finally:
+            db.close()
+
+
+_run: ContextVar[Optional[EtlRun]] = ContextVar("etl_run", default=None)
+_sample: ContextVar[Optional[StageSample]] = ContextVar("etl_stage", default=None)
+
+
+@contextmanager
+def etl_run(scheme: str, run_id: Optional[str] = None) -> Iterator[EtlRun]:
+    """Collect the stages entered in this context (and contexts copied from it) into one run."""
+    run = EtlRun(scheme, run_id)
+    token = _run.set(run)
+    try:
+        yield run
+    finally:
+        _run.reset(token)
+
+
+def current_run_id() -> Optional[str]:
+    """Id of the ETL run the caller is part of, if any."""
+    run = _run.get()
+    return run.run_id if run is not None else None
+
+
+def _peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@contextmanager
+def stage(scheme: str, name: str, rows_in: int = 0) -> Iterator[StageSample]:
+    """Time and count one ETL stage call; set ``rows_out``/``rows_rejected`` on the yielded sample."""
+    sample = StageSample(scheme, name, rows_in)
+    started_at = datetime.now(timezone.utc)
+    if settings.ETL_TRACE_MEMORY:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        # the peak is process-wide, so concurrent stages (parallel schemes) share it
+        tracemalloc.reset_peak()
+    token = _sample.set(sample)
+    started = time.perf_counter()
+    try:
+        yield sample
+    finally:
+        sample.duration_seconds = time.perf_counter() - started
+        _sample.reset(token)
+        sample.peak_memory_bytes = (tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing()
+                                    else _peak_rss_bytes())
+        _observe(sample)
+        run = _run.get()
+        if run is not None and run.scheme == scheme:
+            run.add(sample, started_at)
+
+
+def add_bytes(n: int):
+    """Count ``n`` response bytes against the current stage, if any."""
+    sample = _sample.get()
+    if sample is not None:
+        sample.bytes_fetched += n
+
+
+def _on_execute(*args):
+    sample = _sample.get()
+    if sample is not None:
+        sample.db_round_trips += 1
+
+
+listen_engines("before_cursor_execute", _on_execute)
+
+
+def _observe(sample: StageSample):
+    labels = (sample.scheme, sample.stage)
+    STAGE_SECONDS.labels(*labels).observe(sample.duration_seconds)
+    for kind in ("in", "out", "rejected"):
+        value = getattr(sample, f"rows_{kind}")
+        if value:
+            STAGE_ROWS.labels(*labels, kind).inc(value)
+    if sample.bytes_fetched:
+        FETCHED_BYTES.labels(sample.scheme).inc(sample.bytes_fetched)
+    if sample.db_round_trips:
+        DB_ROUND_TRIPS.labels(*labels).inc(sample.db_round_trips)
+    if sample.peak_memory_bytes is not None:
+        STAGE_PEAK_MEMORY.labels(*labels).set(sample.peak_memory_bytes)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    REQUEST_SECONDS.labels(method, route, str(status)).observe(seconds)
+
+
+class LastRunCollector:
+    """Gauges for the latest persisted run of each scheme, read from ``etl_stage_metrics`` per scrape."""
+
+    FIELDS = ("duration_seconds", "calls") + COUNTERS + ("peak_memory_bytes",)
+
+    def collect(self):
+        t = EtlStageMetric.__table__
+        latest = select(t.c.scheme, func.max(t.c.id).label("id")).group_by(t.c.scheme).subquery()
+        runs = select(t.c.run_id).join(latest, t.c.id == latest.c.id)
+        try:
+            with connect() as conn:
+                rows = conn.execute(select(t).where(t.c.run_id.in_(runs))).mappings().all()
+        except SQLAlchemyError as e:
+            logger.debug("No persisted ETL metrics to export: %s", e)
+            return
+        families = {f: GaugeMetricFamily(f"gov_analytics_etl_last_run_{f}", f"{f} of the scheme's latest persisted ETL run",
+                                         labels=["scheme", "stage", "run_id"]) for f in self.FIELDS}
+        for row in rows:
+            for f, family in families.items():
+                if row[f] is not None:
+                    family.add_metric([row["scheme"], row["stage"], row["run_id"]], row[f])
+        yield from families.values()
+
+
+registry.register(LastRunCollector())
+
+
+def exposition() -> bytes:
+    """The registry in Prometheus text format."""
+    return generate_latest(registry)
@@ -1,15 +1,37 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, UniqueConstraint
+from sqlalchemy import BigInteger, Column, Integer, String, Float, DateTime, Index, Text, UniqueConstraint, inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import declared_attr
 from sqlalchemy.sql import func
 from .db import Base
+from typing import List
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class BaseScheme(Base):
     __abstract__ = True
-    id = Column(Integer, primary_key=True, index=True)
-    state_code = Column(String(10), index=True)
-    state_name = Column(String(100), index=True)
-    year = Column(Integer, index=True)
+    id = Column(Integer, primary_key=True)
+    state_code = Column(String(10))
+    state_name = Column(String(100))
+    year = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # digest of the loaded values (etl.load.row_hash); unchanged rows are not rewritten
+    row_hash = Column(String(32), nullable=True)
+
+    @declared_attr
+    def __table_args__(cls):
+        name = cls.__tablename__
+        # covering on PostgreSQL (INCLUDE the metrics) so aggregates can be index-only scans
+        metrics = [k for k, v in vars(cls).items() if isinstance(v, Column) and k not in vars(BaseScheme)]
+        return (
+            # natural key used by etl.load.upsert_records for ON CONFLICT upserts and lookups
+            UniqueConstraint("state_code", "year", name=f"uq_{name}_state_year"),
+            # WHERE year = ... GROUP BY state_name, and year-filtered exports
+            Index(f"ix_{name}_year_state_name", "year", "state_name", postgresql_include=metrics),
+            # WHERE state_name = ... GROUP BY year, and state-filtered exports
+            Index(f"ix_{name}_state_name_year", "state_name", "year", postgresql_include=metrics),
+        )
 
 
 class PMAY(BaseScheme):
@@ -38,4 +60,180 @@ class Saubhagya(BaseScheme):
     percent_coverage = Column(Float, nullable=True)
 
 
-__all__ = ["PMAY", "MNREGA", "StartupIndia", "Saubhagya"]
+class DataVersion(Base):
+    """Per-scheme counter bumped by every committed load; part of chart cache keys and ETags."""
+    __tablename__ = "data_versions"
+    scheme = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class EtlRowChange(Base):
+    """One row inserted, updated or deleted in a scheme table by a load (``ETL_CHANGE_LOG_ENABLED``)."""
+    __tablename__ = "etl_row_changes"
+    id = Column(Integer, primary_key=True)
+    scheme = Column(String(50), nullable=False, index=True)
+    run_id = Column(String(64), nullable=True, index=True)
+    state_code = Column(String(10), nullable=False)
+    year = Column(Integer, nullable=False)
+    change = Column(String(10), nullable=False)
+    old_hash = Column(String(32), nullable=True)
+    new_hash = Column(String(32), nullable=True)
+    changed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class EtlJob(Base):
+    """One ETL run requested through the job scheduler (see ``gov_analytics.jobs``)."""
+    __tablename__ = "etl_jobs"
+    id = Column(Integer, primary_key=True)
+    scheme = Column(String(50), nullable=False, index=True)
+    resource_id = Column(String(200), nullable=False)
+    status = Column(String(20), nullable=False, default="queued", index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    duration_seconds = Column(Float, nullable=True)
+    rows_ingested = Column(Integer, nullable=True)
+    rows_inserted = Column(Integer, nullable=True)
+    rows_updated = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    # "host:pid" of the process whose thread pool runs the job
+    worker = Column(String(100), nullable=True)
+
+    def to_dict(self):
+        return {c.name: (v.isoformat() if hasattr(v, "isoformat") else v)
+                for c in self.__table__.columns for v in [getattr(self, c.name)]}
+
+
+class EtlStageMetric(Base):
+    """Totals for one stage of one ETL run (see ``gov_analytics.metrics``)."""
+    __tablename__ = "etl_stage_metrics"
+    id = Column(Integer, primary_key=True)
+    run_id = Column(String(64), nullable=False, index=True)
+    scheme = Column(String(50), nullable=False, index=True)
+    stage = Column(String(50), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    calls = Column(Integer, nullable=False, default=1)
+    duration_seconds = Column(Float, nullable=False, default=0.0)
+    rows_in = Column(Integer, nullable=False, default=0)
+    rows_out = Column(Integer, nullable=False, default=0)
+    rows_rejected = Column(Integer, nullable=False, default=0)
+    bytes_fetched = Column(BigInteger, nullable=False, default=0)
+    db_round_trips = Column(Integer, nullable=False, default=0)
+    peak_memory_bytes = Column(BigInteger, nullable=True)
+
+
+SCHEME_MODELS = {
+    "pmay": PMAY,
+    "mnrega": MNREGA,
+    "startup_india": StartupIndia,
+    "saubhagya": Saubhagya,
+}
+
+# Columns summed (NULL as 0) into each scheme's dashboard "score"
+SCORE_COLUMNS = {
+    "pmay": ("beneficiaries", "houses_completed"),
+    "mnrega": ("person_days_generated", "job_cards"),
+    "startup_india": ("startups_supported",),
+    "saubhagya": ("households_electrified",),
+}
+
+# Metrics that are ratios: exact for one state-year row but meaningless when
+# summed, so the additive rollups and national totals leave them out
+RATIO_COLUMNS = {
+    "saubhagya": ("percent_coverage",),
+}
+
+
+def ensure_natural_keys(bind) -> List[str]:
+    """Add the (state_code, year) unique index to scheme tables created before it existed.
+
+    ``create_all`` does not alter existing tables, so databases initialised by
+    older versions need this before ``upsert_records`` can use ON CONFLICT.
+    Those versions always inserted, so a key may be stored more than once:
+    all but its latest row (highest ``id``) are deleted first and the
+    scheme's data version is bumped. Returns the schemes that had duplicates,
+    whose rollups the caller must rebuild. Raises if the index cannot be created.
+    """
+    deduped = []
+    with bind.begin() as conn:
+        for model in SCHEME_MODELS.values():
+            name = model.__tablename__
+            # NULL keys never conflict in a unique index, so only complete keys are deduped
+            removed = conn.execute(text(
+                f"DELETE FROM {name} WHERE state_code IS NOT NULL AND year IS NOT NULL AND id NOT IN "
+                f"(SELECT MAX(id) FROM {name} WHERE state_code IS NOT NULL AND year IS NOT NULL "
+                f"GROUP BY state_code, year)"
+            )).rowcount
+            if removed:
+                logger.warning("Deleted %d duplicate (state_code, year) rows of %s, keeping the latest", removed, name)
+                bumped = conn.execute(text("UPDATE data_versions SET version = version + 1 WHERE scheme = :s"),
+                                      {"s": name}).rowcount
+                if not bumped:
+                    conn.execute(text("INSERT INTO data_versions (scheme, version) VALUES (:s, 1)"), {"s": name})
+                deduped.append(name)
+            try:
+                conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{name}_state_year ON {name} (state_code, year)"))
+            except SQLAlchemyError as e:
+                logger.error("Could not add unique (state_code, year) index to %s: %s", name, e)
+                raise
+    return deduped
+
+
+def ensure_row_hash_columns(bind):
+    """Add the ``row_hash`` column to scheme tables created before it existed.
+
+    Stored rows start without a hash, so the first load after this rewrites
+    them once; from then on only changed rows are written.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for model in SCHEME_MODELS.values():
+            name = model.__tablename__
+            if not inspector.has_table(name):
+                continue
+            if "row_hash" not in {c["name"] for c in inspector.get_columns(name)}:
+                conn.execute(text(f"ALTER TABLE {name} ADD COLUMN row_hash VARCHAR(32)"))
+                logger.info("Added row_hash column to %s", name)
+
+
+# single-column indexes declared by earlier versions of BaseScheme
+LEGACY_INDEX_COLUMNS = ("id", "state_code", "state_name", "year")
+
+
+def create_missing_indexes(bind, tables):
+    """Create declared indexes of existing ``tables`` that the database lacks (``create_all`` skips them)."""
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+                    logger.info("Created index %s", index.name)
+
+
+def ensure_indexes(bind):
+    """Bring existing scheme tables to the current index set.
+
+    Drops the legacy single-column indexes, which no query shape uses and
+    which each cost a write per inserted row, and creates any declared
+    composite index that is missing.
+    """
+    inspector = inspect(bind)
+    tables = [m.__table__ for m in SCHEME_MODELS.values()]
+    with bind.begin() as conn:
+        for table in tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+            for col in LEGACY_INDEX_COLUMNS:
+                legacy = f"ix_{table.name}_{col}"
+                if legacy in existing:
+                    conn.execute(text(f"DROP INDEX {legacy}"))
+                    logger.info("Dropped legacy index %s", legacy)
+    create_missing_indexes(bind, tables)
+
+__all__ = ["PMAY", "MNREGA", "StartupIndia", "Saubhagya", "DataVersion", "EtlRowChange", "EtlJob", "EtlStageMetric", "SCHEME_MODELS", "SCORE_COLUMNS", "RATIO_COLUMNS"]
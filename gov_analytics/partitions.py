@@ -0,0 +1,135 @@
+"""Optional PostgreSQL declarative partitioning of the year-keyed tables.
+
+With ``DB_PARTITION_BY_YEAR`` on PostgreSQL, ``init_db`` creates each scheme
+table, its ``_by_state_year`` rollup and its district/month fact table as
+``PARTITION BY RANGE (year)`` with one partition per year
+(``<table>_y<year>``). Queries that filter on ``year`` - ``/scheme?year=``,
+year-bounded ``/trends``, the district pages and year-filtered exports - are
+then pruned to the matching partitions by the planner, at execution time for
+the bound parameters of the prepared statements.
+
+Partitions are created on demand: loads call ``ensure_year_partitions`` for
+the years in each batch before writing, so there is no catch-all default
+partition. Primary keys of partitioned tables must contain the partition key,
+so scheme tables are keyed on ``(id, year)`` there; their natural key
+``(state_code, year)`` already qualifies.
+
+On SQLite, or with the setting off, every function here is a no-op and the
+tables are plain. Existing plain PostgreSQL tables are never converted in
+place: dump the data, drop the tables, run ``init_db`` and reload.
+"""
+from sqlalchemy import MetaData, PrimaryKeyConstraint, Table, inspect, select, text, union
+from typing import Dict, Iterable, List, Set, Tuple
+from .config import settings
+from .facts import FACTS
+from .models import SCHEME_MODELS
+from .rollups import ROLLUPS
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+PARTITION_KEY = "year"
+
+_lock = threading.Lock()
+# (engine url, table) -> partitioned?; (engine url, table, year) partitions known to exist
+_partitioned: Dict[Tuple[str, str], bool] = {}
+_created: Set[Tuple[str, str, int]] = set()
+
+
+def partitioning_enabled(bind) -> bool:
+    return settings.DB_PARTITION_BY_YEAR and bind.dialect.name == "postgresql"
+
+
+def partitioned_tables(scheme: str) -> List[Table]:
+    """The tables of ``scheme`` that are partitioned by year when partitioning is enabled."""
+    tables = [SCHEME_MODELS[scheme].__table__, ROLLUPS[scheme]["state_year"]]
+    if scheme in FACTS:
+        tables.append(FACTS[scheme])
+    return tables
+
+
+def partitioned_copy(table: Table, metadata: MetaData) -> Table:
+    """``table`` as ``PARTITION BY RANGE (year)``, with ``year`` added to its primary key if needed."""
+    for fk in table.foreign_key_constraints:
+        if fk.referred_table.name not in metadata.tables:
+            fk.referred_table.to_metadata(metadata)
+    copy = table.to_metadata(metadata)
+    pk = [c.name for c in copy.primary_key.columns]
+    if PARTITION_KEY not in pk:
+        for name in pk:
+            # a serial id stays serial as part of a composite key
+            copy.c[name].autoincrement = True
+        copy.c[PARTITION_KEY].primary_key = True
+        copy.append_constraint(PrimaryKeyConstraint(*pk, PARTITION_KEY, name=f"pk_{table.name}"))
+    copy.dialect_kwargs["postgresql_partition_by"] = f"RANGE ({PARTITION_KEY})"
+    return copy
+
+
+def create_partitioned_tables(bind, schemes: Iterable[str] = None):
+    """Create the year-keyed tables as partitioned tables; call before ``create_all``.
+
+    Tables that already exist are left alone (with a warning if they are plain).
+    """
+    if not partitioning_enabled(bind):
+        return
+    inspector = inspect(bind)
+    metadata = MetaData()
+    for scheme in schemes or list(SCHEME_MODELS):
+        for table in partitioned_tables(scheme):
+            if not inspector.has_table(table.name):
+                for fk in table.foreign_key_constraints:
+                    # dimension tables are plain; they must exist before the facts reference them
+                    fk.referred_table.create(bind, checkfirst=True)
+                partitioned_copy(table, metadata).create(bind)
+                logger.info("Created %s partitioned by %s", table.name, PARTITION_KEY)
+            elif not is_partitioned(bind, table.name):
+                logger.warning("%s exists as a plain table; DB_PARTITION_BY_YEAR needs it dropped and reloaded",
+                               table.name)
+
+
+def is_partitioned(bind, name: str) -> bool:
+    key = (str(bind.engine.url), name)
+    if key not in _partitioned:
+        with bind.engine.connect() as conn:
+            found = conn.execute(text("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+                                      "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"), {"name": name}).first()
+        _partitioned[key] = found is not None
+    return _partitioned[key]
+
+
+def ensure_year_partitions(bind, scheme: str, years: Iterable[int]):
+    """Create the missing ``<table>_y<year>`` partitions of ``scheme``'s tables for ``years``.
+
+    Runs in its own short transaction (DDL locks the parent table), so rows in
+    a later load transaction always have a partition to go to. Known
+    partitions are remembered per process and cost nothing.
+    """
+    if not partitioning_enabled(bind):
+        return
+    url = str(bind.engine.url)
+    tables = [t.name for t in partitioned_tables(scheme) if is_partitioned(bind, t.name)]
+    missing = sorted({(name, int(y)) for name in tables for y in years if y is not None} -
+                     {(name, y) for (u, name, y) in _created if u == url})
+    if not missing:
+        return
+    with _lock:
+        with bind.engine.begin() as conn:
+            for name, year in missing:
+                conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name}_y{year} PARTITION OF {name} "
+                                  f"FOR VALUES FROM ({year}) TO ({year + 1})"))
+        _created.update((url, name, year) for name, year in missing)
+    logger.info("Ensured %d year partitions for %s", len(missing), scheme)
+
+
+def ensure_existing_years(bind, schemes: Iterable[str] = None):
+    """Create partitions for the years already present, e.g. before rebuilding rollups from the raw table."""
+    if not partitioning_enabled(bind):
+        return
+    for scheme in schemes or list(SCHEME_MODELS):
+        tables = [t for t in partitioned_tables(scheme) if is_partitioned(bind, t.name)]
+        if not tables:
+            continue
+        with bind.engine.connect() as conn:
+            years = conn.execute(union(*(select(t.c[PARTITION_KEY]).distinct() for t in tables))).scalars().all()
+        ensure_year_partitions(bind, scheme, years)
@@ -1,79 +1,340 @@
 from prefect import flow, task, get_run_logger
-from .etl.extract import fetch_data_from_datagov
-from .validation import validate_records
-from .schemas import SCHEMAS
-from .etl.transform import transform_pmay, transform_mnrega, transform_startup, transform_saubhagya
-from .etl.load import upsert_records
-from .db import SessionLocal, engine, Base
-from . import models
-import pandas as pd
+from prefect.runtime import flow_run
+from .etl.extract import ResourceSnapshot, fetch_data_from_datagov, iter_datagov_pages, rechunk, snapshot_resource
+from .etl.page_cache import page_cache
+from .validation import validate_frame
+from .schemas import DISTRICT_SCHEMAS, SCHEMAS
+from .etl.transform import TRANSFORM_SPECS, apply_transform
+from .etl.load import delete_missing, natural_keys, upsert_district_month, upsert_records
+from .db import SessionLocal, init_schema
+from .cache import get_query_cache
+from .config import settings
+from .metrics import etl_run, stage
+from .cleaned import write_snapshot
+from sqlalchemy.exc import SQLAlchemyError
+from . import facts, models, rollups
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import contextvars
+import time
+
+# state_year: one row per state and year, straight into the scheme table;
+# district_month: district x month feeds loaded through the fact tables (see facts.py)
+GRAINS = ("state_year", "district_month")
+
+
+def _schema(which: str, grain: str):
+    if grain not in GRAINS:
+        raise ValueError(f"Unknown grain: {grain}")
+    return (DISTRICT_SCHEMAS if grain == "district_month" else SCHEMAS).get(which)
+
+
+def _load_records(db, which: str, grain: str, records):
+    if grain == "district_month":
+        return upsert_district_month(db, which, records)
+    return upsert_records(db, models.SCHEME_MODELS[which], records)
 
 
 @task
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    init_schema()
     return True
 
 
 @task(retries=1)
-def extract(resource_id: str):
+def extract(which: str, resource_id: str):
     logger = get_run_logger()
     logger.info("Extracting resource %s", resource_id)
-    return fetch_data_from_datagov(resource_id)
+    with stage(which, "extract") as s:
+        records = fetch_data_from_datagov(resource_id) or []
+        s.rows_out = len(records)
+    return records
+
+
+@task(retries=1)
+def snapshot(which: str, resource_id: str):
+    """Download the resource into the raw-page cache (conditional requests) and hash it."""
+    logger = get_run_logger()
+    with stage(which, "snapshot") as s:
+        snap = snapshot_resource(resource_id, page_cache())
+        s.rows_out = snap.rows
+    logger.info("Resource %s: %d rows in %d pages, content %s", resource_id, snap.rows, len(snap.objects),
+                snap.content_hash[:12])
+    return snap
 
 
 @task
-def validate(which: str, records):
-    schema = SCHEMAS.get(which)
+def validate(which: str, records, grain: str = "state_year"):
+    schema = _schema(which, grain)
     if not schema:
         return []
-    return validate_records(schema, records)
+    with stage(which, "validate", rows_in=len(records)) as s:
+        valid, rejected = validate_frame(schema, records)
+        s.rows_out, s.rows_rejected = len(valid), int(rejected["row"].nunique())
+    return valid
 
 
 @task
 def transform(which: str, records):
-    if which == "pmay":
-        return transform_pmay(records).to_dict(orient="records")
-    if which == "mnrega":
-        return transform_mnrega(records).to_dict(orient="records")
-    if which == "startup_india":
-        return transform_startup(records).to_dict(orient="records")
-    if which == "saubhagya":
-        return transform_saubhagya(records).to_dict(orient="records")
-    return []
+    if which not in TRANSFORM_SPECS:
+        return []
+    with stage(which, "transform", rows_in=len(records)) as s:
+        rows = apply_transform(which, records).to_dict(orient="records")
+        s.rows_out = len(rows)
+    return rows
+
+
+@task
+def load(which: str, records, grain: str = "state_year"):
+    db = SessionLocal()
+    try:
+        with stage(which, "load", rows_in=len(records)) as s:
+            counts = _load_records(db, which, grain, records)
+            s.rows_out = counts["inserted"] + counts["updated"]
+        return counts
+    finally:
+        db.close()
+
+
+@task
+def prune(which: str, keys):
+    """Delete stored rows of ``which`` whose keys are not in ``keys``, the complete resource just loaded."""
+    db = SessionLocal()
+    try:
+        with stage(which, "delete") as s:
+            s.rows_out = delete_missing(db, models.SCHEME_MODELS[which], keys)
+        return s.rows_out
+    finally:
+        db.close()
+
+
+@task
+def write_cleaned(which: str):
+    """Refresh the scheme's Parquet snapshot in ``CLEANED_DIR``; returns its data version.
+
+    The load has already committed, so a failure here is logged and the run
+    still succeeds (the manifest keeps the previous snapshot and its version).
+    """
+    logger = get_run_logger()
+    with stage(which, "parquet") as s:
+        try:
+            entry = write_snapshot(which)
+        except (OSError, ValueError, SQLAlchemyError) as e:
+            logger.error("%s: could not write Parquet snapshot: %s", which, e)
+            return None
+        s.rows_out = entry["rows"] if entry else 0
+    return entry["version"] if entry else None
 
 
 @task
-def load(which: str, records):
+def stream_etl(which: str, resource_id: str, chunk_size: Optional[int] = None,
+               snap: Optional[ResourceSnapshot] = None, grain: str = "state_year", collect_keys: bool = False):
+    """Run extract -> validate -> transform -> load over fixed-size batches.
+
+    Only one chunk (plus one window of in-flight API pages) is held in memory
+    at a time, so peak memory is bounded by ``chunk_size`` rather than by the
+    size of the resource. With ``snap`` the pages are read back from the
+    raw-page cache instead of the API. With ``collect_keys`` the natural keys
+    of all loaded rows are returned under ``keys``.
+    """
+    logger = get_run_logger()
+    schema = _schema(which, grain)
+    if schema is None or which not in TRANSFORM_SPECS:
+        return {"chunks": 0, "fetched": 0, "ingested": 0, "inserted": 0, "updated": 0, "unchanged": 0, "keys": set()}
+    size = chunk_size or settings.ETL_CHUNK_SIZE
+
+    chunks = fetched = ingested = inserted = updated = unchanged = 0
+    keys = set() if collect_keys else None
+    started = time.perf_counter()
     db = SessionLocal()
-    model = getattr(models, {
-        "pmay": "PMAY",
-        "mnrega": "MNREGA",
-        "startup_india": "StartupIndia",
-        "saubhagya": "Saubhagya",
-    }[which])
-    upsert_records(db, model, records)
-    db.close()
+    try:
+        pages = snap.pages() if snap is not None else iter_datagov_pages(resource_id)
+        batches = rechunk(pages, size)
+        while True:
+            # pages are fetched (or read back from the cache) lazily, inside next()
+            with stage(which, "extract") as s:
+                chunk = next(batches, None)
+                s.rows_out = len(chunk) if chunk else 0
+            if chunk is None:
+                break
+            t0 = time.perf_counter()
+            with stage(which, "validate", rows_in=len(chunk)) as s:
+                valid, rejected = validate_frame(schema, chunk)
+                s.rows_out, s.rows_rejected = len(valid), int(rejected["row"].nunique())
+            with stage(which, "transform", rows_in=len(valid)) as s:
+                rows = apply_transform(which, valid).to_dict(orient="records")
+                s.rows_out = len(rows)
+            with stage(which, "load", rows_in=len(rows)) as s:
+                counts = _load_records(db, which, grain, rows)
+                s.rows_out = counts["inserted"] + counts["updated"]
+            elapsed = time.perf_counter() - t0
+            chunks += 1
+            fetched += len(chunk)
+            ingested += len(rows)
+            inserted += counts["inserted"]
+            updated += counts["updated"]
+            unchanged += counts.get("unchanged", 0)
+            if keys is not None:
+                keys |= natural_keys(rows)
+            logger.info("%s chunk %d: %d/%d rows loaded in %.3fs (%.0f rows/s)",
+                        which, chunks, len(rows), len(chunk), elapsed, len(chunk) / elapsed if elapsed else 0.0)
+    finally:
+        db.close()
+    total = time.perf_counter() - started
+    logger.info("%s streamed %d rows in %d chunks, %.2fs (%.0f rows/s)",
+                which, fetched, chunks, total, fetched / total if total else 0.0)
+    return {"chunks": chunks, "fetched": fetched, "ingested": ingested, "inserted": inserted, "updated": updated,
+            "unchanged": unchanged, "keys": keys}
 
 
 @flow
-def etl_for_scheme(which: str, resource_id: str):
-    init_db()
-    raw = extract(resource_id)
-    valid = validate(which, raw)
-    transformed = transform(which, valid)
-    load(which, transformed)
-    return {
-        "scheme": which,
-        "ingested": len(transformed)
-    }
+def etl_for_scheme(which: str, resource_id: str, stream: bool = False, chunk_size: Optional[int] = None,
+                   create_schema: bool = True, force: bool = False, grain: str = "state_year"):
+    """Extract, validate, transform and load one scheme.
+
+    When the raw-page cache is enabled the resource is first snapshotted to
+    ``data/raw``; if its content hash equals that of the last successful load
+    for this scheme, the run stops there (``skipped``) unless ``force`` is set.
+
+    ``grain="district_month"`` validates district x month records
+    (``DISTRICT_SCHEMAS``) and loads them into the scheme's fact table, from
+    which its state x year rows are re-derived.
+
+    Only new and changed rows are written (see ``upsert_records``); the result
+    counts ``unchanged`` rows too. With ``ETL_DELETE_MISSING`` a state-level
+    load in which every fetched record was loaded also deletes stored rows the
+    resource no longer has (``deleted``).
+
+    Afterwards the scheme's Parquet snapshot in ``data/cleaned`` is refreshed
+    if its data version moved (``PARQUET_SNAPSHOTS_ENABLED``).
+
+    Per-stage timings and counters (see ``gov_analytics.metrics``) are
+    returned under ``stages`` and saved to ``etl_stage_metrics``, also for runs
+    that fail part-way.
+    """
+    if grain == "district_month" and which not in facts.DISTRICT_SCHEMES:
+        raise ValueError(f"{which} has no district/month fact table")
+    if create_schema:
+        init_db()
+    with etl_run(which, flow_run.id) as run:
+        try:
+            result = _run_scheme(which, resource_id, stream, chunk_size, force, grain)
+            if settings.PARQUET_SNAPSHOTS_ENABLED:
+                result["cleaned_version"] = write_cleaned(which)
+        finally:
+            run.persist()
+        result["stages"] = run.to_dict()
+    return result
+
+
+def _run_scheme(which: str, resource_id: str, stream: bool, chunk_size: Optional[int], force: bool,
+                grain: str) -> dict:
+    logger = get_run_logger()
+    cache = page_cache()
+    snap = snapshot(which, resource_id) if cache is not None else None
+    if snap is not None and not force and cache.last_success(which, resource_id) == snap.content_hash:
+        logger.info("%s: resource %s unchanged since last load, skipping", which, resource_id)
+        return {"scheme": which, "ingested": 0, "inserted": 0, "updated": 0, "skipped": True}
+
+    # only a state-level load that kept every fetched record shows which stored rows were dropped
+    deletes = settings.ETL_DELETE_MISSING and grain == "state_year"
+    if stream:
+        stats = stream_etl(which, resource_id, chunk_size, snap, grain, collect_keys=deletes)
+        result = {
+            "scheme": which,
+            "ingested": stats["ingested"],
+            "inserted": stats["inserted"],
+            "updated": stats["updated"],
+            "unchanged": stats["unchanged"],
+            "chunks": stats["chunks"],
+        }
+        fetched, keys = stats["fetched"], stats["keys"]
+    else:
+        if snap is not None:
+            with stage(which, "extract") as s:
+                raw = snap.records()
+                s.rows_out = len(raw)
+        else:
+            raw = extract(which, resource_id)
+        valid = validate(which, raw, grain)
+        transformed = transform(which, valid)
+        counts = load(which, transformed, grain)
+        result = {
+            "scheme": which,
+            "ingested": len(transformed),
+            "inserted": counts["inserted"],
+            "updated": counts["updated"],
+            "unchanged": counts.get("unchanged", 0),
+        }
+        fetched, keys = len(raw), natural_keys(transformed) if deletes else None
+    if deletes:
+        if not keys:
+            logger.warning("%s: no rows loaded, not deleting stored rows", which)
+        elif fetched != result["ingested"]:
+            logger.warning("%s: %d of %d fetched records were not loaded, not deleting missing rows",
+                           which, fetched - result["ingested"], fetched)
+        else:
+            result["deleted"] = prune(which, keys)
+    if result["inserted"] or result["updated"] or result.get("deleted"):
+        get_query_cache().invalidate(rollups.dependent_tables(which))
+        if grain == "district_month":
+            get_query_cache().invalidate(facts.dependent_tables(which))
+    # load and prune raise on failure, so only a committed load reaches this point;
+    # a hash recorded for a failed load would skip the resource until --force
+    if snap is not None:
+        cache.mark_success(which, resource_id, snap.content_hash)
+    return result
+
+
+def _timed_scheme(which: str, resource_id: str, stream: bool, force: bool) -> dict:
+    started = time.perf_counter()
+    try:
+        result = etl_for_scheme(which, resource_id, stream=stream, create_schema=False, force=force)
+    except Exception as e:
+        result = {"scheme": which, "error": str(e)}
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
 
 
 @flow
-def full_etl_pipeline(config_map: dict):
-    results = {}
-    for which, rid in config_map.items():
-        results[which] = etl_for_scheme(which, rid)
+def full_etl_pipeline(config_map: dict, stream: bool = False, parallelism: Optional[int] = None,
+                      force: bool = False):
+    """Run ``etl_for_scheme`` for every scheme in ``config_map`` concurrently.
+
+    Schemes write to independent tables, so up to ``parallelism``
+    (``ETL_PIPELINE_PARALLELISM``) sub-flows run at once on a thread pool and
+    wall-clock time tracks the slowest scheme. Schema creation runs once, up
+    front. A failing scheme does not stop the others; the flow fails after all
+    have finished.
+    """
+    logger = get_run_logger()
+    init_db()
+    workers = max(1, min(parallelism or settings.ETL_PIPELINE_PARALLELISM, len(config_map) or 1))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="etl-scheme") as pool:
+        # copy the flow run context so each scheme is tracked as a sub-flow of this run
+        futures = {
+            which: pool.submit(contextvars.copy_context().run, _timed_scheme, which, rid, stream, force)
+            for which, rid in config_map.items()
+        }
+        results = {which: f.result() for which, f in futures.items()}
+    total = time.perf_counter() - started
+
+    for which, r in results.items():
+        if "error" in r:
+            logger.error("%s failed after %.2fs: %s", which, r["seconds"], r["error"])
+        elif r.get("skipped"):
+            logger.info("%s: unchanged, skipped in %.2fs", which, r["seconds"])
+        else:
+            logger.info("%s: %d rows (%d inserted, %d updated, %d unchanged) in %.2fs",
+                        which, r["ingested"], r["inserted"], r["updated"], r.get("unchanged", 0), r["seconds"])
+    slowest = max((r["seconds"] for r in results.values()), default=0.0)
+    logger.info("Pipeline finished %d schemes in %.2fs wall clock (slowest %.2fs, sum %.2fs, %d workers)",
+                len(results), total, slowest, sum(r["seconds"] for r in results.values()), workers)
+
+    failed = [which for which, r in results.items() if "error" in r]
+    if failed:
+        raise RuntimeError(f"ETL failed for: {', '.join(failed)}")
     return results
 
 
@@ -86,12 +347,17 @@ if __name__ == "__main__":
     parser.add_argument("--scheme", help="Scheme key (pmay|mnrega|startup_india|saubhagya)")
     parser.add_argument("--resource-id", help="data.gov.in resource id for the scheme")
     parser.add_argument("--config-file", help="Path to JSON file with mapping {scheme: resource_id}")
+    parser.add_argument("--stream", action="store_true", help="Process records in fixed-size chunks (ETL_CHUNK_SIZE)")
+    parser.add_argument("--force", action="store_true", help="Reload even if the resource content is unchanged")
+    parser.add_argument("--parallelism", type=int, help="Schemes to run at once (default ETL_PIPELINE_PARALLELISM)")
+    parser.add_argument("--grain", choices=GRAINS, default="state_year",
+                        help="Record grain of the resource (district_month for pmay/mnrega district feeds)")
     args = parser.parse_args()
 
     if args.scheme and args.resource_id:
         # Run a single scheme flow
         print(f"Running ETL for scheme={args.scheme} resource_id={args.resource_id}")
-        etl_for_scheme(args.scheme, args.resource_id)
+        etl_for_scheme(args.scheme, args.resource_id, stream=args.stream, force=args.force, grain=args.grain)
         sys.exit(0)
 
     if args.config_file:
@@ -99,7 +365,7 @@ if __name__ == "__main__":
             with open(args.config_file, "r", encoding="utf-8") as fh:
                 cfg = json.load(fh)
             print(f"Running full ETL using config file: {args.config_file}")
-            full_etl_pipeline(cfg)
+            full_etl_pipeline(cfg, stream=args.stream, parallelism=args.parallelism, force=args.force)
             sys.exit(0)
         except Exception as e:
             print(f"Failed to load config file: {e}")
@@ -113,4 +379,4 @@ if __name__ == "__main__":
         "saubhagya": "dummy-saubhagya-resource-id",
     }
     print("No args supplied — running full ETL with example resource IDs (replace with real IDs or use --scheme/--resource-id)")
-    full_etl_pipeline(cfg)
+    full_etl_pipeline(cfg, stream=args.stream, parallelism=args.parallelism, force=args.force)
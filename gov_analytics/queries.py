@@ -0,0 +1,132 @@
+"""Prepared dashboard queries.
+
+Routes never format SQL themselves. ``SCHEMES`` is the whitelist mapping each
+scheme to its raw table, rollup tables and metric columns; ``prepared(name,
+scheme, ...)`` builds the named Core statement once per (scheme, variant) and
+returns the same object afterwards, with every user-supplied value left as a
+bind parameter. Reusing the statement object lets SQLAlchemy's compiled cache
+and the driver's statement cache hit on every request.
+"""
+from functools import lru_cache, reduce
+from sqlalchemy import Table, bindparam, func, select
+from sqlalchemy.sql import Select
+from typing import Callable, Dict, FrozenSet, NamedTuple, Tuple
+from .facts import STOCK_METRICS, dim_district, dim_state, fact_table, metric_names
+from .models import RATIO_COLUMNS, SCHEME_MODELS, SCORE_COLUMNS, DataVersion
+from .rollups import ROLLUPS, metric_columns
+import operator
+
+
+class SchemeTables(NamedTuple):
+    table: Table
+    rollups: Dict[str, Table]
+    metrics: Tuple[str, ...]
+    ratios: Tuple[str, ...]
+
+
+SCHEMES: Dict[str, SchemeTables] = {
+    scheme: SchemeTables(model.__table__, ROLLUPS[scheme], tuple(metric_columns(scheme)), RATIO_COLUMNS.get(scheme, ()))
+    for scheme, model in SCHEME_MODELS.items()
+}
+
+
+class PreparedQuery(NamedTuple):
+    name: str
+    statement: Select
+    sql: str
+    tables: FrozenSet[str]
+
+
+QUERY_BUILDERS: Dict[str, Callable[..., Select]] = {}
+
+
+def query(name: str):
+    def register(fn):
+        QUERY_BUILDERS[name] = fn
+        return fn
+    return register
+
+
+def scheme_tables(scheme: str) -> SchemeTables:
+    try:
+        return SCHEMES[scheme]
+    except KeyError:
+        raise ValueError(f"Unknown scheme: {scheme}") from None
+
+
+@lru_cache(maxsize=None)
+def prepared(name: str, scheme: str, *variant) -> PreparedQuery:
+    """The statement ``name`` for ``scheme`` and ``variant`` flags, built once and reused."""
+    statement = QUERY_BUILDERS[name](scheme_tables(scheme) if scheme else None, *variant)
+    tables = frozenset(t.name for t in statement.get_final_froms() if hasattr(t, "name"))
+    return PreparedQuery(name, statement, str(statement), tables)
+
+
+@query("scores_by_state")
+def _scores_by_state(s: SchemeTables, by_year: bool) -> Select:
+    t = s.rollups["state_year" if by_year else "state"]
+    stmt = select(t.c.state_name, func.sum(t.c.score).label("score")).group_by(t.c.state_name)
+    return stmt.where(t.c.year == bindparam("year")) if by_year else stmt
+
+
+@query("state_scores")
+def _state_scores(s: SchemeTables, by_year: bool) -> Select:
+    t = s.rollups["state_year" if by_year else "state"]
+    stmt = select(t.c.state_code, t.c.state_name, t.c.score)
+    return stmt.where(t.c.year == bindparam("year")) if by_year else stmt
+
+
+@query("trend")
+def _trend(s: SchemeTables, by_state: bool, year_range: bool = False) -> Select:
+    if by_state:
+        t = s.rollups["state_year"]
+        stmt = (select(t.c.year, func.sum(t.c.score).label("val"))
+                .where(t.c.state_name == bindparam("state")).group_by(t.c.year).order_by(t.c.year))
+    else:
+        t = s.rollups["year"]
+        stmt = select(t.c.year, t.c.score.label("val")).order_by(t.c.year)
+    # a bounded year range lets PostgreSQL prune the year partitions of the state_year rollup
+    return stmt.where(t.c.year.between(bindparam("year_from"), bindparam("year_to"))) if year_range else stmt
+
+
+@query("district_scores")
+def _district_scores(s: SchemeTables, by_state: bool, by_month: bool) -> Select:
+    scheme = s.table.name
+    f = fact_table(scheme)
+    stock = STOCK_METRICS.get(scheme, ())
+    # cumulative metrics take the year's highest (latest) month rather than the sum of months
+    values = {m: func.coalesce((func.max if m in stock else func.sum)(f.c[m]), 0) for m in metric_names(scheme)}
+    # implicit joins keep every table in the FROM list, so query_df can invalidate on each of them
+    stmt = (select(dim_district.c.district_code, dim_district.c.district_name, dim_state.c.state_name,
+                   *(v.label(m) for m, v in values.items()),
+                   reduce(operator.add, (values[c] for c in SCORE_COLUMNS[scheme])).label("score"))
+            .where(f.c.district_id == dim_district.c.district_id, f.c.state_id == dim_state.c.state_id,
+                   f.c.year == bindparam("year"))
+            .group_by(dim_district.c.district_code, dim_district.c.district_name, dim_state.c.state_name)
+            .order_by(dim_district.c.district_code))
+    if by_state:
+        stmt = stmt.where(dim_state.c.state_name == bindparam("state"))
+    if by_month:
+        stmt = stmt.where(f.c.month == bindparam("month"))
+    return stmt
+
+
+@query("national_totals")
+def _national_totals(s: SchemeTables, columns: Tuple[str, ...]) -> Select:
+    t = s.rollups["national"]
+    return select(*(func.coalesce(func.sum(t.c[c]), 0).label(c) for c in columns))
+
+
+@query("kpi_panel")
+def _kpi_panel(s: SchemeTables, metric: str) -> Select:
+    # ratio columns are not rolled up; the raw table holds one row per state-year as well
+    t = s.table if metric in s.ratios else s.rollups["state_year"]
+    if metric not in t.c or metric in ("state_code", "state_name", "year"):
+        raise ValueError(f"Unknown metric: {metric}")
+    return (select(t.c.state_code, t.c.state_name, t.c.year, t.c[metric].label("value"))
+            .order_by(t.c.state_code, t.c.year))
+
+
+@query("data_version")
+def _data_version(_) -> Select:
+    return select(DataVersion.version).where(DataVersion.scheme == bindparam("scheme"))
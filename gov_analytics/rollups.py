@@ -0,0 +1,200 @@
+"""Pre-aggregated rollups of the scheme tables.
+
+Each scheme gets four tables, ``<scheme>_by_state_year``, ``_by_state``,
+``_by_year`` and ``_by_national``, holding ``row_count``, the dashboard
+``score`` and the sum of every additive metric (NULL counted as 0; ratio
+columns such as ``percent_coverage`` are left out, see ``RATIO_COLUMNS``). They are
+kept current by ``apply_delta``, which ``etl.load.upsert_records`` calls with
+the previous and new versions of the rows it writes, so only the change is
+added. ``rebuild_rollups`` recomputes them from the raw table.
+"""
+from sqlalchemy import BigInteger, Column, Float, Index, Integer, String, Table, delete, insert, inspect, select, func, text
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import TYPE_CHECKING, Dict, List, Optional
+from .db import Base, merge_rows
+from .models import RATIO_COLUMNS, SCHEME_MODELS, SCORE_COLUMNS, create_missing_indexes
+import logging
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+GRAINS = {
+    "state_year": ("state_code", "year"),
+    "state": ("state_code",),
+    "year": ("year",),
+    "national": ("scope",),
+}
+NATIONAL_SCOPE = "IN"
+
+_DIALECT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def metric_columns(scheme: str) -> List[str]:
+    """Numeric columns of ``scheme`` that add up across rows: everything but the keys and ratios."""
+    table = SCHEME_MODELS[scheme].__table__
+    skip = {"id", "year", *RATIO_COLUMNS.get(scheme, ())}
+    return [c.name for c in table.columns if isinstance(c.type, (Integer, Float)) and c.name not in skip]
+
+
+def _rollup_table(scheme: str, grain: str) -> Table:
+    model_table = SCHEME_MODELS[scheme].__table__
+    keys = GRAINS[grain]
+    cols = []
+    for k in keys:
+        if k == "scope":
+            cols.append(Column("scope", String(10), primary_key=True))
+        else:
+            cols.append(Column(k, model_table.c[k].type, primary_key=True, autoincrement=False))
+    if "state_code" in keys:
+        cols.append(Column("state_name", String(100)))
+    cols.append(Column("row_count", BigInteger, nullable=False, default=0))
+    score_float = any(isinstance(model_table.c[c].type, Float) for c in SCORE_COLUMNS[scheme])
+    cols.append(Column("score", Float if score_float else BigInteger, nullable=False, default=0))
+    for m in metric_columns(scheme):
+        cols.append(Column(m, Float if isinstance(model_table.c[m].type, Float) else BigInteger,
+                           nullable=False, default=0))
+    name = f"{scheme}_by_{grain}"
+    if grain == "state_year":
+        # the primary key leads with state_code; dashboard reads filter by year or state_name
+        cols.append(Index(f"ix_{name}_year_state_name", "year", "state_name"))
+        cols.append(Index(f"ix_{name}_state_name_year", "state_name", "year"))
+    return Table(name, Base.metadata, *cols)
+
+
+ROLLUPS: Dict[str, Dict[str, Table]] = {
+    scheme: {grain: _rollup_table(scheme, grain) for grain in GRAINS}
+    for scheme in SCHEME_MODELS
+}
+
+
+def rollup_table(scheme: str, grain: str) -> Table:
+    return ROLLUPS[scheme][grain]
+
+
+def dependent_tables(scheme: str) -> List[str]:
+    """The raw table, its rollups and the version table: everything a load into ``scheme`` changes."""
+    return [scheme, "data_versions"] + [t.name for t in ROLLUPS.get(scheme, {}).values()]
+
+
+def _contributions(scheme: str, rows: "pd.DataFrame") -> "pd.DataFrame":
+    """Per-row values each raw row adds to the rollups."""
+    import pandas as pd
+    metrics = metric_columns(scheme)
+    out = pd.DataFrame({"state_code": rows["state_code"], "year": rows["year"], "state_name": rows["state_name"]})
+    out["row_count"] = 1
+    for m in metrics:
+        out[m] = pd.to_numeric(rows[m], errors="coerce").fillna(0) if m in rows else 0
+    out["score"] = out[list(SCORE_COLUMNS[scheme])].sum(axis=1)
+    return out
+
+
+def apply_delta(conn, scheme: str, old_rows: "pd.DataFrame", new_rows: "pd.DataFrame"):
+    """Add the difference between ``new_rows`` and the ``old_rows`` they replace to every rollup grain.
+
+    Both frames hold raw-table rows; ``old_rows`` are the stored versions of the
+    keys in ``new_rows`` that already existed (empty for pure inserts). With
+    ``new_rows`` empty, ``old_rows`` are deleted rows: they are subtracted and
+    rollup rows left with no raw rows are removed. Runs on ``conn`` so it
+    commits or rolls back with the raw-table write.
+    """
+    has_old = old_rows is not None and not old_rows.empty
+    deleted = new_rows.empty
+    if deleted and not has_old:
+        return
+    value_cols = ["row_count", "score"] + metric_columns(scheme)
+    if deleted:
+        old = _contributions(scheme, old_rows).set_index(["state_code", "year"])
+        delta = -old[value_cols]
+        delta["state_name"] = old["state_name"]
+    else:
+        new = _contributions(scheme, new_rows).set_index(["state_code", "year"])
+        if has_old:
+            old = _contributions(scheme, old_rows).set_index(["state_code", "year"])
+            delta = new[value_cols].sub(old[value_cols].reindex(new.index).fillna(0))
+        else:
+            delta = new[value_cols]
+        delta["state_name"] = new["state_name"]
+    delta = delta.reset_index()
+    delta["scope"] = NATIONAL_SCOPE
+
+    insert_fn = _DIALECT_INSERTS.get(conn.dialect.name)
+    for grain, keys in GRAINS.items():
+        table = ROLLUPS[scheme][grain]
+        agg = {c: "sum" for c in value_cols}
+        if "state_code" in keys:
+            agg["state_name"] = "last"
+        grouped = delta.groupby(list(keys), as_index=False, sort=False).agg(agg)
+        if grouped.empty:
+            continue
+        records = grouped.astype(object).where(grouped.notna(), None).to_dict(orient="records")
+        if insert_fn is None:
+            merge_rows(conn, table, records, keys, ["state_name"] if "state_code" in keys else [], value_cols)
+        else:
+            stmt = insert_fn(table)
+            set_ = {c: table.c[c] + stmt.excluded[c] for c in value_cols}
+            if "state_code" in keys:
+                set_["state_name"] = stmt.excluded.state_name
+            stmt = stmt.on_conflict_do_update(index_elements=list(keys), set_=set_)
+            conn.execute(stmt, records)
+        if deleted:
+            conn.execute(delete(table).where(table.c.row_count <= 0))
+
+
+def rebuild_rollups(conn, scheme: str):
+    """Recompute all rollup grains of ``scheme`` from its raw table."""
+    raw = SCHEME_MODELS[scheme].__table__
+    metrics = metric_columns(scheme)
+    score = sum(func.coalesce(raw.c[c], 0) for c in SCORE_COLUMNS[scheme])
+    sums = [func.coalesce(func.sum(func.coalesce(raw.c[m], 0)), 0).label(m) for m in metrics]
+    measures = [func.count().label("row_count"), func.coalesce(func.sum(score), 0).label("score")] + sums
+    cols = ["row_count", "score"] + metrics
+    for grain, keys in GRAINS.items():
+        table = ROLLUPS[scheme][grain]
+        conn.execute(delete(table))
+        if grain == "national":
+            query = select(func.cast(NATIONAL_SCOPE, String).label("scope"), *measures).select_from(raw)
+            query = query.having(func.count() > 0)
+            target = ["scope"] + cols
+        else:
+            group = [raw.c[k] for k in keys]
+            name = [func.max(raw.c.state_name).label("state_name")] if "state_code" in keys else []
+            query = select(*group, *name, *measures).group_by(*group)
+            target = list(keys) + (["state_name"] if name else []) + cols
+        conn.execute(insert(table).from_select(target, query))
+    logger.info("Rebuilt rollups for %s", scheme)
+
+
+def drop_stale_columns(bind, schemes: Optional[List[str]] = None):
+    """Drop columns of existing rollup tables that are no longer maintained (e.g. summed ratio columns).
+
+    They are NOT NULL without a server default, so inserts that leave them out would fail.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for scheme in schemes or list(SCHEME_MODELS):
+            for table in ROLLUPS[scheme].values():
+                if not inspector.has_table(table.name):
+                    continue
+                for col in inspector.get_columns(table.name):
+                    if col["name"] not in table.c:
+                        conn.execute(text(f"ALTER TABLE {table.name} DROP COLUMN {col['name']}"))
+                        logger.info("Dropped column %s from %s", col["name"], table.name)
+
+
+def ensure_rollups(bind, schemes: Optional[List[str]] = None):
+    """Backfill rollups for schemes whose raw table has rows but whose rollups are empty."""
+    drop_stale_columns(bind, schemes)
+    create_missing_indexes(bind, [t for scheme in schemes or list(SCHEME_MODELS) for t in ROLLUPS[scheme].values()])
+    with bind.begin() as conn:
+        for scheme in schemes or list(SCHEME_MODELS):
+            raw = SCHEME_MODELS[scheme].__table__
+            national = ROLLUPS[scheme]["national"]
+            has_raw = conn.execute(select(func.count()).select_from(raw)).scalar()
+            has_rollup = conn.execute(select(func.count()).select_from(national)).scalar()
+            if has_raw and not has_rollup:
+                rebuild_rollups(conn, scheme)
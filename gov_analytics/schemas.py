@@ -1,6 +1,9 @@
 from pydantic import BaseModel, Field, validator
 from typing import Optional
 
+YEAR_MIN = 2000
+YEAR_MAX = 2100
+
 
 class BaseRecord(BaseModel):
     state_code: str = Field(..., max_length=10)
@@ -9,7 +12,7 @@ class BaseRecord(BaseModel):
 
     @validator("year")
     def check_year(cls, v):
-        if v < 2000 or v > 2100:
+        if v < YEAR_MIN or v > YEAR_MAX:
             raise ValueError("year out of realistic range")
         return v
 
@@ -36,9 +39,29 @@ class SaubhagyaRecord(BaseRecord):
     percent_coverage: Optional[float]
 
 
+class DistrictMonthRecord(BaseRecord):
+    district_code: str = Field(..., max_length=20)
+    district_name: str
+    month: int = Field(..., ge=1, le=12)
+
+
+class PMAYDistrictMonthRecord(DistrictMonthRecord, PMAYRecord):
+    pass
+
+
+class MNREGADistrictMonthRecord(DistrictMonthRecord, MNREGARecord):
+    pass
+
+
 SCHEMAS = {
     "pmay": PMAYRecord,
     "mnrega": MNREGARecord,
     "startup_india": StartupRecord,
     "saubhagya": SaubhagyaRecord,
 }
+
+# district x month feeds, loaded through facts.FACTS (see etl.load.upsert_district_month)
+DISTRICT_SCHEMAS = {
+    "pmay": PMAYDistrictMonthRecord,
+    "mnrega": MNREGADistrictMonthRecord,
+}
@@ -0,0 +1,204 @@
+"""Columnar in-memory copy of the scheme tables for the dashboard.
+
+With ``ANALYTICS_STORE_ENABLED`` each scheme table is loaded into NumPy arrays:
+``state_code`` and ``state_name`` as small integer codes into label arrays,
+``year`` as int16 with rows sorted by year (so a year filter is a slice found by
+binary search), integer metrics without nulls downcast to the smallest dtype and
+the rest as float64. Group-by sums are ``np.bincount`` over the codes.
+
+A snapshot records the ``data_versions`` counter it was built from. Readers
+re-check that counter at most every ``ANALYTICS_STORE_CHECK_SECONDS`` (and
+immediately after an in-process load) and rebuild on change; the new snapshot
+replaces the old one in a single reference swap, so a query sees either the
+old or the new data, never a mix.
+"""
+from sqlalchemy import Integer, select
+from typing import Dict, List, Optional, Sequence
+from .config import settings
+from .db import connect
+from .models import SCHEME_MODELS, SCORE_COLUMNS, DataVersion
+import numpy as np
+import pandas as pd
+import functools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+GROUP_KEYS = ("state_code", "state_name", "year")
+
+
+def _compact(values: pd.Series) -> np.ndarray:
+    numeric = pd.to_numeric(values, errors="coerce")
+    if numeric.isna().any() or not np.allclose(numeric, np.round(numeric)):
+        return numeric.to_numpy(dtype="float64")
+    return pd.to_numeric(numeric.astype("int64"), downcast="integer").to_numpy()
+
+
+def _codes(values: pd.Series):
+    codes, labels = pd.factorize(values, use_na_sentinel=True)
+    dtype = np.int16 if len(labels) < 2 ** 15 else np.int32
+    return codes.astype(dtype), np.asarray(labels, dtype=object)
+
+
+class SchemeColumns:
+    """Immutable columnar snapshot of one scheme table."""
+
+    def __init__(self, scheme: str, version: int, df: pd.DataFrame):
+        df = df.sort_values(["year", "state_code"], kind="stable")
+        self.scheme = scheme
+        self.version = version
+        self.rows = len(df)
+        self.state_code, self.state_codes = _codes(df["state_code"])
+        self.state_name, self.state_names = _codes(df["state_name"])
+        self.year = pd.to_numeric(df["year"], errors="coerce").fillna(0).to_numpy(dtype=np.int16)
+        self.metrics: Dict[str, np.ndarray] = {c: _compact(df[c]) for c in df.columns if c not in GROUP_KEYS}
+        self.metrics["score"] = sum(np.nan_to_num(self.metrics[c].astype("float64")) for c in SCORE_COLUMNS[scheme])
+        # sums of Integer columns (nullable ones are held as float64) are reported as integers
+        table = SCHEME_MODELS[scheme].__table__
+        self.integer_measures = {c for c in self.metrics if c in table.c and isinstance(table.c[c].type, Integer)}
+        if all(c in self.integer_measures for c in SCORE_COLUMNS[scheme]):
+            self.integer_measures.add("score")
+        self.integer_measures.add("row_count")
+        # representative name per code, as the rollups keep the last one seen
+        self.code_names = np.empty(len(self.state_codes), dtype=object)
+        self.code_names[self.state_code[self.state_code >= 0]] = self.state_names[self.state_name[self.state_code >= 0]]
+
+    def nbytes(self) -> int:
+        arrays = [self.state_code, self.state_name, self.year, *self.metrics.values()]
+        labels = sum(len(str(v)) for v in self.state_codes) + sum(len(str(v)) for v in self.state_names)
+        return sum(a.nbytes for a in arrays) + labels
+
+    def _selection(self, year: Optional[int], state_name: Optional[str]) -> np.ndarray:
+        if year is None:
+            idx = np.arange(self.rows)
+        else:
+            lo, hi = np.searchsorted(self.year, [year, year + 1])
+            idx = np.arange(lo, hi)
+        if state_name is not None:
+            match = np.flatnonzero(self.state_names == state_name)
+            idx = idx[self.state_name[idx] == match[0]] if len(match) else idx[:0]
+        return idx
+
+    def aggregate(self, by: Sequence[str], measures: Sequence[str], year: Optional[int] = None,
+                  state_name: Optional[str] = None) -> pd.DataFrame:
+        """Sum ``measures`` (NULL as 0, like the rollups) grouped by ``by``, after filtering.
+
+        ``row_count`` is available as a measure. Grouping by ``state_code``
+        also returns that state's ``state_name``. Rows are sorted by ``by``.
+        """
+        idx = self._selection(year, state_name)
+        keys = {"state_code": self.state_code, "state_name": self.state_name, "year": self.year}
+        if by:
+            # one int64 code per row combining the key codes, then a 1-D unique
+            parts = [keys[k][idx].astype(np.int64) for k in by]
+            offsets = [p.min() if len(p) else 0 for p in parts]
+            dims = tuple(int(p.max() - o) + 1 if len(p) else 1 for p, o in zip(parts, offsets))
+            combined = np.ravel_multi_index([p - o for p, o in zip(parts, offsets)], dims)
+            uniques, inverse = np.unique(combined, return_inverse=True)
+            group = [g + o for g, o in zip(np.unravel_index(uniques, dims), offsets)]
+            ngroups = len(uniques)
+        else:
+            group, inverse, ngroups = [], np.zeros(len(idx), dtype=np.int64), 1 if len(idx) else 0
+
+        out = {}
+        for i, k in enumerate(by):
+            if k == "year":
+                out[k] = group[i]
+            elif k == "state_code":
+                out[k] = self.state_codes[group[i]]
+                if "state_name" not in by:
+                    out["state_name"] = self.code_names[group[i]]
+            else:
+                out[k] = self.state_names[group[i]]
+        for m in measures:
+            if m == "row_count":
+                out[m] = np.bincount(inverse, minlength=ngroups)
+                continue
+            values = self.metrics[m][idx]
+            sums = np.bincount(inverse, weights=np.nan_to_num(values.astype("float64")), minlength=ngroups)
+            out[m] = sums.astype(np.int64) if m in self.integer_measures else sums
+        df = pd.DataFrame(out)
+        # groups come out in code order; sort by value as the SQL and Parquet backends do
+        return df.sort_values(list(by), kind="stable").reset_index(drop=True) if by else df
+
+
+class AnalyticsStore:
+    def __init__(self, enabled: bool, check_interval: float):
+        self.enabled = enabled
+        self.check_interval = check_interval
+        self._snapshots: Dict[str, SchemeColumns] = {}
+        self._checked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def _current_version(self, scheme: str) -> int:
+        with connect() as conn:
+            version = conn.execute(select(DataVersion.version).where(DataVersion.scheme == scheme)).scalar()
+        return int(version or 0)
+
+    def _build(self, scheme: str, version: int) -> SchemeColumns:
+        table = SCHEME_MODELS[scheme].__table__
+        columns = [c for c in table.columns if c.name not in ("id", "created_at", "row_hash")]
+        started = time.perf_counter()
+        with connect() as conn:
+            df = pd.read_sql(select(*columns), conn)
+        snapshot = SchemeColumns(scheme, version, df)
+        logger.info("Analytics store: loaded %s v%d, %d rows, %d bytes in %.3fs", scheme, version,
+                    snapshot.rows, snapshot.nbytes(), time.perf_counter() - started)
+        return snapshot
+
+    def refresh(self, scheme: str) -> SchemeColumns:
+        """Rebuild ``scheme`` if its data version moved, and swap the snapshot in."""
+        with self._lock:
+            version = self._current_version(scheme)
+            self._checked[scheme] = time.monotonic()
+            current = self._snapshots.get(scheme)
+            if current is not None and current.version == version:
+                return current
+            snapshot = self._build(scheme, version)
+            self._snapshots = {**self._snapshots, scheme: snapshot}
+            self.rebuilds += 1
+            return snapshot
+
+    def snapshot(self, scheme: str) -> Optional[SchemeColumns]:
+        """Current snapshot of ``scheme``, or None when the store is disabled."""
+        if not self.enabled or scheme not in SCHEME_MODELS:
+            return None
+        current = self._snapshots.get(scheme)
+        if current is None or time.monotonic() - self._checked.get(scheme, 0.0) >= self.check_interval:
+            return self.refresh(scheme)
+        return current
+
+    def notify_load(self, scheme: str):
+        """Called after a committed load in this process; the next read re-checks the version."""
+        self._checked.pop(scheme, None)
+
+    def warm(self, schemes: Optional[List[str]] = None):
+        if not self.enabled:
+            return
+        for scheme in schemes or list(SCHEME_MODELS):
+            try:
+                self.refresh(scheme)
+            except Exception:
+                logger.exception("Analytics store: could not load %s; will retry on first use", scheme)
+
+    def stats(self) -> Dict[str, object]:
+        snapshots = self._snapshots
+        return {
+            "enabled": self.enabled,
+            "rebuilds": self.rebuilds,
+            "schemes": {s: {"version": c.version, "rows": c.rows, "bytes": c.nbytes()} for s, c in snapshots.items()},
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def get_analytics_store() -> AnalyticsStore:
+    return AnalyticsStore(settings.ANALYTICS_STORE_ENABLED, settings.ANALYTICS_STORE_CHECK_SECONDS)
+
+
+def __getattr__(name: str):
+    if name == "analytics_store":
+        return get_analytics_store()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
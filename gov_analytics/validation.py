@@ -1,9 +1,33 @@
-from typing import List, Type
+from typing import List, Tuple, Type, Union, get_args, get_origin
 from pydantic import ValidationError
+import numpy as np
+import pandas as pd
 import logging
+from .schemas import YEAR_MIN, YEAR_MAX
 
 logger = logging.getLogger(__name__)
 
+# Reason codes used in the rejected-row report of validate_frame
+MISSING = "missing"
+NULL = "null"
+INVALID_TYPE = "invalid_type"
+INVALID_NUMBER = "invalid_number"
+TOO_LONG = "too_long"
+OUT_OF_RANGE = "out_of_range"
+
+_INT_STRING = r"^\s*[+-]?\d+(?:\.0*)?\s*$"
+_FLOAT_NAN_STRINGS = {"nan", "+nan", "-nan"}
+_NUMERIC_TYPES = (bool, int, float, np.bool_, np.integer, np.floating)
+# integers at or past 2**63 do not fit the BIGINT/Int64 columns they are stored in
+_INT_LIMIT = float(2 ** 63)
+
+
+class _Missing:
+    pass
+
+
+_MISSING = _Missing()
+
 
 def validate_records(schema: Type, records: List[dict]) -> List[dict]:
     """Validate and coerce records to schema. Returns list of dicts of valid records.
@@ -18,3 +42,159 @@ def validate_records(schema: Type, records: List[dict]) -> List[dict]:
         except ValidationError as e:
             logger.warning("Record %s failed validation: %s", i, e)
     return valid
+
+
+def _field_specs(schema: Type):
+    """Yield (name, base_type, nullable, required, max_length, (ge, le)) for each schema field."""
+    for name, field in schema.model_fields.items():
+        ann = field.annotation
+        nullable = False
+        if get_origin(ann) is Union:
+            args = [a for a in get_args(ann) if a is not type(None)]
+            nullable = len(args) < len(get_args(ann))
+            ann = args[0]
+        max_length = next((m.max_length for m in field.metadata if hasattr(m, "max_length")), None)
+        ge = next((m.ge for m in field.metadata if hasattr(m, "ge")), None)
+        le = next((m.le for m in field.metadata if hasattr(m, "le")), None)
+        yield name, ann, nullable, field.is_required(), max_length, (ge, le)
+
+
+def _raw(data: Union[List[dict], pd.DataFrame], frame: pd.DataFrame, name: str, rows: np.ndarray) -> pd.Series:
+    """Original values of ``name`` at positions ``rows`` as an object Series (``_MISSING`` when absent)."""
+    col = np.empty(len(rows), dtype=object)
+    if not isinstance(data, pd.DataFrame):
+        col[:] = [data[i].get(name, _MISSING) for i in rows]
+    elif name not in frame.columns:
+        col[:] = [_MISSING] * len(rows)
+    else:
+        # frames cannot tell None from NaN in numeric columns; treat both as null
+        col[:] = frame[name].to_numpy(dtype=object)[rows]
+        col[pd.isna(col)] = None
+    # without dtype=object pandas may infer a string dtype and turn None into NaN
+    return pd.Series(col, index=rows, dtype=object)
+
+
+def _types(s: pd.Series) -> Tuple[pd.Series, pd.Series, pd.Series, pd.Series]:
+    """Return (is_str, is_num, is_none, is_missing) masks for an object Series."""
+    codes, uniques = pd.factorize(s.map(type))
+
+    def mask(pred):
+        hits = [i for i, t in enumerate(uniques) if pred(t)]
+        return pd.Series(np.isin(codes, hits), index=s.index)
+
+    return (mask(lambda t: t is str), mask(lambda t: issubclass(t, _NUMERIC_TYPES)),
+            mask(lambda t: t is type(None)), mask(lambda t: t is _Missing))
+
+
+def _parse_int_strings(strs: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    parsable = strs.str.match(_INT_STRING).astype(bool)
+    values = pd.Series(np.nan, index=strs.index)
+    values[parsable] = strs[parsable].str.strip().astype(float)
+    return values, ~parsable
+
+
+def _parse_float_strings(strs: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    strs = strs.str.strip()
+    values = pd.to_numeric(strs, errors="coerce").astype(float)
+    return values, values.isna() & ~strs.str.lower().isin(_FLOAT_NAN_STRINGS)
+
+
+def validate_frame(schema: Type, data: Union[List[dict], pd.DataFrame]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Vectorized equivalent of ``validate_records`` over a whole batch.
+
+    Field types, nullability, required-ness, ``max_length`` and ``ge``/``le``
+    bounds are read from the pydantic ``schema``; the year range mirrors
+    ``BaseRecord.check_year``.
+    Returns ``(valid, rejected)``: ``valid`` holds the coerced schema columns for
+    rows that pass every check (same values as ``validate_records``, except that
+    NaN in a nullable float column comes back as null), and
+    ``rejected`` has one ``row, field, reason`` entry per failing field, where
+    ``row`` is the input position.
+    """
+    n = len(data)
+    columns = {}
+    problems = []
+
+    def reject(mask: pd.Series, field: str, reason: str):
+        rows = np.flatnonzero(mask.to_numpy(dtype=bool))
+        if len(rows):
+            problems.append(pd.DataFrame({"row": rows, "field": field, "reason": reason}))
+
+    # positions, not index labels, identify rows (callers may pass slices of a larger frame)
+    frame = data.reset_index(drop=True) if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+    for name, base, nullable, required, max_length, (ge, le) in _field_specs(schema):
+        col = frame[name] if name in frame.columns and len(frame) else None
+        numeric = base in (int, float)
+        # typed columns are checked vectorized; only holes and mixed columns fall back to raw values
+        typed = col is not None and col.dtype != object and (
+            pd.api.types.is_numeric_dtype(col) if numeric else pd.api.types.is_string_dtype(col))
+        fast = col.notna().to_numpy() if typed else np.zeros(n, dtype=bool)
+        raw = _raw(data, frame, name, np.flatnonzero(~fast))
+        is_str, is_num, is_none, is_missing = _types(raw)
+
+        def full(mask: pd.Series) -> pd.Series:
+            out = pd.Series(False, index=range(n))
+            out[mask.index[mask.to_numpy(dtype=bool)]] = True
+            return out
+
+        reject(full(is_missing & required), name, MISSING)
+        if nullable:
+            null_ok = is_none | is_missing
+        else:
+            null_ok = pd.Series(False, index=raw.index)
+            reject(full(is_none), name, NULL if numeric else INVALID_TYPE)
+
+        if not numeric:
+            reject(full(~(is_str | is_none | is_missing)), name, INVALID_TYPE)
+            values = pd.Series(None, index=range(n), dtype=object)
+            if typed:
+                values[fast] = col[fast].astype(object)
+            values[raw.index[is_str]] = raw[is_str]
+            if max_length is not None:
+                reject(values.str.len().gt(max_length), name, TOO_LONG)
+            columns[name] = values
+            continue
+
+        reject(full(~(is_str | is_num | is_none | is_missing)), name, INVALID_TYPE)
+        values = pd.Series(np.nan, index=range(n))
+        if typed:
+            values[fast] = col[fast].astype(float)
+        values[raw.index[is_num]] = raw[is_num].astype(float)
+        parse = _parse_int_strings if base is int else _parse_float_strings
+        parsed, unparsable = parse(raw[is_str].astype(str))
+        values[parsed.index] = parsed
+        bad = full(unparsable)
+        if base is int:
+            from_number = pd.Series(fast, index=range(n)) | full(is_num)
+            bad |= from_number & ~(np.isfinite(values) & (values == np.floor(values)))
+        reject(bad, name, INVALID_NUMBER)
+        if base is int:
+            overflow = ~bad & (values.abs() >= _INT_LIMIT)
+            reject(overflow, name, OUT_OF_RANGE)
+            bad |= overflow
+        if name == "year":
+            ge, le = YEAR_MIN, YEAR_MAX
+        if ge is not None or le is not None:
+            ok = ~bad & values.notna()
+            low = values < ge if ge is not None else False
+            high = values > le if le is not None else False
+            reject(ok & (low | high), name, OUT_OF_RANGE)
+        if base is int:
+            values = values.where(np.isfinite(values) & ~bad).round().astype("Int64" if nullable else "float")
+        elif nullable:
+            values = values.astype("Float64")
+        columns[name] = values
+
+    rejected = (pd.concat(problems, ignore_index=True).sort_values(["row", "field"], kind="stable").reset_index(drop=True)
+                if problems else pd.DataFrame({"row": pd.Series(dtype=int), "field": pd.Series(dtype=object), "reason": pd.Series(dtype=object)}))
+    keep = np.ones(n, dtype=bool)
+    keep[rejected["row"].to_numpy(dtype=int)] = False
+
+    valid = pd.DataFrame(columns)[keep].reset_index(drop=True)
+    for name, base, nullable, _, _, _ in _field_specs(schema):
+        if base is int and not nullable:
+            valid[name] = valid[name].astype("int64")
+    if len(rejected):
+        logger.warning("%d of %d records failed validation: %s", n - int(keep.sum()), n,
+                       rejected["reason"].value_counts().to_dict())
+    return valid, rejected
@@ -1,14 +1,35 @@
-from flask import Flask, render_template, send_file, request, jsonify
-from .db import SessionLocal
-from sqlalchemy import text
-import plotly.io as pio
-import plotly.express as px
-import pandas as pd
-import io
-import os
+"""The dashboard: a ``dashboard`` blueprint and the ``create_app`` factory.
+
+Serve it with ``flask --app gov_analytics.web run`` or
+``uvicorn gov_analytics.asgi:app``; ``web.app`` is a default app built on
+first access for code that imports it.
+
+Importing this module is kept cheap so workers start fast: the database
+engines and settings are created on first use (see ``db`` and ``config``),
+and pandas, plotly, the analytics store and the KPI code are imported by the
+views that need them. ``scripts/import_budget.py`` enforces this.
+"""
+from flask import Blueprint, Flask, current_app, g, render_template, request, jsonify, url_for
+from typing import Any, Dict, Optional
+from .db import pool_stats, read_sql
+from prometheus_client import CONTENT_TYPE_LATEST
+import asyncio
+import functools
+import importlib.util
+import json
 import logging
+import time
 from pathlib import Path
 from .config import settings
+from .cache import cache_key, get_chart_cache, get_query_cache
+from .queries import SCHEMES, PreparedQuery, prepared
+from .geo import get_state_geometry
+from .export import FORMATS, stream_export
+from .jobs import QueueFull, get_job, get_scheduler, list_jobs
+from .facts import DISTRICT_SCHEMES
+from .schemas import YEAR_MAX, YEAR_MIN
+from .metrics import exposition, observe_request
+from . import aio
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -18,150 +39,455 @@ base_dir = Path(__file__).resolve().parent.parent
 template_folder = str(base_dir / "dashboard" / "templates")
 static_folder = str(base_dir / "dashboard" / "static")
 
-app = Flask(__name__, template_folder=template_folder, static_folder=static_folder)
+bp = Blueprint("dashboard", __name__)
+
+
+def create_app(config: Optional[Dict[str, Any]] = None) -> Flask:
+    """Build the dashboard app; ``config`` overrides Flask config keys."""
+    app = Flask(__name__, template_folder=template_folder, static_folder=static_folder)
+    if config:
+        app.config.update(config)
+    # async views run on a shared background loop under WSGI; gov_analytics.asgi awaits them natively
+    app.async_to_sync = aio.async_to_sync
+    app.register_blueprint(bp)
+    if settings.ANALYTICS_STORE_ENABLED:
+        # schemes that fail here load on first use
+        from .store import get_analytics_store
+        get_analytics_store().warm()
+    return app
+
+
+@functools.lru_cache(maxsize=None)
+def default_app() -> Flask:
+    return create_app()
+
+
+def __getattr__(name: str):
+    # ``from gov_analytics.web import app`` and FLASK_APP=gov_analytics.web get the default app
+    if name == "app":
+        return default_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@bp.before_app_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@bp.after_app_request
+def _observe_request_latency(resp):
+    # labelled by URL rule, not path, to keep the series count bounded;
+    # streamed bodies (exports) are timed until the handler returns, not to the last byte
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    observe_request(request.method, route, resp.status_code, time.perf_counter() - g.request_started)
+    return resp
+
 
+def query_df(sql, params=None, cache: bool = True):
+    """Run a read query, serving repeated (sql, params) from ``query_cache``.
 
-def query_df(sql: str):
-    db = SessionLocal()
+    ``sql`` is SQL text or a ``queries.PreparedQuery``. Returned frames may be
+    shared with other requests and must not be mutated.
+    """
+    if isinstance(sql, PreparedQuery):
+        if not cache:
+            return read_sql(sql.statement, params)
+        return get_query_cache().get_or_compute(cache_key(sql.sql, params), lambda: read_sql(sql.statement, params), sql.tables)
+    if not cache:
+        return read_sql(sql, params)
+    return get_query_cache().get_or_load(sql, params, lambda: read_sql(sql, params))
+
+
+def store_frame(scheme: str, by, measures, year=None, state_name=None):
+    """Aggregate from the in-memory analytics store, else the Parquet snapshots; None when neither is enabled or available."""
+    from .store import get_analytics_store
+    from .cleaned import get_cleaned_store
+    try:
+        snapshot = get_analytics_store().snapshot(scheme)
+    except Exception:
+        logger.exception("Analytics store unavailable for %s", scheme)
+        snapshot = None
+    if snapshot is not None:
+        return snapshot.aggregate(by, measures, year=year, state_name=state_name)
     try:
-        df = pd.read_sql(sql, db.bind)
-        return df
-    finally:
-        db.close()
+        return get_cleaned_store().aggregate(scheme, by, measures, year=year, state_name=state_name)
+    except Exception:
+        logger.exception("Parquet snapshots unavailable for %s, falling back to SQL", scheme)
+        return None
+
+
+async def national_totals(columns) -> dict:
+    """``{scheme: DataFrame or exception}`` of the national totals of ``columns[scheme]``.
+
+    The analytics store and Parquet lookups run in worker threads, since a
+    snapshot rebuild or a Parquet scan would otherwise block the event loop.
+    Schemes they cannot answer are queried concurrently, each within
+    ``QUERY_TIMEOUT_SECONDS``.
+    """
+    lookups = await asyncio.gather(*(asyncio.to_thread(store_frame, scheme, [], list(cols))
+                                     for scheme, cols in columns.items()), return_exceptions=True)
+    frames = dict(zip(columns, lookups))
+    pending = {scheme: aio.query_df_async(prepared("national_totals", scheme, tuple(cols)))
+               for scheme, cols in columns.items() if frames[scheme] is None}
+    return {**frames, **await aio.gather_queries(pending)}
+
+
+def _first_value(df) -> int:
+    return int(df.iloc[0, 0]) if not isinstance(df, BaseException) and not df.empty else 0
+
+
+@bp.route("/")
+async def index():
+    # Overview KPIs; a failed or timed-out aggregate shows as 0
+    totals = await national_totals({"pmay": ("beneficiaries",), "mnrega": ("person_days_generated",)})
+    return render_template("overview.html", total_beneficiaries=_first_value(totals["pmay"]),
+                           total_pdays=_first_value(totals["mnrega"]))
 
 
-@app.route("/")
-def index():
-    # Overview KPIs
+@bp.route("/api/overview")
+async def api_overview():
+    """National totals of every additive metric of every scheme, fetched concurrently; failed schemes are reported under ``errors``."""
+    totals = await national_totals({scheme: s.metrics for scheme, s in SCHEMES.items()})
+    data = {scheme: (df.to_dict(orient="records")[0] if not df.empty else {})
+            for scheme, df in totals.items() if not isinstance(df, BaseException)}
+    errors = {scheme: type(e).__name__ for scheme, e in totals.items() if isinstance(e, Exception)}
+    return jsonify({"schemes": data, "errors": errors})
+
+
+def data_version(scheme: str) -> int:
+    """Load counter for ``scheme``; bumped by every committed ETL load."""
     try:
-        total_b = query_df("SELECT COALESCE(SUM(beneficiaries),0) as total_beneficiaries FROM pmay;").iloc[0,0]
-        total_pdays = query_df("SELECT COALESCE(SUM(person_days_generated),0) as mnrega_pd FROM mnrega;").iloc[0,0]
+        df = query_df(prepared("data_version", ""), {"scheme": scheme})
     except Exception:
-        total_b = 0
-        total_pdays = 0
-    return render_template("overview.html", total_beneficiaries=int(total_b), total_pdays=int(total_pdays))
+        return 0
+    return int(df.iloc[0, 0]) if not df.empty else 0
 
 
-@app.route("/scheme")
-def scheme_page():
-    scheme = request.args.get("scheme", "pmay")
-    year = request.args.get("year", None)
-    year_filter = f"WHERE year={int(year)}" if year else ""
-    
-    # Use scheme-specific columns
-    column_map = {
-        "pmay": "COALESCE(beneficiaries,0)+COALESCE(houses_completed,0)",
-        "mnrega": "COALESCE(person_days_generated,0)+COALESCE(job_cards,0)",
-        "startup_india": "COALESCE(startups_supported,0)",
-        "saubhagya": "COALESCE(households_electrified,0)"
-    }
-    
-    score_col = column_map.get(scheme, "1")
-    sql = f"SELECT state_name, SUM({score_col}) as score FROM {scheme} {year_filter} GROUP BY state_name"
+CHART_BUILDERS = {}
+
+
+def chart(name: str, params):
+    """Register a figure builder for ``render_chart`` and ``/chart/<name>.json``.
+
+    Builders take the request ``params`` as keyword arguments and return a
+    plotly figure, or an HTML message when there is nothing to plot.
+    """
+    def register(fn):
+        CHART_BUILDERS[name] = (fn, tuple(params))
+        return fn
+    return register
+
+
+# chart params parsed as integers; anything else is passed on as a string
+_INT_CHART_PARAMS = ("year", "year_from", "year_to")
+
+
+def _chart_args(name: str) -> dict:
+    """The chart's params from the query string. Raises ValueError for a non-numeric year."""
+    _, params = CHART_BUILDERS[name]
+    args = {}
+    for p in params:
+        value = request.args.get(p) or None
+        if value is not None and p in _INT_CHART_PARAMS:
+            value = request.args.get(p, type=int)
+            if value is None:
+                raise ValueError(f"{p} must be a year")
+        args[p] = value
+    args["scheme"] = args.get("scheme") or "pmay"
+    return args
+
+
+def _chart_key(name: str, args: dict, fmt: str) -> str:
+    return cache_key(f"chart:{name}:{fmt}", {**args, "version": data_version(args["scheme"])})
+
+
+def _build_chart(name: str, args: dict, fmt: str) -> str:
+    import plotly.io as pio
+    fn, _ = CHART_BUILDERS[name]
+    fig = fn(**args)
+    if isinstance(fig, str):
+        return fig if fmt == "html" else json.dumps({"message": fig})
+    return pio.to_html(fig, full_html=False) if fmt == "html" else pio.to_json(fig)
+
+
+def render_chart(name: str) -> str:
+    """Chart fragment for a page: cached inline HTML, or a loader for ``/chart/<name>.json``."""
     try:
-        df = query_df(sql)
+        args = _chart_args(name)
+    except ValueError as e:
+        return f"<p>{e}.</p>"
+    if settings.CHART_EMBED_MODE == "json":
+        from plotly.offline import get_plotlyjs_version
+        src = url_for(".chart_json", name=name, **{k: v for k, v in args.items() if v})
+        return render_template("_chart_loader.html", name=name, src=src, plotlyjs_version=get_plotlyjs_version())
+    try:
+        return get_chart_cache().get_or_compute(_chart_key(name, args, "html"), lambda: _build_chart(name, args, "html"))
     except Exception as e:
-        return render_template("scheme.html", scheme=scheme, chart_html=f"<p>Error: {e}</p>")
-    
+        logger.exception("Failed to render chart %s: %s", name, e)
+        return f"<p>Error: {e}</p>"
+
+
+@bp.route("/chart/<name>.json")
+def chart_json(name: str):
+    """Figure JSON with an ETag derived from the data version, so unchanged charts revalidate as 304."""
+    if name not in CHART_BUILDERS:
+        return jsonify({"error": "Unknown chart"}), 404
+    try:
+        args = _chart_args(name)
+    except ValueError as e:
+        # ``message`` is what _chart_loader.html shows in place of the figure
+        return jsonify({"error": str(e), "message": f"<p>{e}.</p>"}), 400
+    etag = _chart_key(name, args, "json")
+    if request.if_none_match.contains(etag):
+        resp = current_app.response_class(status=304)
+    else:
+        try:
+            body = get_chart_cache().get_or_compute(etag, lambda: _build_chart(name, args, "json"))
+        except Exception as e:
+            logger.exception("Failed to build chart %s: %s", name, e)
+            return jsonify({"error": str(e), "message": f"<p>Error: {e}</p>"}), 500
+        resp = current_app.response_class(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.cache_control.public = True
+    resp.cache_control.no_cache = True
+    return resp
+
+
+@chart("scheme", params=("scheme", "year"))
+def scheme_chart(scheme, year):
+    import plotly.express as px
+    if scheme not in SCHEMES:
+        return "<p>Unknown scheme.</p>"
+
+    df = store_frame(scheme, ["state_name"], ["score"], year=year)
+    if df is None:
+        # Read pre-aggregated scores from the scheme rollups
+        df = query_df(prepared("scores_by_state", scheme, bool(year)), {"year": year} if year else None)
     if df.empty:
-        return render_template("scheme.html", scheme=scheme, chart_html="<p>No data available. Run ETL first.</p>")
-    
-    fig = px.bar(df, x="state_name", y="score", title=f"{scheme} by state")
-    chart_html = pio.to_html(fig, full_html=False)
-    return render_template("scheme.html", scheme=scheme, chart_html=chart_html)
+        return "<p>No data available. Run ETL first.</p>"
+    return px.bar(df, x="state_name", y="score", title=f"{scheme} by state")
 
 
-@app.route("/state_comparison")
-def state_comparison():
+@bp.route("/scheme")
+def scheme_page():
     scheme = request.args.get("scheme", "pmay")
-    year = request.args.get("year", None)
-    year_filter = f"AND year={int(year)}" if year else ""
-    
-    # Use scheme-specific columns
-    column_map = {
-        "pmay": "COALESCE(beneficiaries,0)+COALESCE(houses_completed,0)",
-        "mnrega": "COALESCE(person_days_generated,0)+COALESCE(job_cards,0)",
-        "startup_india": "COALESCE(startups_supported,0)",
-        "saubhagya": "COALESCE(households_electrified,0)"
-    }
-    
-    score_col = column_map.get(scheme, "1")
-    sql = f"SELECT state_code, state_name, SUM({score_col}) as score FROM {scheme} WHERE 1=1 {year_filter} GROUP BY state_code, state_name"
-    df = query_df(sql)
-    # Attempt choropleth if geojson available
-    geojson_path = app.static_folder + "/data/india_states.geojson"
-    geojson = None
-    try:
-        import json
-        with open(geojson_path, "r", encoding="utf-8") as fh:
-            geojson = json.load(fh)
-    except Exception:
-        geojson = None
+    return render_template("scheme.html", scheme=scheme, chart_html=render_chart("scheme"))
+
+
+@chart("state_comparison", params=("scheme", "year"))
+def state_comparison_chart(scheme, year):
+    import plotly.express as px
+    if scheme not in SCHEMES:
+        return "<p>Unknown scheme.</p>"
+
+    df = store_frame(scheme, ["state_code"], ["score"], year=year)
+    if df is None:
+        df = query_df(prepared("state_scores", scheme, bool(year)), {"year": year} if year else None)
+    if not get_state_geometry().available() or df.empty:
+        return "<p>GeoJSON not found or no data available.</p>"
+    # Geometry is fetched by the browser from the cached asset route, not inlined
+    geojson_url = url_for(".state_geojson", codes=",".join(sorted(df["state_code"].dropna().unique())))
+    if hasattr(px, "choropleth_map"):
+        return px.choropleth_map(df, geojson=geojson_url, locations="state_code", color="score", featureidkey="properties.state_code",
+                                 map_style="carto-positron", center={"lat": 22.0, "lon": 79.0}, zoom=3)
+    return px.choropleth_mapbox(df, geojson=geojson_url, locations="state_code", color="score", featureidkey="properties.state_code",
+                                mapbox_style="carto-positron", center={"lat": 22.0, "lon": 79.0}, zoom=3)
 
-    if geojson is not None and not df.empty:
-        fig = px.choropleth_mapbox(df, geojson=geojson, locations="state_code", color="score", featureidkey="properties.state_code",
-                                   mapbox_style="carto-positron", center={"lat": 22.0, "lon": 79.0}, zoom=3)
-        chart_html = pio.to_html(fig, full_html=False)
+
+@bp.route("/state_comparison")
+def state_comparison():
+    return render_template("state_comparison.html", chart_html=render_chart("state_comparison"))
+
+
+@bp.route("/geo/states.geojson")
+def state_geojson():
+    """Simplified state geometry, optionally limited to ``codes``; cacheable and ETag-validated."""
+    codes = request.args.get("codes")
+    tolerance = request.args.get("tolerance", type=float)
+    body, etag = get_state_geometry().collection(codes.split(",") if codes else None, tolerance)
+    if request.if_none_match.contains(etag):
+        resp = current_app.response_class(status=304)
     else:
-        chart_html = "<p>GeoJSON not found or no data available.</p>"
-    return render_template("state_comparison.html", chart_html=chart_html)
+        resp = current_app.response_class(body, mimetype="application/geo+json")
+    resp.set_etag(etag)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = 3600
+    return resp
 
 
-@app.route("/trends")
-def trends():
-    scheme = request.args.get("scheme", "pmay")
-    state = request.args.get("state", None)
-    
-    # Use scheme-specific columns
-    column_map = {
-        "pmay": "COALESCE(beneficiaries,0)+COALESCE(houses_completed,0)",
-        "mnrega": "COALESCE(person_days_generated,0)+COALESCE(job_cards,0)",
-        "startup_india": "COALESCE(startups_supported,0)",
-        "saubhagya": "COALESCE(households_electrified,0)"
-    }
-    
-    score_col = column_map.get(scheme, "1")
-    sql = f"SELECT year, SUM({score_col}) as val FROM {scheme}"
-    if state:
-        sql += f" WHERE state_name='{state}'"
-    sql += " GROUP BY year ORDER BY year"
-    df = query_df(sql)
-    if df.empty:
-        chart_html = "<p>No data available</p>"
+@chart("trends", params=("scheme", "state", "year_from", "year_to"))
+def trends_chart(scheme, state, year_from=None, year_to=None):
+    import plotly.express as px
+    if scheme not in SCHEMES:
+        return "<p>Unknown scheme.</p>"
+
+    bounded = bool(year_from or year_to)
+    low, high = year_from or YEAR_MIN, year_to or YEAR_MAX
+    df = store_frame(scheme, ["year"], ["score"], state_name=state or None)
+    if df is not None:
+        df = df.rename(columns={"score": "val"})
+        if bounded:
+            df = df[df["year"].between(low, high)]
     else:
-        fig = px.line(df, x="year", y="val", title=f"{scheme} trend")
-        chart_html = pio.to_html(fig, full_html=False)
-    return render_template("trends.html", chart_html=chart_html)
+        params = {"state": state} if state else {}
+        if bounded:
+            params.update(year_from=low, year_to=high)
+        df = query_df(prepared("trend", scheme, bool(state), bounded), params or None)
+    if df.empty:
+        return "<p>No data available</p>"
+    return px.line(df, x="year", y="val", title=f"{scheme} trend")
+
+
+@bp.route("/trends")
+def trends():
+    return render_template("trends.html", chart_html=render_chart("trends"))
+
+
+@bp.route("/api/districts/<scheme>")
+def api_districts(scheme: str):
+    """Per-district metrics and score for ``year`` from the district/month facts.
+
+    Query args: ``year`` (required), ``state`` (state name) and ``month``.
+    On partitioned PostgreSQL tables only the year's partition is scanned.
+    """
+    if scheme not in SCHEMES or scheme not in DISTRICT_SCHEMES:
+        return jsonify({"error": "No district data for this scheme"}), 404
+    year = request.args.get("year", type=int)
+    if year is None:
+        return jsonify({"error": "year is required"}), 400
+    import pandas as pd
+    state = request.args.get("state")
+    month = request.args.get("month", type=int)
+    if month is not None and not 1 <= month <= 12:
+        return jsonify({"error": "month must be 1-12"}), 400
+    params = {"year": year, **({"state": state} if state else {}), **({"month": month} if month is not None else {})}
+    try:
+        df = query_df(prepared("district_scores", scheme, bool(state), month is not None), params)
+    except Exception:
+        logger.exception("District query failed for %s", scheme)
+        df = pd.DataFrame()
+    return jsonify({"scheme": scheme, "year": year, "state": state, "month": month,
+                    "districts": df.to_dict(orient="records")})
 
 
-@app.route("/export/<scheme>")
+@bp.route("/export/<scheme>")
 def export_csv(scheme: str):
-    sql = f"SELECT * FROM {scheme}"
-    df = query_df(sql)
-    buf = io.StringIO()
-    df.to_csv(buf, index=False)
-    buf.seek(0)
-    return send_file(io.BytesIO(buf.getvalue().encode("utf-8")), mimetype="text/csv", as_attachment=True, download_name=f"{scheme}_cleaned.csv")
+    """Stream a scheme table as CSV (default), Parquet or Arrow IPC.
 
+    Query args: ``format``, ``gzip=1``, ``columns=a,b``, ``year`` and ``state``.
+    """
+    if scheme not in SCHEMES:
+        return jsonify({"error": "Unknown scheme"}), 404
+    table = SCHEMES[scheme].table
+    fmt = request.args.get("format", "csv")
+    if fmt not in FORMATS:
+        return jsonify({"error": f"Unsupported format {fmt}"}), 400
+    columns = request.args.get("columns")
+    columns = columns.split(",") if columns else None
+    if columns and any(c not in table.c for c in columns):
+        return jsonify({"error": "Unknown column"}), 400
+    if fmt != "csv" and importlib.util.find_spec("pyarrow") is None:
+        return jsonify({"error": f"{fmt} export requires pyarrow"}), 400
+    gzip = request.args.get("gzip") in ("1", "true")
 
-@app.route("/api/kpi/<scheme>")
+    mimetype, ext = FORMATS[fmt]
+    download_name = f"{scheme}_cleaned.{ext}"
+    if gzip:
+        mimetype, download_name = "application/gzip", download_name + ".gz"
+    body = stream_export(table, fmt, columns, request.args.get("year", type=int), request.args.get("state"), gzip)
+    resp = current_app.response_class(body, mimetype=mimetype)
+    resp.headers["Content-Disposition"] = f"attachment; filename={download_name}"
+    return resp
+
+
+def _kpi_panel(scheme: str, metric: str, window: int):
+    """State x year panel of ``metric`` with every panel KPI attached."""
+    from . import kpis
+    from .etl.transform import population_table
+    panel = store_frame(scheme, ["state_code", "year"], [metric])
+    if panel is None:
+        panel = query_df(prepared("kpi_panel", scheme, metric)).copy()
+    else:
+        panel = panel.rename(columns={metric: "value"})
+    panel["yoy_growth"] = kpis.yoy_growth(panel, "value")
+    panel["rolling_mean"] = kpis.rolling_mean(panel, "value", window)
+    panel["cagr"] = kpis.panel_cagr(panel, "value")
+    population = population_table()
+    panel["per_capita"] = kpis.per_capita_series(panel["value"], panel["state_code"].map(population)) \
+        if len(population) else None
+    panel["rank"] = kpis.rank_within(panel, "value")
+    panel["percentile"] = kpis.percentile_within(panel, "value")
+    return panel
+
+
+@bp.route("/api/kpi/<scheme>")
 def api_kpi(scheme: str):
-    # Example simple KPI: total sum of numeric columns
-    sql = f"SELECT SUM(COALESCE(beneficiaries,0)) as beneficiaries, SUM(COALESCE(houses_completed,0)) as houses_completed FROM {scheme}"
+    """National totals of every numeric column, from the rollup.
+
+    Ratio columns (``percent_coverage``) have no meaningful national total and
+    are left out. With ``?metric=<column>`` (any metric column, ``score`` or ``row_count``)
+    returns per-state KPIs for that metric instead: YoY growth, CAGR over all
+    years, a ``window``-year rolling mean, per-capita value and rank/percentile
+    within ``year`` (default: latest year).
+    """
+    if scheme not in SCHEMES:
+        return jsonify({"error": "Unknown scheme"}), 404
+    metric = request.args.get("metric")
+    if not metric:
+        try:
+            df = store_frame(scheme, [], SCHEMES[scheme].metrics)
+            if df is None:
+                df = query_df(prepared("national_totals", scheme, SCHEMES[scheme].metrics))
+            data = df.to_dict(orient="records")[0] if not df.empty else {}
+        except Exception:
+            data = {}
+        return jsonify(data)
+
+    import pandas as pd
+    if metric not in SCHEMES[scheme].metrics + SCHEMES[scheme].ratios + ("score", "row_count"):
+        return jsonify({"error": f"Unknown metric for {scheme}: {metric}"}), 400
+    window = request.args.get("window", default=3, type=int)
+    if not window or window < 1:
+        return jsonify({"error": "window must be a positive integer"}), 400
     try:
-        df = query_df(sql)
-        data = df.to_dict(orient="records")[0]
+        panel = _kpi_panel(scheme, metric, window)
     except Exception:
-        data = {}
-    return jsonify(data)
+        logger.exception("KPI query failed for %s.%s", scheme, metric)
+        panel = pd.DataFrame()
+    if panel.empty:
+        return jsonify({"scheme": scheme, "metric": metric, "year": None, "states": []})
+    year = request.args.get("year", type=int) or int(panel["year"].max())
+    rows = panel[panel["year"] == year].sort_values("rank", na_position="last")
+    rows = rows.astype(object).where(rows.notna(), None)
+    return jsonify({"scheme": scheme, "metric": metric, "year": year, "window": window,
+                    "states": rows.to_dict(orient="records")})
+
+
+@bp.route("/api/cache_stats")
+def api_cache_stats():
+    from .store import get_analytics_store
+    from .cleaned import get_cleaned_store
+    return jsonify({"queries": get_query_cache().stats(), "charts": get_chart_cache().stats(),
+                    "store": get_analytics_store().stats(), "cleaned": get_cleaned_store().stats()})
+
+
+@bp.route("/api/db_stats")
+def api_db_stats():
+    return jsonify({name: stats.snapshot() for name, stats in pool_stats.items()})
+
 
+@bp.route("/metrics")
+def prometheus_metrics():
+    """ETL stage metrics, request latency and the last persisted ETL run per scheme."""
+    return current_app.response_class(exposition(), mimetype=CONTENT_TYPE_LATEST)
 
-@app.route("/admin")
+
+@bp.route("/admin")
 def admin_page():
     return render_template("admin.html")
 
 
-@app.route("/trigger_etl", methods=["POST"])
+@bp.route("/trigger_etl", methods=["POST"])
 def trigger_etl():
     """Trigger ETL for a scheme - requires secret token"""
     secret = request.form.get("secret") or request.headers.get("X-ETL-Secret")
@@ -174,22 +500,33 @@ def trigger_etl():
     if not scheme or not resource_id:
         return jsonify({"error": "Missing scheme or resource_id"}), 400
     
+    if scheme not in SCHEMES:
+        return jsonify({"error": "Unknown scheme"}), 400
+
     try:
-        from .prefect_flows import etl_for_scheme
-        import threading
-        
-        def run_etl():
-            try:
-                logger.info(f"Starting ETL for {scheme} with resource {resource_id}")
-                result = etl_for_scheme(scheme, resource_id)
-                logger.info(f"ETL completed: {result}")
-            except Exception as e:
-                logger.error(f"ETL failed: {e}", exc_info=True)
-        
-        thread = threading.Thread(target=run_etl, daemon=True)
-        thread.start()
-        
-        return jsonify({"status": "ETL triggered", "scheme": scheme})
+        job_id, coalesced = get_scheduler().submit(scheme, resource_id)
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 429
     except Exception as e:
         logger.error(f"Failed to trigger ETL: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
+    return jsonify({
+        "status": "ETL already queued" if coalesced else "ETL triggered",
+        "scheme": scheme,
+        "job_id": job_id,
+        "job_url": url_for(".job_status", job_id=job_id),
+    }), 202
+
+
+@bp.route("/jobs")
+def jobs_list():
+    limit = min(request.args.get("limit", 50, type=int), 500)
+    return jsonify(list_jobs(limit, request.args.get("status")))
+
+
+@bp.route("/jobs/<int:job_id>")
+def job_status(job_id: int):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
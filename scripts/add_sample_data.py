@@ -1,5 +1,8 @@
 """Script to populate database with sample data for testing"""
+from gov_analytics.cleaned import write_snapshot
+from gov_analytics.config import settings
 from gov_analytics.db import SessionLocal
+from gov_analytics.etl.load import upsert_records
 from gov_analytics import models
 import random
 
@@ -17,60 +20,46 @@ states = [
 
 years = [2020, 2021, 2022, 2023, 2024]
 
-db = SessionLocal()
-
-print("Adding sample PMAY data...")
-for state_code, state_name in states:
-    for year in years:
-        record = models.PMAY(
-            state_code=state_code,
-            state_name=state_name,
-            year=year,
-            beneficiaries=random.randint(10000, 100000),
-            houses_completed=random.randint(5000, 80000),
-            funds_released=random.uniform(100, 1000)
-        )
-        db.add(record)
 
-print("Adding sample MNREGA data...")
-for state_code, state_name in states:
-    for year in years:
-        record = models.MNREGA(
-            state_code=state_code,
-            state_name=state_name,
-            year=year,
-            person_days_generated=random.randint(100000, 1000000),
-            job_cards=random.randint(50000, 500000),
-            funds_spent=random.uniform(500, 5000)
-        )
-        db.add(record)
+def sample_rows(make):
+    return [{"state_code": code, "state_name": name, "year": year, **make()}
+            for code, name in states for year in years]
 
-print("Adding sample Startup India data...")
-for state_code, state_name in states:
-    for year in years:
-        record = models.StartupIndia(
-            state_code=state_code,
-            state_name=state_name,
-            year=year,
-            startups_supported=random.randint(100, 5000),
-            funds_allocated=random.uniform(50, 500)
-        )
-        db.add(record)
 
-print("Adding sample Saubhagya data...")
-for state_code, state_name in states:
-    for year in years:
-        record = models.Saubhagya(
-            state_code=state_code,
-            state_name=state_name,
-            year=year,
-            households_electrified=random.randint(10000, 200000),
-            percent_coverage=random.uniform(70, 99)
-        )
-        db.add(record)
+# upsert_records keys on (state_code, year), so re-running replaces the sample
+# rows instead of duplicating them; like an ETL run it updates the rollups,
+# bumps the data version and invalidates the caches and analytics store
+samples = {
+    models.PMAY: lambda: {
+        "beneficiaries": random.randint(10000, 100000),
+        "houses_completed": random.randint(5000, 80000),
+        "funds_released": random.uniform(100, 1000),
+    },
+    models.MNREGA: lambda: {
+        "person_days_generated": random.randint(100000, 1000000),
+        "job_cards": random.randint(50000, 500000),
+        "funds_spent": random.uniform(500, 5000),
+    },
+    models.StartupIndia: lambda: {
+        "startups_supported": random.randint(100, 5000),
+        "funds_allocated": random.uniform(50, 500),
+    },
+    models.Saubhagya: lambda: {
+        "households_electrified": random.randint(10000, 200000),
+        "percent_coverage": random.uniform(70, 99),
+    },
+}
 
-db.commit()
-db.close()
+db = SessionLocal()
+try:
+    for model, make in samples.items():
+        print(f"Adding sample {model.__tablename__} data...")
+        counts = upsert_records(db, model, sample_rows(make))
+        print(f"  {counts['inserted']} inserted, {counts['updated']} updated")
+        if settings.PARQUET_SNAPSHOTS_ENABLED:
+            write_snapshot(model.__tablename__)
+finally:
+    db.close()
 
 print("\n✅ Sample data added successfully!")
 print("Now visit http://localhost:5000 to see the dashboard with data")
@@ -0,0 +1,62 @@
+"""Micro-benchmark: per-request f-string SQL vs the prepared statements in gov_analytics.queries.
+
+Runs each dashboard query both ways against DATABASE_URL (populate it with
+scripts/add_sample_data.py first) and prints the mean time per request for
+building the statement object alone and for a full execute + fetch (which
+includes SQLAlchemy compilation, served from its compiled cache when the
+statement is reused). The query cache is bypassed so every request reaches
+the database.
+
+    python -m scripts.bench_queries --iterations 2000
+"""
+from gov_analytics.db import get_read_engine
+from gov_analytics.queries import prepared
+from sqlalchemy import text
+import argparse
+import time
+
+# (label, f-string SQL as the routes used to build it, prepared query args, params)
+CASES = [
+    ("scores_by_state",
+     lambda s: f"SELECT state_name, SUM(score) as score FROM {s}_by_state_year WHERE year = :year GROUP BY state_name",
+     lambda s: prepared("scores_by_state", s, True), {"year": 2022}),
+    ("state_scores",
+     lambda s: f"SELECT state_code, state_name, score FROM {s}_by_state",
+     lambda s: prepared("state_scores", s, False), {}),
+    ("trend",
+     lambda s: f"SELECT year, SUM(score) as val FROM {s}_by_state_year WHERE state_name = :state GROUP BY year ORDER BY year",
+     lambda s: prepared("trend", s, True), {"state": "Delhi"}),
+]
+SCHEMES = ["pmay", "mnrega", "startup_india", "saubhagya"]
+
+
+def _time(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for i in range(iterations):
+        fn(SCHEMES[i % len(SCHEMES)])
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'query':<18}{'phase':<10}{'f-string us':>14}{'prepared us':>14}{'saving':>9}")
+    with get_read_engine().connect() as conn:
+        for label, build_sql, build_prepared, params in CASES:
+            # warm both paths so one-time compilation is not counted
+            for s in SCHEMES:
+                conn.execute(text(build_sql(s)), params).fetchall()
+                conn.execute(build_prepared(s).statement, params).fetchall()
+
+            build_old = _time(lambda s: text(build_sql(s)), args.iterations)
+            build_new = _time(lambda s: build_prepared(s).statement, args.iterations)
+            run_old = _time(lambda s: conn.execute(text(build_sql(s)), params).fetchall(), args.iterations)
+            run_new = _time(lambda s: conn.execute(build_prepared(s).statement, params).fetchall(), args.iterations)
+            for phase, old, new in (("build", build_old, build_new), ("execute", run_old, run_new)):
+                print(f"{label:<18}{phase:<10}{old:>14.1f}{new:>14.1f}{(1 - new / old) * 100:>8.0f}%")
+
+
+if __name__ == "__main__":
+    main()
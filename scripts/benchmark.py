@@ -0,0 +1,296 @@
+"""Benchmark the ETL stages, dashboard routes and export on synthetic data.
+
+Generates ``states x districts x years`` rows per scheme (see
+scripts/synthetic.py) and times, in chunks of ``--chunk-size`` rows:
+
+* ``validate``   validate_frame
+* ``transform``  apply_transform on the validated chunks
+* ``load``       upsert_records into empty tables (inserts)
+* ``unchanged``  validate -> transform -> load per chunk, as stream_etl does,
+  of the same rows again: row hashes match, so nothing is written
+* ``end_to_end`` the same pipeline over the same keys with every metric
+  changed (updates)
+* ``export``     stream_export of each table as CSV, and Parquet with pyarrow
+* routes         dashboard pages and APIs through the Flask test client
+
+and writes JSON with rows/sec, p50/p95 latency (per chunk for stages, per
+request for routes) and the process's peak RSS after each step. The database
+is a fresh temporary SQLite file unless ``--url`` is given; it is set before
+gov_analytics is imported, so ``.env`` never points the benchmark at real data.
+
+With ``--baseline`` the run is compared to an earlier result and the script
+exits non-zero when throughput drops, or p95 latency rises, by more than
+``--tolerance``.
+
+    python -m scripts.benchmark --districts 1000 --years 50 --output bench.json
+    python -m scripts.benchmark --baseline bench.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROUTES = [
+    "/",
+    "/api/overview",
+    "/scheme?scheme={scheme}&year={year}",
+    "/state_comparison?scheme={scheme}&year={year}",
+    "/trends?scheme={scheme}&state={state}",
+    "/chart/scheme.json?scheme={scheme}&year={year}",
+    "/api/kpi/{scheme}",
+    "/api/kpi/{scheme}?metric={metric}&year={year}",
+]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(latencies, rows: int = 0) -> dict:
+    """rows/sec over the summed latencies plus p50/p95/max in milliseconds."""
+    ms = np.asarray(latencies) * 1000
+    total = float(np.sum(latencies))
+    out = {"count": len(ms), "seconds": round(total, 4)}
+    if rows:
+        out["rows"] = rows
+        out["rows_per_sec"] = round(rows / total, 1) if total else None
+    if len(ms):
+        out.update(p50_ms=round(float(np.percentile(ms, 50)), 3), p95_ms=round(float(np.percentile(ms, 95)), 3),
+                   max_ms=round(float(ms.max()), 3))
+    out["peak_rss_mb"] = peak_rss_mb()
+    return out
+
+
+def _chunks(df, size: int):
+    for start in range(0, len(df), size):
+        yield df.iloc[start:start + size]
+
+
+def _timed(items, fn):
+    """Apply ``fn`` to each item; return (results, per-item seconds)."""
+    results, latencies = [], []
+    for item in items:
+        started = time.perf_counter()
+        results.append(fn(item))
+        latencies.append(time.perf_counter() - started)
+    return results, latencies
+
+
+def _changed(df, model):
+    """``df`` with every metric value changed, so reloading it updates each row (NULLs stay NULL)."""
+    from sqlalchemy import Integer
+    from scripts.synthetic import KEY_COLUMNS
+
+    out = df.copy()
+    for column in model.__table__.columns:
+        if column.name not in out or column.name in KEY_COLUMNS:
+            continue
+        # ints + 1; floats scaled down so percent_* columns stay within 0-100
+        out[column.name] = out[column.name] + 1 if isinstance(column.type, Integer) else out[column.name] * 0.99
+    return out
+
+
+def bench_scheme(scheme: str, args) -> dict:
+    from gov_analytics.db import SessionLocal
+    from gov_analytics.etl.load import upsert_records
+    from gov_analytics.etl.transform import apply_transform
+    from gov_analytics.models import SCHEME_MODELS
+    from gov_analytics.schemas import SCHEMAS
+    from gov_analytics.validation import validate_frame
+    from scripts.synthetic import synthetic_frame
+
+    schema, model = SCHEMAS[scheme], SCHEME_MODELS[scheme]
+    started = time.perf_counter()
+    df = synthetic_frame(scheme, args.states, args.districts, args.years, null_rate=args.null_rate,
+                         invalid_rate=args.invalid_rate, seed=args.seed)
+    stages = {"generate": summarize([time.perf_counter() - started], len(df))}
+
+    validated, latencies = _timed(_chunks(df, args.chunk_size), lambda c: validate_frame(schema, c))
+    stages["validate"] = summarize(latencies, len(df))
+    stages["validate"]["rejected_rows"] = int(sum(r["row"].nunique() for _, r in validated))
+
+    transformed, latencies = _timed((v for v, _ in validated), lambda v: apply_transform(scheme, v))
+    stages["transform"] = summarize(latencies, sum(len(t) for t in transformed))
+    del validated
+
+    db = SessionLocal()
+    try:
+        counts, latencies = _timed((t.to_dict(orient="records") for t in transformed),
+                                   lambda rows: upsert_records(db, model, rows))
+        stages["load"] = summarize(latencies, sum(len(t) for t in transformed))
+        stages["load"]["inserted"] = sum(c["inserted"] for c in counts)
+        del transformed
+
+        def pipeline(chunk):
+            valid, _ = validate_frame(schema, chunk)
+            return upsert_records(db, model, apply_transform(scheme, valid).to_dict(orient="records"))
+
+        counts, latencies = _timed(_chunks(df, args.chunk_size), pipeline)
+        stages["unchanged"] = summarize(latencies, len(df))
+        stages["unchanged"]["unchanged"] = sum(c["unchanged"] for c in counts)
+
+        counts, latencies = _timed(_chunks(_changed(df, model), args.chunk_size), pipeline)
+        stages["end_to_end"] = summarize(latencies, len(df))
+        stages["end_to_end"]["updated"] = sum(c["updated"] for c in counts)
+    finally:
+        db.close()
+    return stages
+
+
+def bench_export(scheme: str, formats) -> dict:
+    from gov_analytics.export import stream_export
+    from gov_analytics.models import SCHEME_MODELS
+
+    table = SCHEME_MODELS[scheme].__table__
+    out = {}
+    for fmt in formats:
+        started = time.perf_counter()
+        size = sum(len(chunk) for chunk in stream_export(table, fmt))
+        elapsed = time.perf_counter() - started
+        out[fmt] = {**summarize([elapsed], _table_rows(table)), "bytes": size}
+    return out
+
+
+def _table_rows(table) -> int:
+    from gov_analytics.db import connect
+    from sqlalchemy import func, select
+    with connect() as conn:
+        return conn.execute(select(func.count()).select_from(table)).scalar()
+
+
+def bench_routes(schemes, args) -> dict:
+    from gov_analytics.queries import SCHEMES
+    from gov_analytics.web import app
+
+    client = app.test_client()
+    out = {}
+    for scheme in schemes:
+        values = {"scheme": scheme, "year": 2000 + args.years - 1, "state": "State 0",
+                  "metric": SCHEMES[scheme].metrics[0]}
+        for template in ROUTES:
+            path = template.format(**values)
+            if path in out:
+                continue
+            latencies = []
+            for _ in range(args.requests + 1):
+                started = time.perf_counter()
+                resp = client.get(path)
+                resp.get_data()
+                latencies.append(time.perf_counter() - started)
+                if resp.status_code != 200:
+                    raise RuntimeError(f"GET {path} returned {resp.status_code}")
+            # the first request fills the query/chart caches; report it separately
+            out[path] = {"cold_ms": round(latencies[0] * 1000, 3), **summarize(latencies[1:])}
+    return out
+
+
+def compare(result: dict, baseline: dict, tolerance: float):
+    """Regressions beyond ``tolerance`` as human-readable strings."""
+    problems = []
+
+    def check(name, current, previous):
+        for key, worse in (("rows_per_sec", lambda c, p: c < p * (1 - tolerance)),
+                           ("p95_ms", lambda c, p: c > p * (1 + tolerance))):
+            c, p = current.get(key), previous.get(key)
+            if c is not None and p and worse(c, p):
+                problems.append(f"{name} {key}: {p} -> {c}")
+
+    for scheme, stages in result["stages"].items():
+        for stage, current in stages.items():
+            check(f"{scheme}/{stage}", current, baseline.get("stages", {}).get(scheme, {}).get(stage, {}))
+    for scheme, formats in result["export"].items():
+        for fmt, current in formats.items():
+            check(f"{scheme}/export.{fmt}", current, baseline.get("export", {}).get(scheme, {}).get(fmt, {}))
+    for path, current in result["routes"].items():
+        check(path, current, baseline.get("routes", {}).get(path, {}))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Database URL (default: a fresh temporary SQLite file)")
+    parser.add_argument("--schemes", default="pmay,mnrega,startup_india,saubhagya")
+    parser.add_argument("--states", type=int, default=36)
+    parser.add_argument("--districts", type=int, default=20, help="Districts per state (1 = state level)")
+    parser.add_argument("--years", type=int, default=25)
+    parser.add_argument("--null-rate", type=float, default=0.02)
+    parser.add_argument("--invalid-rate", type=float, default=0.001)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, help="Rows per chunk (default: ETL_CHUNK_SIZE)")
+    parser.add_argument("--requests", type=int, default=20, help="Timed requests per route after the cold one")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the query and chart caches")
+    parser.add_argument("--skip", default="", help="Comma-separated parts to skip: etl, export, routes")
+    parser.add_argument("--output", help="Write the JSON result here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier JSON result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.url or f"sqlite:///{tempfile.mkdtemp()}/benchmark.db"
+    os.environ.pop("DATABASE_READ_URL", None)
+    if args.no_cache:
+        os.environ["QUERY_CACHE_ENABLED"] = "false"
+
+    from gov_analytics.config import settings
+    from gov_analytics.db import get_engine
+    from gov_analytics.prefect_flows import init_db
+
+    init_db.fn()
+    args.chunk_size = args.chunk_size or settings.ETL_CHUNK_SIZE
+    schemes = [s for s in args.schemes.split(",") if s]
+    skip = set(args.skip.split(","))
+    formats = ["csv"]
+    try:
+        import pyarrow  # noqa: F401
+        formats.append("parquet")
+    except ImportError:
+        pass
+
+    result = {
+        "meta": {
+            "python": platform.python_version(), "platform": platform.platform(), "dialect": get_engine().dialect.name,
+            "schemes": schemes, "rows_per_scheme": args.states * max(args.districts, 1) * args.years,
+            "states": args.states, "districts": args.districts, "years": args.years,
+            "chunk_size": args.chunk_size, "query_cache": not args.no_cache,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "stages": {}, "export": {}, "routes": {},
+    }
+    started = time.perf_counter()
+    if "etl" not in skip:
+        for scheme in schemes:
+            result["stages"][scheme] = bench_scheme(scheme, args)
+    if "export" not in skip:
+        for scheme in schemes:
+            result["export"][scheme] = bench_export(scheme, formats)
+    if "routes" not in skip:
+        result["routes"] = bench_routes(schemes, args)
+    result["meta"]["seconds"] = round(time.perf_counter() - started, 2)
+    result["meta"]["peak_rss_mb"] = peak_rss_mb()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(result, json.load(f), args.tolerance)
+        result["regressions"] = problems
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline and result["regressions"]:
+        print("Regressions beyond {:.0%}:\n  ".format(args.tolerance) + "\n  ".join(result["regressions"]),
+              file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
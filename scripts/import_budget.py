@@ -0,0 +1,119 @@
+"""Check the import time of the entry-point modules against a budget.
+
+Each module is imported ``--repeat`` times in a fresh interpreter under
+``python -X importtime`` and its cumulative import time (the median of the
+runs) is compared with its budget in ``BUDGETS``. A module must also not pull
+in anything listed under ``FORBIDDEN``: the dashboard imports pandas, plotly
+and the analytics store on first use, so a top-level import of one of them
+in ``web`` or a module it imports fails the check outright, whatever the
+machine's speed.
+
+The script exits non-zero on any failure. With ``--baseline`` (an earlier
+``--output``) it also fails when a module got slower by more than
+``--tolerance``. Run it without ``DATABASE_URL`` set: importing must not read
+the settings, let alone connect to a database.
+
+    python -m scripts.import_budget --output imports.json
+    python -m scripts.import_budget --baseline imports.json --tolerance 0.3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# module -> cumulative import time budget in milliseconds
+BUDGETS = {
+    "gov_analytics.config": 400,
+    "gov_analytics.db": 900,
+    "gov_analytics.web": 1500,
+    "gov_analytics.asgi": 1800,
+    "gov_analytics.prefect_flows": 5000,
+}
+
+_LAZY = ("pandas", "numpy", "plotly", "pyarrow", "prefect")
+
+# module -> top-level packages it must not import
+FORBIDDEN = {
+    "gov_analytics.config": _LAZY,
+    "gov_analytics.db": _LAZY,
+    "gov_analytics.web": _LAZY,
+    "gov_analytics.asgi": _LAZY,
+    "gov_analytics.prefect_flows": ("plotly", "flask"),
+}
+
+
+def import_times(module: str, env: dict) -> dict:
+    """``{imported module: cumulative microseconds}`` for one ``import module`` in a new interpreter."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def measure(module: str, repeat: int, env: dict) -> dict:
+    runs = [import_times(module, env) for _ in range(repeat)]
+    loaded = set().union(*runs)
+    return {
+        "ms": round(statistics.median(r[module] for r in runs) / 1000, 1),
+        "budget_ms": BUDGETS.get(module),
+        "forbidden": sorted({name.split(".")[0] for name in loaded} & set(FORBIDDEN.get(module, ()))),
+    }
+
+
+def check(result: dict, baseline: dict, tolerance: float):
+    """Budget, forbidden-import and (with a baseline) regression failures as human-readable strings."""
+    problems = []
+    for module, current in result["modules"].items():
+        if current["budget_ms"] is not None and current["ms"] > current["budget_ms"]:
+            problems.append(f"{module}: {current['ms']} ms > budget {current['budget_ms']} ms")
+        if current["forbidden"]:
+            problems.append(f"{module} imports {', '.join(current['forbidden'])}")
+        previous = (baseline or {}).get("modules", {}).get(module, {}).get("ms")
+        if previous and current["ms"] > previous * (1 + tolerance):
+            problems.append(f"{module}: {previous} -> {current['ms']} ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", default=",".join(BUDGETS), help="Comma-separated modules to check")
+    parser.add_argument("--repeat", type=int, default=5, help="Interpreters started per module")
+    parser.add_argument("--output", help="Write the JSON result here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier JSON result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+
+    result = {"python": sys.version.split()[0], "repeat": args.repeat,
+              "modules": {m: measure(m, args.repeat, env) for m in args.modules.split(",") if m}}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    result["failures"] = check(result, baseline, args.tolerance)
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if result["failures"]:
+        print("Import budget exceeded:\n  " + "\n  ".join(result["failures"]), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Compare index configurations for the scheme tables on the real query shapes.
+
+Builds a scratch copy of a scheme table (``advisor_<scheme>``), fills it with
+synthetic rows, and for each index configuration reports the plan the
+database chooses (``EXPLAIN QUERY PLAN`` on SQLite, ``EXPLAIN`` on PostgreSQL)
+and the median time of every dashboard/ETL query shape, plus the cost of
+inserting new rows. The scratch table is dropped afterwards; real tables are
+never touched.
+
+    python -m scripts.index_advisor --states 2000 --years 50
+    python -m scripts.index_advisor --url postgresql+psycopg2://... --scheme mnrega
+"""
+from gov_analytics.models import SCHEME_MODELS, SCORE_COLUMNS
+from sqlalchemy import Column, Index, MetaData, Table, UniqueConstraint, create_engine, insert, text
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+# "+metrics" makes an index covering: metric columns are INCLUDEd on PostgreSQL
+# and appended to the key elsewhere (the shipped models use INCLUDE on PostgreSQL only)
+CONFIGS = {
+    "unique_only": [],
+    "legacy": [("state_code",), ("state_name",), ("year",)],
+    "composite": [("year", "state_name"), ("state_name", "year")],
+    "covering": [("year", "state_name", "+metrics"), ("state_name", "year", "+metrics")],
+}
+
+# name -> (SQL with {t} for the table and {score} for the score expression, params factory)
+QUERIES = {
+    "by_state_for_year": (
+        "SELECT state_name, SUM({score}) AS score FROM {t} WHERE year = :year GROUP BY state_name",
+        lambda r, a: {"year": 2000 + r.randrange(a.years)},
+    ),
+    "trend_for_state": (
+        "SELECT year, SUM({score}) AS val FROM {t} WHERE state_name = :state GROUP BY year ORDER BY year",
+        lambda r, a: {"state": f"State {r.randrange(a.states)}"},
+    ),
+    "upsert_lookup": (
+        "SELECT * FROM {t} WHERE state_code = :code AND year = :year",
+        lambda r, a: {"code": f"S{r.randrange(a.states)}", "year": 2000 + r.randrange(a.years)},
+    ),
+    "export_state_year": (
+        "SELECT * FROM {t} WHERE year = :year AND state_name = :state",
+        lambda r, a: {"year": 2000 + r.randrange(a.years), "state": f"State {r.randrange(a.states)}"},
+    ),
+}
+
+
+def _scratch_table(scheme: str) -> Table:
+    source = SCHEME_MODELS[scheme].__table__
+    name = f"advisor_{scheme}"
+    cols = [Column(c.name, c.type, primary_key=c.primary_key) for c in source.columns if c.name != "created_at"]
+    return Table(name, MetaData(), *cols, UniqueConstraint("state_code", "year", name=f"uq_{name}"))
+
+
+def _rows(table: Table, states: range, years: range, rng: random.Random):
+    metrics = [c for c in table.columns if c.name not in ("id", "state_code", "state_name", "year")]
+    for s in states:
+        for y in years:
+            row = {"state_code": f"S{s}", "state_name": f"State {s}", "year": 2000 + y}
+            for c in metrics:
+                row[c.name] = None if rng.random() < 0.05 else rng.randint(0, 100000)
+            yield row
+
+
+def _insert(conn, table: Table, rows, batch: int = 5000):
+    buf = []
+    for row in rows:
+        buf.append(row)
+        if len(buf) >= batch:
+            conn.execute(insert(table), buf)
+            buf = []
+    if buf:
+        conn.execute(insert(table), buf)
+
+
+def _plan(conn, sql: str, params: dict) -> str:
+    if conn.dialect.name == "sqlite":
+        return "; ".join(r[-1] for r in conn.execute(text("EXPLAIN QUERY PLAN " + sql), params))
+    return " | ".join(r[0].strip() for r in conn.execute(text("EXPLAIN " + sql), params))
+
+
+def _median_ms(conn, sql: str, params_for, repeats: int, rng: random.Random, args) -> float:
+    times = []
+    for _ in range(repeats):
+        params = params_for(rng, args)
+        started = time.perf_counter()
+        conn.execute(text(sql), params).fetchall()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def _apply_config(conn, table: Table, name: str, metrics):
+    for existing in list(_config_index_names(table)):
+        conn.execute(text(f"DROP INDEX IF EXISTS {existing}"))
+    for i, cols in enumerate(CONFIGS[name]):
+        kwargs = {}
+        if cols[-1] == "+metrics":
+            cols = cols[:-1]
+            if conn.dialect.name == "postgresql":
+                kwargs["postgresql_include"] = metrics
+            else:
+                cols = cols + tuple(metrics)
+        Index(f"ix_{table.name}_{i}", *(table.c[c] for c in cols), **kwargs).create(conn)
+    conn.execute(text("ANALYZE" if conn.dialect.name == "sqlite" else f"ANALYZE {table.name}"))
+
+
+def _config_index_names(table: Table):
+    return [f"ix_{table.name}_{i}" for i in range(max(len(c) for c in CONFIGS.values()) + 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Database URL (default: a temporary SQLite file)")
+    parser.add_argument("--scheme", default="pmay", choices=sorted(SCHEME_MODELS))
+    parser.add_argument("--states", type=int, default=2000, help="Distinct synthetic states")
+    parser.add_argument("--years", type=int, default=50, help="Years per state (rows = states x years)")
+    parser.add_argument("--repeats", type=int, default=50, help="Timed runs per query")
+    parser.add_argument("--insert-rows", type=int, default=20000, help="New rows inserted to measure write cost")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{tempfile.mkdtemp()}/advisor.db"
+    engine = create_engine(url)
+    table = _scratch_table(args.scheme)
+    score = " + ".join(f"COALESCE({c}, 0)" for c in SCORE_COLUMNS[args.scheme])
+    metrics = [c.name for c in table.columns if c.name not in ("id", "state_code", "state_name", "year")]
+    rng = random.Random(42)
+
+    table.drop(engine, checkfirst=True)
+    table.create(engine)
+    try:
+        with engine.begin() as conn:
+            started = time.perf_counter()
+            _insert(conn, table, _rows(table, range(args.states), range(args.years), rng))
+            print(f"Loaded {args.states * args.years} rows into {table.name} on {engine.dialect.name} "
+                  f"in {time.perf_counter() - started:.1f}s\n")
+
+        for name in CONFIGS:
+            with engine.begin() as conn:
+                _apply_config(conn, table, name, metrics)
+            print(f"== {name}: {', '.join('(' + ', '.join(c) + ')' for c in CONFIGS[name]) or 'no secondary indexes'}"
+                  f" + unique (state_code, year)")
+            with engine.connect() as conn:
+                for qname, (sql, params_for) in QUERIES.items():
+                    sql = sql.format(t=table.name, score=score)
+                    ms = _median_ms(conn, sql, params_for, args.repeats, rng, args)
+                    print(f"  {qname:<20}{ms:>9.3f} ms  {_plan(conn, sql, params_for(rng, args))}")
+            with engine.begin() as conn:
+                new_states = range(args.states, args.states + max(1, args.insert_rows // args.years))
+                started = time.perf_counter()
+                _insert(conn, table, _rows(table, new_states, range(args.years), rng))
+                elapsed = time.perf_counter() - started
+                conn.execute(text(f"DELETE FROM {table.name} WHERE id > :n"), {"n": args.states * args.years})
+            inserted = len(new_states) * args.years
+            print(f"  {'insert':<20}{elapsed / inserted * 1e6:>9.1f} us/row ({inserted} rows)\n")
+    finally:
+        table.drop(engine, checkfirst=True)
+
+
+if __name__ == "__main__":
+    main()
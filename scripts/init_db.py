@@ -1,6 +1,5 @@
 """Setup script to initialize database tables"""
-from gov_analytics.db import engine, Base
-from gov_analytics import models
+from gov_analytics.db import get_engine, init_schema
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -11,7 +10,8 @@ def init_database():
     """Create all database tables"""
     try:
         logger.info("Creating database tables...")
-        Base.metadata.create_all(bind=engine)
+        engine = get_engine()
+        init_schema(engine)
         logger.info("Database tables created successfully!")
         
         # List created tables
@@ -0,0 +1,28 @@
+"""Write (or refresh) the Parquet snapshots in data/cleaned from the current database.
+
+ETL runs do this automatically; use it to create snapshots for data loaded
+before they existed, or after loading with scripts/add_sample_data.py.
+
+    python -m scripts.write_cleaned --force
+"""
+from gov_analytics.cleaned import cleaned_dir, write_snapshot
+from gov_analytics.models import SCHEME_MODELS
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scheme", choices=sorted(SCHEME_MODELS), help="Only this scheme (default: all)")
+    parser.add_argument("--force", action="store_true", help="Rewrite even if the data version is unchanged")
+    args = parser.parse_args()
+
+    for scheme in [args.scheme] if args.scheme else list(SCHEME_MODELS):
+        entry = write_snapshot(scheme, force=args.force)
+        if entry is None:
+            raise SystemExit("pyarrow is required to write Parquet snapshots")
+        print(f"{scheme}: v{entry['version']}, {entry['rows']} rows in {len(entry['partitions'])} files")
+    print(f"Manifest: {cleaned_dir() / 'manifest.json'}")
+
+
+if __name__ == "__main__":
+    main()
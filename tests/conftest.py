@@ -0,0 +1,111 @@
+import os
+import tempfile
+
+# the package reads its settings on first use; point it at a throwaway database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+
+import pytest
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "backlog(*request_ids): backlog requests whose behaviour the test verifies")
+
+
+@pytest.fixture(scope="session")
+def schema():
+    from gov_analytics.db import init_schema
+    init_schema()
+
+
+@pytest.fixture
+def db(schema):
+    """A session on the test database; every table is emptied afterwards."""
+    from gov_analytics.cache import get_chart_cache, get_query_cache
+    from gov_analytics.db import Base, SessionLocal, get_engine
+    session = SessionLocal()
+    yield session
+    session.close()
+    with get_engine().begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    # data versions restart with the emptied tables, so cached results would look current
+    get_query_cache().invalidate()
+    get_chart_cache().invalidate()
+
+
+def pmay_records(n_states=6, years=(2019, 2020, 2021), seed=0, null_every=7):
+    """State x year PMAY records with a NULL metric every ``null_every`` rows."""
+    import random
+    rnd = random.Random(seed)
+    records = []
+    for i in range(n_states):
+        for year in years:
+            k = len(records)
+            records.append({"state_code": f"S{i:02d}", "state_name": f"State {i}", "year": year,
+                            "beneficiaries": None if k % null_every == 0 else rnd.randint(0, 1000),
+                            "houses_completed": rnd.randint(0, 500),
+                            "funds_released": round(rnd.uniform(0, 100), 2)})
+    return records
+
+
+class DataGovStub:
+    """A local stand-in for the data.gov.in resource API, paged by ``offset``/``limit``.
+
+    Serves ``rows`` records, reporting ``total`` unless ``report_total`` is off
+    and returning at most ``max_page`` per page. ``failures`` maps an offset to
+    the HTTP statuses its next requests get before it succeeds. Every request
+    is recorded in ``requests`` as ``(offset, limit)``.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.report_total = True
+        self.max_page = None
+        self.failures = {}
+        self.requests = []
+        self.url = None
+
+    def payload(self, offset, limit):
+        if self.max_page is not None:
+            limit = min(limit, self.max_page)
+        body = {"records": self.rows[offset:offset + limit]}
+        if self.report_total:
+            body["total"] = len(self.rows)
+        return body
+
+
+@pytest.fixture
+def datagov():
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    stub = DataGovStub()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            offset, limit = int(query["offset"][0]), int(query["limit"][0])
+            with lock:
+                stub.requests.append((offset, limit))
+                pending = stub.failures.get(offset)
+                status = pending.pop(0) if pending else 200
+            body = json.dumps(stub.payload(offset, limit) if status == 200 else {"error": status}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    stub.url = f"http://127.0.0.1:{server.server_port}/resource"
+    yield stub
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,65 @@
+from gov_analytics.cleaned import CleanedStore, write_snapshot
+from gov_analytics.db import read_sql
+from gov_analytics.etl.load import upsert_records
+from gov_analytics.models import PMAY
+from gov_analytics.rollups import rollup_table
+from gov_analytics.store import AnalyticsStore
+from conftest import pmay_records
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+MEASURES = ["row_count", "score", "beneficiaries", "houses_completed", "funds_released"]
+GROUPINGS = [["state_code", "year"], ["state_code"], ["state_name"], ["year"], []]
+
+
+def _sql(by, year=None, state_name=None):
+    """The same aggregate straight from the raw table."""
+    columns = list(by) + (["MAX(state_name) AS state_name"] if "state_code" in by else []) + [
+        "COUNT(*) AS row_count",
+        "SUM(COALESCE(beneficiaries, 0) + COALESCE(houses_completed, 0)) AS score",
+        "SUM(COALESCE(beneficiaries, 0)) AS beneficiaries",
+        "SUM(COALESCE(houses_completed, 0)) AS houses_completed",
+        "SUM(COALESCE(funds_released, 0)) AS funds_released",
+    ]
+    filters = [f for f, v in (("year = :year", year), ("state_name = :state_name", state_name)) if v is not None]
+    sql = f"SELECT {', '.join(columns)} FROM pmay"
+    if filters:
+        sql += " WHERE " + " AND ".join(filters)
+    if by:
+        sql += f" GROUP BY {', '.join(by)} ORDER BY {', '.join(by)}"
+    return read_sql(sql, {"year": year, "state_name": state_name})
+
+
+def _same(frame, expected, by):
+    columns = list(by) + (["state_name"] if "state_code" in by else []) + MEASURES
+    pd.testing.assert_frame_equal(frame[columns].reset_index(drop=True), expected[columns].reset_index(drop=True),
+                                  check_dtype=False)
+
+
+@pytest.fixture
+def loaded(db, tmp_path):
+    # "State 10" sorts before "State 2": name order differs from code and insertion order
+    upsert_records(db, PMAY, list(reversed(pmay_records(n_states=12))))
+    write_snapshot("pmay", root=tmp_path, force=True)
+    return AnalyticsStore(True, 0).snapshot("pmay"), CleanedStore(True, tmp_path)
+
+
+@pytest.mark.backlog("user-015", "user-021")
+@pytest.mark.parametrize("by", GROUPINGS, ids=lambda by: "+".join(by) or "total")
+@pytest.mark.parametrize("year, state_name", [(None, None), (2020, None), (None, "State 3"), (2021, "State 10")])
+def test_store_parquet_and_sql_agree(loaded, by, year, state_name):
+    store, parquet = loaded
+    expected = _sql(by, year, state_name)
+    _same(store.aggregate(by, MEASURES, year=year, state_name=state_name), expected, by)
+    _same(parquet.aggregate("pmay", by, MEASURES, year=year, state_name=state_name), expected, by)
+
+
+@pytest.mark.backlog("user-006")
+@pytest.mark.parametrize("grain, by", [("state_year", ["state_code", "year"]), ("state", ["state_code"]),
+                                       ("year", ["year"]), ("national", [])])
+def test_rollups_agree_with_sql(loaded, grain, by):
+    table = rollup_table("pmay", grain).name
+    order = f" ORDER BY {', '.join(by)}" if by else ""
+    _same(read_sql(f"SELECT * FROM {table}{order}"), _sql(by), by)
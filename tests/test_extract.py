@@ -0,0 +1,95 @@
+from gov_analytics.config import settings
+from gov_analytics.etl import extract
+from gov_analytics.etl.extract import fetch_data_from_datagov, iter_datagov_pages
+import aiohttp
+import pytest
+
+pytestmark = pytest.mark.backlog("user-001")
+
+
+def _rows(n):
+    return [{"state_code": f"S{i:03d}", "year": 2020} for i in range(n)]
+
+
+def _pages(stub, page_size, concurrency):
+    return list(iter_datagov_pages("rid", page_size=page_size, max_concurrency=concurrency, base_url=stub.url))
+
+
+@pytest.fixture
+def backoff(monkeypatch):
+    """Record retry delays instead of sleeping."""
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(settings, "EXTRACT_BACKOFF_SECONDS", 0.25)
+    monkeypatch.setattr(extract.asyncio, "sleep", sleep)
+    return delays
+
+
+def test_pages_across_offsets_in_order(datagov):
+    datagov.rows = _rows(45)
+    pages = _pages(datagov, page_size=10, concurrency=2)
+    assert [len(p) for p in pages] == [10, 10, 10, 10, 5]
+    assert [r for p in pages for r in p] == datagov.rows
+    assert sorted(datagov.requests) == [(o, 10) for o in (0, 10, 20, 30, 40)]
+
+
+def test_total_stops_paging(datagov):
+    datagov.rows = _rows(30)
+    pages = _pages(datagov, page_size=10, concurrency=8)
+    assert [len(p) for p in pages] == [10, 10, 10]
+    # no window requests past the reported total
+    assert sorted(o for o, _ in datagov.requests) == [0, 10, 20]
+
+
+def test_short_page_ends_paging_without_total(datagov):
+    datagov.rows = _rows(25)
+    datagov.report_total = False
+    pages = _pages(datagov, page_size=10, concurrency=2)
+    assert [len(p) for p in pages] == [10, 10, 5]
+    assert sorted(o for o, _ in datagov.requests) == [0, 10, 20]
+
+
+def test_empty_page_ends_paging_without_total(datagov):
+    datagov.rows = _rows(20)
+    datagov.report_total = False
+    pages = _pages(datagov, page_size=10, concurrency=2)
+    assert [len(p) for p in pages] == [10, 10]
+    assert sorted(o for o, _ in datagov.requests) == [0, 10, 20]
+
+
+def test_server_page_cap_is_followed(datagov):
+    datagov.rows = _rows(25)
+    datagov.max_page = 10
+    pages = _pages(datagov, page_size=100, concurrency=4)
+    assert [r for p in pages for r in p] == datagov.rows
+    assert sorted(datagov.requests)[1:] == [(10, 10), (20, 10)]
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retries_with_backoff(datagov, backoff, status):
+    datagov.rows = _rows(30)
+    datagov.failures = {10: [status, status]}
+    pages = _pages(datagov, page_size=10, concurrency=2)
+    assert [r for p in pages for r in p] == datagov.rows
+    assert [o for o, _ in datagov.requests].count(10) == 3
+    assert backoff == [0.25, 0.5]
+
+
+def test_gives_up_after_max_retries(datagov, backoff, monkeypatch):
+    monkeypatch.setattr(settings, "EXTRACT_MAX_RETRIES", 2)
+    datagov.rows = _rows(30)
+    datagov.failures = {10: [503] * 3}
+    with pytest.raises(aiohttp.ClientResponseError) as e:
+        _pages(datagov, page_size=10, concurrency=2)
+    assert e.value.status == 503
+    assert backoff == [0.25, 0.5]
+
+
+def test_fetch_concatenates_pages(datagov, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_GOV_BASE_URL", datagov.url)
+    monkeypatch.setattr(settings, "EXTRACT_PAGE_SIZE", 7)
+    datagov.rows = _rows(30)
+    assert fetch_data_from_datagov("rid") == datagov.rows
@@ -0,0 +1,64 @@
+from gov_analytics.config import settings
+from gov_analytics.db import read_sql
+from gov_analytics.etl import load
+from sqlalchemy.exc import SQLAlchemyError
+from conftest import pmay_records
+import pytest
+
+pytest.importorskip("prefect")
+
+pytestmark = pytest.mark.backlog("user-012")
+
+
+@pytest.fixture(scope="module", autouse=True)
+def prefect_server():
+    """One temporary Prefect API for the module, stopped before pytest exits."""
+    from prefect.testing.utilities import prefect_test_harness
+    with prefect_test_harness():
+        yield
+
+
+@pytest.fixture
+def flow_env(db, datagov, tmp_path, monkeypatch):
+    """Flows read the stub API through a raw-page cache in ``tmp_path``."""
+    monkeypatch.setattr(settings, "DATA_GOV_BASE_URL", datagov.url)
+    monkeypatch.setattr(settings, "RAW_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "RAW_CACHE_DIR", str(tmp_path / "raw"))
+    monkeypatch.setattr(settings, "PARQUET_SNAPSHOTS_ENABLED", False)
+    monkeypatch.setattr(settings, "ETL_DELETE_MISSING", True)
+    datagov.rows = pmay_records()
+    return datagov
+
+
+def _run():
+    from gov_analytics.prefect_flows import etl_for_scheme
+    return etl_for_scheme("pmay", "rid", create_schema=False)
+
+
+def test_unchanged_resource_is_skipped(flow_env):
+    assert _run()["inserted"] == 18
+    assert _run()["skipped"] is True
+
+
+@pytest.mark.parametrize("target", ["_write_rows", "delete"])
+def test_failed_load_is_not_marked_successful(flow_env, monkeypatch, target):
+    """A run whose load or prune fails must not record the resource hash, or later runs would skip it."""
+    broken = {"on": False}
+    original = getattr(load, target)
+
+    def flaky(*args, **kwargs):
+        if broken["on"]:
+            raise SQLAlchemyError("boom")
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(load, target, flaky)
+    if target == "delete":
+        # the first run loads everything; the second has a record dropped upstream and fails to prune it
+        _run()
+        flow_env.rows = flow_env.rows[1:]
+    broken["on"] = True
+    with pytest.raises(SQLAlchemyError):
+        _run()
+    broken["on"] = False
+    assert not _run().get("skipped")
+    assert read_sql("SELECT count(*) AS n FROM pmay")["n"].tolist() == [len(flow_env.rows)]
@@ -0,0 +1,185 @@
+from gov_analytics import rollups
+from gov_analytics.db import get_engine, init_schema, read_sql
+from gov_analytics.etl import load
+from gov_analytics.etl.load import delete_missing, natural_keys, upsert_district_month, upsert_records
+from gov_analytics.models import PMAY, Saubhagya
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from conftest import pmay_records
+import pandas as pd
+import pytest
+import threading
+
+
+def _rollup_frames(scheme):
+    return {grain: read_sql(f"SELECT * FROM {table.name}").sort_values(list(keys)).reset_index(drop=True)
+            for (grain, keys), table in zip(rollups.GRAINS.items(), rollups.ROLLUPS[scheme].values())}
+
+
+def assert_rollups_consistent(scheme):
+    """The incrementally maintained rollups equal a rebuild from the raw table."""
+    maintained = _rollup_frames(scheme)
+    with get_engine().begin() as conn:
+        rollups.rebuild_rollups(conn, scheme)
+    for grain, frame in _rollup_frames(scheme).items():
+        pd.testing.assert_frame_equal(maintained[grain], frame, check_dtype=False, obj=grain)
+
+
+@pytest.fixture(params=["native", "generic"])
+def dialect_path(request, monkeypatch):
+    """Run a test with the dialect's ON CONFLICT upsert and with the portable merge_rows fallback."""
+    if request.param == "generic":
+        monkeypatch.setattr(load, "_DIALECT_INSERTS", {})
+        monkeypatch.setattr(rollups, "_DIALECT_INSERTS", {})
+    return request.param
+
+
+@pytest.mark.backlog("user-003", "user-025")
+def test_upsert_counts(db, dialect_path):
+    records = pmay_records()
+    assert upsert_records(db, PMAY, records) == {"inserted": 18, "updated": 0, "unchanged": 0}
+    assert upsert_records(db, PMAY, records) == {"inserted": 0, "updated": 0, "unchanged": 18}
+
+    changed = [dict(r) for r in records]
+    changed[0]["houses_completed"] += 1
+    changed.append({**records[0], "year": 2022})
+    assert upsert_records(db, PMAY, changed) == {"inserted": 1, "updated": 1, "unchanged": 17}
+    assert len(read_sql("SELECT * FROM pmay")) == 19
+
+
+@pytest.mark.backlog("user-025")
+def test_equal_values_of_another_type_are_unchanged(db):
+    records = pmay_records(n_states=2, years=(2020,))
+    upsert_records(db, PMAY, records)
+    as_floats = [{**r, "houses_completed": float(r["houses_completed"]), "year": float(r["year"])} for r in records]
+    assert upsert_records(db, PMAY, as_floats) == {"inserted": 0, "updated": 0, "unchanged": 2}
+
+
+@pytest.mark.backlog("user-006", "user-025")
+def test_rollups_follow_inserts_updates_and_deletes(db, dialect_path):
+    upsert_records(db, PMAY, pmay_records(seed=1))
+    assert_rollups_consistent("pmay")
+
+    upsert_records(db, PMAY, pmay_records(n_states=8, seed=2))
+    assert_rollups_consistent("pmay")
+
+    kept = pmay_records(n_states=4, seed=2)
+    assert delete_missing(db, PMAY, natural_keys(kept)) == 12
+    assert_rollups_consistent("pmay")
+    assert read_sql("SELECT row_count FROM pmay_by_national")["row_count"].tolist() == [12]
+
+
+@pytest.mark.backlog("user-025")
+def test_data_version_moves_only_on_change(db):
+    records = pmay_records()
+    upsert_records(db, PMAY, records)
+    upsert_records(db, PMAY, records)
+    assert read_sql("SELECT version FROM data_versions WHERE scheme = 'pmay'")["version"].tolist() == [1]
+
+
+@pytest.mark.backlog("user-025")
+def test_change_log(db, monkeypatch):
+    from gov_analytics.config import settings
+    monkeypatch.setattr(settings, "ETL_CHANGE_LOG_ENABLED", True)
+    records = pmay_records(n_states=2, years=(2020,))
+    upsert_records(db, PMAY, records)
+    upsert_records(db, PMAY, [{**records[0], "houses_completed": -1}, records[1]])
+    delete_missing(db, PMAY, natural_keys(records[1:]))
+    log = read_sql("SELECT state_code, change FROM etl_row_changes ORDER BY id")
+    assert log.values.tolist() == [["S00", "insert"], ["S01", "insert"], ["S00", "update"], ["S00", "delete"]]
+
+
+@pytest.mark.backlog("user-006")
+def test_concurrent_loads_keep_rollups_consistent(db):
+    from gov_analytics.db import SessionLocal
+
+    def run(seed):
+        session = SessionLocal()
+        try:
+            upsert_records(session, PMAY, pmay_records(n_states=20, seed=seed))
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=run, args=(seed,)) for seed in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert_rollups_consistent("pmay")
+    assert read_sql("SELECT row_count FROM pmay_by_national")["row_count"].tolist() == [60]
+
+
+@pytest.mark.backlog("user-006")
+def test_ratio_columns_are_not_rolled_up(db):
+    upsert_records(db, Saubhagya, [
+        {"state_code": "A", "state_name": "A", "year": 2020, "households_electrified": 10, "percent_coverage": 80.0},
+        {"state_code": "B", "state_name": "B", "year": 2020, "households_electrified": 30, "percent_coverage": 90.0},
+    ])
+    national = read_sql("SELECT * FROM saubhagya_by_national")
+    assert "percent_coverage" not in national.columns
+    assert national["households_electrified"].tolist() == [40]
+    assert_rollups_consistent("saubhagya")
+
+
+def _district_records(value):
+    return [{"state_code": "S1", "state_name": "One", "district_code": f"D{d}", "district_name": f"District {d}",
+             "year": 2021, "month": m, "beneficiaries": value * d * m, "houses_completed": m, "funds_released": 1.5}
+            for d in range(1, 4) for m in range(1, 4)]
+
+
+@pytest.mark.backlog("user-022")
+def test_district_month_load_derives_state_rows(db, dialect_path):
+    assert upsert_district_month(db, "pmay", _district_records(1)) == {"inserted": 9, "updated": 0, "state_rows": 1}
+    assert upsert_district_month(db, "pmay", _district_records(2)) == {"inserted": 0, "updated": 9, "state_rows": 1}
+    state = read_sql("SELECT beneficiaries, funds_released FROM pmay")
+    assert state.values.tolist() == [[2 * 6 * 6, 9 * 1.5]]
+    assert_rollups_consistent("pmay")
+
+
+@pytest.mark.backlog("user-022")
+def test_failed_district_month_load_rolls_back_facts(db, monkeypatch):
+    def fail(*args, **kwargs):
+        raise SQLAlchemyError("boom")
+
+    monkeypatch.setattr(load, "_write_rows", fail)
+    with pytest.raises(SQLAlchemyError):
+        upsert_district_month(db, "pmay", _district_records(1))
+    assert read_sql("SELECT count(*) AS n FROM pmay_district_month")["n"].tolist() == [0]
+
+
+@pytest.mark.backlog("user-003")
+def test_failed_load_raises_after_rollback(db, monkeypatch):
+    def fail(*args, **kwargs):
+        raise SQLAlchemyError("boom")
+
+    monkeypatch.setattr(load, "_apply_rollups", fail)
+    with pytest.raises(SQLAlchemyError):
+        upsert_records(db, PMAY, pmay_records())
+    assert read_sql("SELECT count(*) AS n FROM pmay")["n"].tolist() == [0]
+
+
+@pytest.mark.backlog("user-003")
+def test_legacy_duplicate_keys_are_deduped(tmp_path):
+    """Databases written by the old always-insert merge get the unique key, their latest rows and exact rollups."""
+    engine = create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE pmay (id INTEGER PRIMARY KEY, state_code VARCHAR(10), state_name VARCHAR(100), "
+                          "year INTEGER, created_at DATETIME, beneficiaries INTEGER, houses_completed INTEGER, "
+                          "funds_released FLOAT)"))
+        conn.execute(text("INSERT INTO pmay (state_code, state_name, year, beneficiaries) VALUES "
+                          "('A', 'A', 2020, 1), ('A', 'A', 2020, 2), ('B', 'B', 2020, 5), ('A', 'A', 2020, 3)"))
+    init_schema(engine)
+
+    def frame(sql):
+        with engine.connect() as conn:
+            return pd.read_sql(text(sql), conn)
+
+    assert frame("SELECT state_code, beneficiaries FROM pmay ORDER BY state_code").values.tolist() == [["A", 3], ["B", 5]]
+    assert frame("SELECT row_count, beneficiaries FROM pmay_by_national").values.tolist() == [[2, 8]]
+    assert frame("SELECT version FROM data_versions WHERE scheme = 'pmay'")["version"].tolist() == [1]
+
+    with Session(engine) as session:
+        counts = upsert_records(session, PMAY, [{"state_code": "A", "state_name": "A", "year": 2020, "beneficiaries": 4}])
+    assert counts == {"inserted": 0, "updated": 1, "unchanged": 0}
+    assert frame("SELECT row_count, beneficiaries FROM pmay_by_national").values.tolist() == [[2, 9]]
@@ -0,0 +1,60 @@
+from gov_analytics.schemas import SCHEMAS
+from gov_analytics.validation import validate_frame, validate_records, OUT_OF_RANGE
+import pandas as pd
+import pytest
+
+pytestmark = pytest.mark.backlog("user-004")
+
+MIXED = [None, "5", 7, 3.0, " 12 ", "4.0", "x", 2.5, "", float("nan"), True, "1e3"]
+# strings and None only: pandas must not infer a string dtype and turn None into NaN
+STRINGS = ["5", None, " 7", None, "2.5", "abc"]
+
+
+def _records(values, field, base=None):
+    base = base or {"state_code": "MH", "state_name": "Maharashtra", "year": 2020}
+    return [{**base, field: v} for v in values]
+
+
+def _as_records(frame: pd.DataFrame):
+    return [{k: (None if pd.isna(v) else v) for k, v in row.items()} for row in frame.to_dict("records")]
+
+
+@pytest.mark.parametrize("values", [MIXED, STRINGS], ids=["mixed", "strings"])
+@pytest.mark.parametrize("scheme", ["pmay", "mnrega", "startup_india", "saubhagya"])
+def test_frame_matches_records_on_mixed_columns(scheme, values):
+    schema = SCHEMAS[scheme]
+    fields = [f for f in schema.model_fields if f not in ("state_code", "state_name", "year")]
+    # every metric column cycles through the mixed values at a different offset
+    records = [{"state_code": "MH", "state_name": "Maharashtra", "year": 2020,
+                **{f: values[(i + j) % len(values)] for j, f in enumerate(fields)}}
+               for i in range(len(values))]
+
+    valid, rejected = validate_frame(schema, records)
+
+    expected = validate_records(schema, records)
+    assert _as_records(valid) == [{k: (None if v != v else v) for k, v in rec.items()} for rec in expected]
+    assert set(rejected["row"]) == {i for i, rec in enumerate(records)
+                                    if not validate_records(schema, [rec])}
+
+
+def test_none_in_nullable_int_column_is_null():
+    records = _records([None, "5", None, "6"], "beneficiaries",
+                       {"state_code": "MH", "state_name": "Maharashtra", "year": 2020,
+                        "houses_completed": 1, "funds_released": 1.0})
+
+    valid, rejected = validate_frame(SCHEMAS["pmay"], records)
+
+    assert rejected.empty
+    assert valid["beneficiaries"].tolist() == [pd.NA, 5, pd.NA, 6]
+
+
+def test_integers_past_int64_reject_only_their_rows():
+    base = {"state_code": "MH", "state_name": "Maharashtra", "year": 2020,
+            "houses_completed": 1, "funds_released": 1.0}
+    records = _records([10 ** 20, "99999999999999999999", 5, -10 ** 19], "beneficiaries", base)
+
+    valid, rejected = validate_frame(SCHEMAS["pmay"], records)
+
+    assert valid["beneficiaries"].tolist() == [5]
+    assert rejected.to_dict("records") == [
+        {"row": r, "field": "beneficiaries", "reason": OUT_OF_RANGE} for r in (0, 1, 3)]
@@ -0,0 +1,47 @@
+from gov_analytics import web
+from gov_analytics.etl.load import upsert_records
+from gov_analytics.models import PMAY
+from conftest import pmay_records
+import pytest
+
+pytest.importorskip("plotly")
+
+pytestmark = pytest.mark.backlog("user-007")
+
+
+@pytest.fixture
+def client(db):
+    upsert_records(db, PMAY, pmay_records())
+    return web.create_app({"TESTING": True}).test_client()
+
+
+@pytest.mark.parametrize("query", ["year=2020", "year=", ""])
+def test_chart_json(client, query):
+    resp = client.get(f"/chart/scheme.json?scheme=pmay&{query}")
+    assert resp.status_code == 200
+    assert "data" in resp.get_json()
+    assert client.get(f"/chart/scheme.json?scheme=pmay&{query}", headers={"If-None-Match": resp.headers["ETag"]}
+                      ).status_code == 304
+
+
+@pytest.mark.parametrize("path", ["/chart/scheme.json?year=abc", "/chart/trends.json?year_from=2019&year_to=x"])
+def test_chart_json_rejects_non_numeric_years(client, path):
+    resp = client.get(path)
+    assert resp.status_code == 400
+    assert "must be a year" in resp.get_json()["message"]
+
+
+def test_chart_json_failure_has_message(client, monkeypatch):
+    def fail(**kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(web.CHART_BUILDERS, "scheme", (fail, ("scheme", "year")))
+    resp = client.get("/chart/scheme.json?year=2020")
+    assert resp.status_code == 500
+    assert resp.get_json()["message"] == "<p>Error: boom</p>"
+
+
+def test_chart_page_with_non_numeric_year(client):
+    resp = client.get("/scheme?scheme=pmay&year=abc")
+    assert resp.status_code == 200
+    assert b"year must be a year" in resp.data